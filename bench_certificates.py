@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+"""
+Benchmark de la génération des attestations PDF Investor Banque
+Mesure temps, mémoire (RSS et allocations) et taille du PDF sur des prêts fictifs,
+et produit un rapport JSON pour comparer les versions entre elles
+
+Usage : python bench_certificates.py [--iterations N] [--scenario NOM ...] [--output rapport.json] [--check]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from io import BytesIO
+
+# Configuration Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecobank_project.settings')
+import django
+django.setup()
+
+import reportlab
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+
+from loan_system.models import LoanRequest, UserProfile
+from loan_system.utils import NumberedCanvas, generate_loan_certificate
+
+MISSING_ASSETS = {
+    'INVESTOR_LOGO_PATH': '/nonexistent/investor_logo.png',
+    'BANK_SEAL_PATH': '/nonexistent/bank_seal.png',
+    'MANAGER_SIGNATURE_PATH': '/nonexistent/manager_signature.png',
+    'STATIC_ROOT': None,
+    'STATICFILES_DIRS': [],
+}
+
+# nom -> (description, champs du prêt, champs du profil, settings)
+SCENARIOS = {
+    'nominal': ("Prêt standard", {}, {}, {}),
+    'long_motif': ("Motif de 2 000 caractères", {'motif': "Financement du projet professionnel. " * 54}, {}, {}),
+    'long_profile': ("Adresse et profession très longues", {}, {
+        'adresse': "Résidence Les Jardins, bâtiment B, escalier 4, " * 8,
+        'profession': "Directeur administratif et financier " * 4,
+    }, {}),
+    'large_amount': ("Montant de 987 654 321,99 EUR", {'montant': Decimal('987654321.99')}, {}, {}),
+    'missing_assets': ("Logo, cachet et signature absents", {}, {}, MISSING_ASSETS),
+    'schedule_appendix': ("Échéancier de 300 mois en annexe", {'duree_remboursement_mois': 300}, {},
+                          {'CERTIFICATE_INCLUDE_SCHEDULE': True}),
+}
+
+# Budgets vérifiés par --check : nom -> {métrique: maximum}
+BUDGETS = {
+    'schedule_appendix': {'p95_ms': 400, 'tracemalloc_peak_kb': 2048},
+}
+
+CANVAS_PAGES = 200
+
+
+def make_loan(loan_fields=None, profile_fields=None):
+    """Prêt payé fictif (non enregistré en base)"""
+    user = User(id=1, username='bench', email='bench@example.com')
+    profile = UserProfile(
+        user=user,
+        nom='Dupont',
+        prenom='Jean',
+        date_naissance=date(1980, 1, 2),
+        lieu_naissance='Lyon',
+        situation_matrimoniale='marie',
+        profession='Ingénieur',
+        adresse='1 rue de Paris, 75001 Paris',
+    )
+    for field, value in (profile_fields or {}).items():
+        setattr(profile, field, value)
+    user.userprofile = profile
+
+    fields = {
+        'montant': Decimal('125000.00'),
+        'motif': 'Achat de matériel professionnel',
+        'duree_remboursement_mois': 84,
+    }
+    fields.update(loan_fields or {})
+    now = timezone.now()
+    loan = LoanRequest(
+        id=1, user=user, status='paye', payment_key='ABCDEF123456',
+        date_demande=now, date_validation=now, date_paiement=now, **fields
+    )
+    loan.montant_avance = loan.montant * Decimal('0.10')
+    return loan
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def measure(render, iterations):
+    """Premier rendu (à froid), N rendus chronométrés puis un rendu sous tracemalloc"""
+    start = time.perf_counter()
+    output = render()
+    cold = time.perf_counter() - start
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        output = render()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    render()
+    snapshot = tracemalloc.take_snapshot()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = snapshot.statistics('filename')
+
+    result = {
+        'iterations': iterations,
+        'cold_ms': round(cold * 1000, 3),
+        'wall': summarize(timings),
+        'throughput_per_s': round(iterations / sum(timings), 2),
+        'tracemalloc_peak_kb': round(traced_peak / 1024, 1),
+        'retained_blocks': sum(stat.count for stat in stats),
+        'output_bytes': len(output),
+        'output_pages': output.count(b'/Type /Page\n'),
+        # ru_maxrss est en Ko sous Linux, en octets sous macOS
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1),
+    }
+    return result
+
+
+def run_scenario(name, iterations):
+    """Exécute un scénario (dans un processus neuf : le pic RSS lui est propre)"""
+    if name == 'numbered_canvas':
+        def render():
+            buffer = BytesIO()
+            canv = NumberedCanvas(buffer, pagesize=A4)
+            for page in range(CANVAS_PAGES):
+                canv.drawString(100, 700, f"Page de contenu {page + 1}")
+                canv.showPage()
+            canv.save()
+            return buffer.getvalue()
+
+        result = measure(render, iterations)
+        result['description'] = f"NumberedCanvas seul, {CANVAS_PAGES} pages"
+        return name, result
+
+    description, loan_fields, profile_fields, overrides = SCENARIOS[name]
+    loan = make_loan(loan_fields, profile_fields)
+    with override_settings(**overrides):
+        result = measure(lambda: generate_loan_certificate(loan), iterations)
+    result['description'] = description
+    return name, result
+
+
+def over_budget(name, result):
+    """Métriques du scénario qui dépassent leur budget"""
+    values = dict(result, **result['wall'])
+    return {
+        metric: (values[metric], maximum)
+        for metric, maximum in BUDGETS.get(name, {}).items()
+        if values[metric] > maximum
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'reportlab': reportlab.Version,
+        'django': django.get_version(),
+        'platform': platform.platform(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des attestations PDF")
+    parser.add_argument('--iterations', type=int, default=20, help="Rendus chronométrés par scénario")
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS) + ['numbered_canvas'],
+                        help="Scénario(s) à exécuter (défaut : tous)")
+    parser.add_argument('--output', help="Fichier JSON de sortie (défaut : sortie standard)")
+    parser.add_argument('--check', action='store_true', help="Code de sortie 1 si un scénario dépasse son budget")
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS) + ['numbered_canvas']
+    print("📄 BENCHMARK DES ATTESTATIONS PDF", file=sys.stderr)
+    print("=" * 60, file=sys.stderr)
+
+    results = {}
+    failures = {}
+    context = multiprocessing.get_context('spawn')
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            name, result = pool.submit(run_scenario, name, args.iterations).result()
+        results[name] = result
+        print(
+            f"{name:<16} {result['wall']['p50_ms']:>8.1f} ms (p50)  {result['wall']['p95_ms']:>8.1f} ms (p95)  "
+            f"{result['peak_rss_kb'] / 1024:>6.1f} Mo RSS  {result['tracemalloc_peak_kb']:>8.1f} Ko alloués  "
+            f"{result['output_bytes']:>8} octets",
+            file=sys.stderr,
+        )
+        if name in BUDGETS:
+            result['budget'] = BUDGETS[name]
+            exceeded = over_budget(name, result)
+            if exceeded:
+                failures[name] = exceeded
+                for metric, (value, maximum) in exceeded.items():
+                    print(f"❌ {name} : {metric} = {value} (budget {maximum})", file=sys.stderr)
+
+    report = json.dumps({'environment': environment(), 'scenarios': results}, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+        print(f"✅ Rapport écrit dans {args.output}", file=sys.stderr)
+    else:
+        print(report)
+
+    if args.check and failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
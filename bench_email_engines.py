@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Benchmark des moteurs d'envoi des emails
+Compare le pool de threads (PooledEmailBackend) et le moteur asyncio sur un serveur SMTP
+local qui simule un délai réseau par aller-retour
+
+Usage : python bench_email_engines.py [N] [DÉLAI_MS]
+"""
+
+import os
+import sys
+import time
+
+# Configuration Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecobank_project.settings')
+import django
+django.setup()
+
+from django.test import override_settings
+
+from loan_system import email_dispatch, smtp_async, smtp_pool
+from loan_system.email_async import FastInvestorEmailService
+from loan_system.smtp_standin import SMTPStandIn
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+LATENCY = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+DOMAINS = ('gmail.com', 'outlook.fr', 'orange.fr', 'free.fr', 'yahoo.fr')
+
+
+def run(engine, server):
+    messages = [
+        FastInvestorEmailService.build_email('Bench', '<p>Corps</p>', 'Corps', f'client{i}@{DOMAINS[i % len(DOMAINS)]}')
+        for i in range(COUNT)
+    ]
+    with override_settings(
+        EMAIL_BACKEND='loan_system.smtp_pool.PooledEmailBackend', EMAIL_DELIVERY_ENGINE=engine,
+        EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.port, EMAIL_USE_TLS=False, EMAIL_DISPATCH_QUEUE_SIZE=COUNT,
+    ):
+        start = time.perf_counter()
+        futures = [email_dispatch.dispatch(message) for message in messages]
+        sent = sum(future.result() for future in futures)
+        elapsed = time.perf_counter() - start
+        metrics = email_dispatch.email_metrics()
+        email_dispatch.reset_dispatcher()
+        smtp_async.reset_async_engine()
+        smtp_pool.close_pools()
+    return sent, elapsed, metrics
+
+
+def main():
+    print("📨 BENCHMARK DES MOTEURS D'ENVOI")
+    print("=" * 60)
+    print(f"{COUNT} emails, {len(DOMAINS)} domaines, {LATENCY * 1000:.0f} ms par aller-retour SMTP")
+
+    results = {}
+    for engine in email_dispatch.DELIVERY_ENGINES:
+        with SMTPStandIn(latency=LATENCY) as server:
+            sent, elapsed, metrics = run(engine, server)
+            results[engine] = COUNT / elapsed
+            print(
+                f"{engine:8s} : {sent}/{COUNT} envoyés en {elapsed:6.2f} s, {results[engine]:7.1f} emails/s, "
+                f"{server.sessions} session(s) SMTP"
+            )
+            if engine == email_dispatch.ASYNCIO:
+                print(f"           au plus {metrics['peak_per_domain']} envoi(s) simultané(s) par domaine")
+
+    print(f"Gain asyncio / threads : x{results['asyncio'] / results['threads']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Benchmark de la conversion des montants en lettres
+Compare l'ancienne fonction récursive à la version par tables avec cache,
+en appel unitaire et en conversion par lot (exports)
+"""
+
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+# Configuration Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecobank_project.settings')
+import django
+django.setup()
+
+from loan_system.utils import amount_to_words, amounts_to_words, number_to_words
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+
+def legacy_number_to_words(number):
+    """Version d'origine (récursive, sans cache), conservée comme référence"""
+    if number == 0:
+        return "zéro"
+    
+    ones = ["", "un", "deux", "trois", "quatre", "cinq", "six", "sept", "huit", "neuf"]
+    teens = ["dix", "onze", "douze", "treize", "quatorze", "quinze", "seize", "dix-sept", "dix-huit", "dix-neuf"]
+    tens = ["", "", "vingt", "trente", "quarante", "cinquante", "soixante", "soixante-dix", "quatre-vingt", "quatre-vingt-dix"]
+    
+    def convert_hundreds(n):
+        result = ""
+        if n >= 100:
+            if n // 100 == 1:
+                result += "cent"
+            else:
+                result += ones[n // 100] + " cent"
+            if n % 100 != 0:
+                result += " "
+            n %= 100
+        if n >= 20:
+            if n >= 80:
+                if n == 80:
+                    result += "quatre-vingts"
+                else:
+                    result += "quatre-vingt"
+                    if n % 10 != 0:
+                        result += "-" + ones[n % 10]
+            elif n >= 70:
+                result += "soixante"
+                if n % 10 == 1:
+                    result += " et onze"
+                else:
+                    result += "-" + teens[(n % 10)]
+            else:
+                result += tens[n // 10]
+                if n % 10 != 0:
+                    if n // 10 == 2 and n % 10 == 1:
+                        result += " et un"
+                    else:
+                        result += "-" + ones[n % 10]
+        elif n >= 10:
+            result += teens[n - 10]
+        elif n > 0:
+            result += ones[n]
+        return result
+    
+    if number < 1000:
+        return convert_hundreds(number)
+    elif number < 1000000:
+        thousands = number // 1000
+        remainder = number % 1000
+        result = ""
+        if thousands == 1:
+            result = "mille"
+        else:
+            result = convert_hundreds(thousands) + " mille"
+        if remainder > 0:
+            result += " " + convert_hundreds(remainder)
+        return result
+    elif number < 1000000000:
+        millions = number // 1000000
+        remainder = number % 1000000
+        result = convert_hundreds(millions) + " million"
+        if millions > 1:
+            result += "s"
+        if remainder > 0:
+            if remainder < 1000:
+                result += " " + convert_hundreds(remainder)
+            else:
+                result += " " + convert_hundreds(remainder // 1000) + " mille"
+                if remainder % 1000 > 0:
+                    result += " " + convert_hundreds(remainder % 1000)
+        return result
+    else:
+        return "nombre trop grand"
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    print("🔢 BENCHMARK DES MONTANTS EN LETTRES")
+    print("=" * 60)
+
+    random.seed(42)
+    # Montants réalistes : 5 000 à 999 999 999 EUR, avec beaucoup de valeurs rondes répétées
+    integers = [random.choice((random.randrange(5000, 10**9), random.randrange(5, 500) * 1000)) for _ in range(COUNT)]
+    amounts = [Decimal(n) + Decimal(random.randrange(100)) / 100 for n in integers]
+
+    legacy_time, _ = timed(lambda: [legacy_number_to_words(n) for n in integers])
+
+    number_to_words.cache_clear()
+    cold_time, _ = timed(lambda: [number_to_words(n) for n in integers])
+    warm_time, _ = timed(lambda: [number_to_words(n) for n in integers])
+
+    amount_to_words.cache_clear()
+    number_to_words.cache_clear()
+    batch_time, _ = timed(lambda: amounts_to_words(amounts))
+
+    print(f"Montants convertis               : {COUNT}")
+    print(f"Ancienne fonction (entiers)      : {legacy_time / COUNT * 1e6:.2f} µs/montant")
+    print(f"Tables, cache vide (entiers)     : {cold_time / COUNT * 1e6:.2f} µs/montant (x{legacy_time / cold_time:.1f})")
+    print(f"Tables, cache chaud (entiers)    : {warm_time / COUNT * 1e6:.2f} µs/montant (x{legacy_time / warm_time:.1f})")
+    print(f"Lot avec centimes (par lot)      : {batch_time / COUNT * 1e6:.2f} µs/montant")
+    print(f"Cache number_to_words            : {number_to_words.cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
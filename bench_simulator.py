@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Benchmark du simulateur de prêt
+Mesure le calcul d'une simulation (premier calcul et cache) et la vue JSON,
+qui doivent rester bien en dessous de la milliseconde par devis
+
+Usage : python bench_simulator.py [N]
+"""
+
+import os
+import random
+import sys
+import time
+
+# Configuration Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecobank_project.settings')
+import django
+django.setup()
+
+from django.test import RequestFactory
+
+from loan_system import amortization
+from loan_system.views import loan_simulation
+
+# Au plus la taille du cache des devis, pour que le second passage soit servi par le cache
+COUNT = min(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, 4096)
+
+
+def per_call_us(func, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def main():
+    random.seed(0)
+    quotes = [(random.randrange(5000, 5000000, 100), random.randrange(12, 301, 12)) for _ in range(COUNT)]
+
+    print("🧮 BENCHMARK DU SIMULATEUR DE PRÊT")
+    print("=" * 60)
+
+    amortization.annuity_factor.cache_clear()
+    amortization.annuity_factors.cache_clear()
+    start = time.perf_counter()
+    amortization.annuity_factors(amortization.get_annual_rate())
+    print(f"Table des facteurs d'annuité (300 durées) : {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    amortization._quote.cache_clear()
+    print(f"Devis, premier calcul       : {per_call_us(amortization.quote, quotes):8.1f} µs")
+    print(f"Devis, depuis le cache      : {per_call_us(amortization.quote, quotes):8.1f} µs")
+    print(f"Échéancier complet (réf.)   : {per_call_us(amortization.build_schedule, quotes[:1000]):8.1f} µs")
+
+    factory = RequestFactory()
+    requests = [(factory.get('/api/simulation/', {'montant': montant, 'duree': duree}),) for montant, duree in quotes]
+    print(f"Vue JSON (cache chaud)      : {per_call_us(loan_simulation, requests):8.1f} µs")
+
+    info = amortization._quote.cache_info()
+    print(f"Cache : {info.currsize}/{info.maxsize} devis, {info.hits} succès, {info.misses} échecs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Benchmark du filigrane des attestations PDF Investor Banque
+Compare le coût par page de l'ancien draw_watermark (logo rouvert et retraité pixel par pixel à
+chaque page) et du filigrane mis en cache
+"""
+
+import os
+import sys
+import time
+from io import BytesIO
+
+# Configuration Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecobank_project.settings')
+import django
+django.setup()
+
+from PIL import Image as PILImage
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from loan_system import branding
+from loan_system.utils import NumberedCanvas
+
+PAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+
+def draw_watermark_uncached(canv, logo_path):
+    """draw_watermark d'origine : ouverture, redimensionnement et alpha recalculé par pixel à chaque page"""
+    width, height = A4
+    img = PILImage.open(logo_path)
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    watermark_size = 10 * cm
+    img.thumbnail((int(watermark_size * 2.83), int(watermark_size * 2.83)), PILImage.Resampling.LANCZOS)
+    watermark = PILImage.new('RGBA', img.size, (255, 255, 255, 0))
+    alpha = img.split()[3] if len(img.split()) > 3 else None
+    if alpha:
+        alpha = alpha.point(lambda p: int(p * 0.06))
+        img.putalpha(alpha)
+    watermark.paste(img, (0, 0), img)
+    canv.saveState()
+    canv.translate(width / 2, height / 2)
+    canv.rotate(45)
+    canv.drawImage(ImageReader(watermark), -watermark_size/2, -watermark_size/2,
+                   width=watermark_size, height=watermark_size, mask='auto')
+    canv.restoreState()
+
+
+def run(pages, cached):
+    """Dessine le filigrane sur `pages` pages et retourne le temps moyen par page (ms)"""
+    canv = NumberedCanvas(BytesIO(), pagesize=A4)
+    logo = branding.get_asset(branding.LOGO)
+    if logo is None:
+        return None
+
+    elapsed = 0.0
+    for _ in range(pages):
+        start = time.perf_counter()
+        if cached:
+            canv.draw_watermark()
+        else:
+            draw_watermark_uncached(canv, logo.path)
+        elapsed += time.perf_counter() - start
+        # Page suivante sans passer par la numérotation différée
+        canv._startPage()
+    return elapsed / pages * 1000
+
+
+def main():
+    print("🖼️ BENCHMARK DU FILIGRANE DES ATTESTATIONS")
+    print("=" * 60)
+
+    before = run(PAGES, cached=False)
+    if before is None:
+        print("❌ Logo introuvable, aucun filigrane à mesurer")
+        return
+
+    branding.registry.reset()
+    after = run(PAGES, cached=True)
+
+    print(f"Pages mesurées      : {PAGES}")
+    print(f"Avant (sans cache)  : {before:.3f} ms/page")
+    print(f"Avec cache (après)  : {after:.3f} ms/page")
+    print(f"Gain                : x{before / after:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -163,12 +163,22 @@ INVESTOR_LOGO_PATH = os.path.join(BASE_DIR, 'static', 'images', 'logos', 'invest
 MANAGER_SIGNATURE_PATH = os.path.join(BASE_DIR, 'static', 'images', 'signatures', 'manager_signature.png')
 BANK_SEAL_PATH = os.path.join(BASE_DIR, 'static', 'images', 'seals', 'bank_seal.png')
 
+# Cache des attestations PDF : stockage média par défaut, ou chemin d'une classe de stockage Django
+CERTIFICATE_STORAGE = None
+CERTIFICATE_STORAGE_PREFIX = 'certificates'
+
+# Joindre l'échéancier d'amortissement complet en annexe des attestations
+CERTIFICATE_INCLUDE_SCHEDULE = os.environ.get('CERTIFICATE_INCLUDE_SCHEDULE', '').lower() in ('1', 'true', 'yes')
+
 # Informations de la banque
 BANK_NAME = 'Investor Banque'
 BANK_PHONE = '+49 157 50098219'
 MANAGER_NAME = 'Damien Boudraux'
 MANAGER_EMAIL = 'damien.boudraux17@outlook.fr'
 
+# Taux nominal annuel (en %) des échéanciers d'amortissement
+LOAN_ANNUAL_INTEREST_RATE = os.environ.get('LOAN_ANNUAL_INTEREST_RATE', '3.50')
+
 # Configuration pour gérer les fichiers statiques manquants en production
 if os.environ.get('RENDER'):
     STATICFILES_FINDERS = [
@@ -177,7 +187,7 @@ if os.environ.get('RENDER'):
     ]
 
 # Configuration Email Professionnel Investor Banque - OPTIMISÉE
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = 'loan_system.smtp_pool.PooledEmailBackend'
 EMAIL_HOST = 'mail.virement.net'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -189,13 +199,65 @@ SERVER_EMAIL = 'support@virement.net'
 
 # Optimisations pour la vitesse
 EMAIL_TIMEOUT = 30
+# Connexions SMTP authentifiées gardées ouvertes par processus (PooledEmailBackend)
 EMAIL_CONNECTION_POOL_SIZE = 10
 EMAIL_CONNECTION_POOL_KWARGS = {
-    'max_connections': 10,
-    'max_retries': 3,
-    'retry_delay': 1,
+    'max_connections': 10,  # connexions utilisées simultanément au maximum
+    'max_retries': 3,  # nouveaux essais après une coupure ou une erreur 4xx
+    'retry_delay': 1,  # secondes, multiplié par le numéro de l'essai
+    'max_age': 300,  # secondes avant de renouveler une connexion
+    'max_messages': 100,  # emails envoyés avant de renouveler une connexion
+    'health_check_after': 30,  # secondes d'inactivité avant un NOOP de vérification
 }
 
+# Gabarits d'emails préparés au déploiement (manage.py build_email_templates) :
+# CSS recopié dans les éléments et HTML minifié, utilisés en priorité s'ils sont à jour
+EMAIL_TEMPLATES_BUILD_DIR = BASE_DIR / 'build' / 'email_templates'
+
 # Configuration des emails automatiques
 EMAIL_AUTOMATION_ENABLED = True
-EMAIL_ASYNC_SENDING = True  # Envoi asynchrone pour la vitesse
\ No newline at end of file
+EMAIL_ASYNC_SENDING = True  # Envoi asynchrone pour la vitesse
+
+# Pool d'envoi des emails : threads par processus, emails en attente au maximum,
+# politique de débordement ('block', 'reject' ou 'caller_runs') et attente maximale en secondes
+EMAIL_DISPATCH_WORKERS = int(os.environ.get('EMAIL_DISPATCH_WORKERS', 4))
+EMAIL_DISPATCH_QUEUE_SIZE = int(os.environ.get('EMAIL_DISPATCH_QUEUE_SIZE', 200))
+EMAIL_DISPATCH_OVERFLOW = os.environ.get('EMAIL_DISPATCH_OVERFLOW', 'block')
+EMAIL_DISPATCH_BLOCK_TIMEOUT = 10
+# Moteur d'envoi des emails SMTP : 'threads' (pool ci-dessus) ou 'asyncio' (une boucle par
+# processus, sessions SMTP partagées en pipeline, envois simultanés limités par domaine destinataire)
+EMAIL_DELIVERY_ENGINE = os.environ.get('EMAIL_DELIVERY_ENGINE', 'threads')
+EMAIL_ASYNC_SESSIONS = int(os.environ.get('EMAIL_ASYNC_SESSIONS', 8))
+EMAIL_ASYNC_PER_DOMAIN = int(os.environ.get('EMAIL_ASYNC_PER_DOMAIN', 4))
+# Arrêt d'un processus : délai (secondes) pour terminer les envois en mémoire, le reste est
+# reporté dans la file durable (OutboxEmail) ; inférieur au graceful_timeout de gunicorn.conf.py
+EMAIL_SHUTDOWN_TIMEOUT = int(os.environ.get('EMAIL_SHUTDOWN_TIMEOUT', 20))
+# Actions groupées de l'administration : emails envoyés par paquets sur une seule connexion
+EMAIL_BULK_CHUNK_SIZE = 50
+
+# Limitation des envois (loan_system.email_throttle) : un même email (destinataire, type, objet)
+# n'est pas renvoyé pendant la fenêtre de déduplication de son type, nombre d'emails par
+# destinataire plafonné par type, quota horaire du fournisseur SMTP (au-delà, file durable).
+# État dans le cache EMAIL_THROTTLE_CACHE (compteurs add/incr) : il faut un cache partagé à incr
+# atomique (Redis, Memcached) pour des limites communes à tous les processus ; avec le cache
+# mémoire par défaut, chaque processus (worker gunicorn, run_email_worker) a ses propres limites
+EMAIL_THROTTLE_ENABLED = True
+EMAIL_THROTTLE_CACHE = 'default'
+EMAIL_THROTTLE_POLICIES = {}  # ex. {'login_alert': {'dedup': 600, 'limit': 6, 'window': 3600}}
+EMAIL_HOURLY_QUOTA = int(os.environ.get('EMAIL_HOURLY_QUOTA', 500))
+
+# Emails des notifications : 'immediate' (un email par notification enregistrée) ou 'digest'
+# (un récapitulatif par client, envoyé par manage.py send_notification_digests une fois que la
+# plus ancienne notification en attente a NOTIFICATION_DIGEST_WINDOW secondes)
+NOTIFICATION_EMAIL_MODE = os.environ.get('NOTIFICATION_EMAIL_MODE', 'immediate')
+NOTIFICATION_DIGEST_WINDOW = int(os.environ.get('NOTIFICATION_DIGEST_WINDOW', 900))
+NOTIFICATION_DIGEST_CLAIM_TIMEOUT = 600  # secondes avant de reprendre un récapitulatif réservé par un processus disparu
+
+# File d'envoi durable : les emails sont enregistrés en base et envoyés par le worker
+# (manage.py run_email_worker, entrée "worker" du Procfile) au lieu du processus web.
+# Active par défaut en déploiement, où le worker tourne ; en local sans worker, envoi direct
+EMAIL_USE_OUTBOX = os.environ.get('EMAIL_USE_OUTBOX', 'true' if os.environ.get('RENDER') else '').lower() in ('1', 'true', 'yes')
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60  # secondes, doublé à chaque tentative
+EMAIL_OUTBOX_CLAIM_TIMEOUT = 600  # secondes avant de reprendre un email réservé par un worker disparu
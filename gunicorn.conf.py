@@ -0,0 +1,30 @@
+"""
+Configuration gunicorn (chargée automatiquement depuis le dossier de lancement)
+Au démarrage d'un worker, les caches de l'application sont remplis avant la première requête.
+À l'arrêt d'un worker (redéploiement, recyclage), les emails encore en mémoire sont
+envoyés ou reportés dans la file durable avant que le processus ne se termine
+"""
+
+import os
+
+# Délai accordé à un worker pour s'arrêter avant d'être tué : doit couvrir EMAIL_SHUTDOWN_TIMEOUT
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+
+def post_worker_init(worker):
+    from loan_system.amortization import annuity_factors, get_annual_rate
+    from loan_system.branding import registry
+    from loan_system.email_rendering import get_renderer
+
+    # Images de marque résolues et décodées
+    registry.warm()
+    # Facteurs d'annuité de toutes les durées au taux configuré (simulateur)
+    annuity_factors(get_annual_rate())
+    # Gabarits d'emails compilés avant le premier envoi
+    get_renderer().compile_all()
+
+
+def worker_exit(server, worker):
+    from loan_system.email_dispatch import drain_email_queue
+
+    drain_email_queue()
@@ -6,10 +6,24 @@ from django.utils import timezone
 from django.contrib import messages
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from django.db import models
+from django.db import models, transaction
 from django.shortcuts import redirect
-from .models import UserProfile, LoanRequest, Payment, Message, Notification
+from django.http import HttpResponse
+import csv
+from .models import UserProfile, LoanRequest, Payment, Message, Notification, OutboxEmail
 from .email_async import FastInvestorEmailService
+from . import outbox
+from .certificates import schedule_certificate_pregeneration
+from .notification_digest import digest_enabled, queue_for_digest
+from .amortization import MAX_DURATION_MONTHS, schedules_for_loans
+
+def message_bulk_result(model_admin, request, summary, email_kind, queued, failed):
+    """Résumé d'une action groupée : emails mis en envoi et emails en échec"""
+    text = f"{summary} {queued} email(s) {email_kind} en cours d'envoi.".strip()
+    if failed:
+        model_admin.message_user(request, f"{text} {failed} email(s) n'ont pas pu être envoyés.", messages.WARNING)
+    else:
+        model_admin.message_user(request, text)
 
 # Inline pour UserProfile
 class UserProfileInline(admin.StackedInline):
@@ -63,21 +77,19 @@ class UserProfileAdmin(admin.ModelAdmin):
     actions = ['validate_profiles']
     
     def validate_profiles(self, request, queryset):
-        updated = 0
-        for profile in queryset:
-            if not profile.is_validated:
+        now = timezone.now()
+        with transaction.atomic():
+            profiles = list(queryset.select_for_update(of=('self',)).filter(is_validated=False).select_related('user'))
+            for profile in profiles:
                 profile.is_validated = True
-                profile.date_validation = timezone.now()
-                profile.save()
-                
-                # Envoyer email d'activation
-                try:
-                    FastInvestorEmailService.send_subscription_activated_fast(profile.user)
-                except Exception as e:
-                    print(f"Erreur envoi email activation: {e}")
-                
-                updated += 1
-        self.message_user(request, f'{updated} profil(s) validé(s) avec succès. Les emails d\'activation ont été envoyés.')
+                profile.date_validation = now
+            UserProfile.objects.bulk_update(profiles, ['is_validated', 'date_validation'])
+        
+        # Emails d'activation envoyés en un seul lot
+        queued, failed = FastInvestorEmailService.send_bulk_fast(
+            FastInvestorEmailService.build_subscription_activated_email, [profile.user for profile in profiles]
+        )
+        message_bulk_result(self, request, f'{len(profiles)} profil(s) validé(s) avec succès.', "d'activation", queued, failed)
     validate_profiles.short_description = "Valider les profils sélectionnés"
 
 @admin.register(LoanRequest)
@@ -85,7 +97,7 @@ class LoanRequestAdmin(admin.ModelAdmin):
     list_display = ('get_reference', 'get_user_name', 'montant_formatted', 'status', 'date_demande', 'payment_key_display')
     list_filter = ('status', 'date_demande', 'date_validation')
     search_fields = ('user__username', 'user__userprofile__nom', 'user__userprofile__prenom', 'motif')
-    readonly_fields = ('date_demande', 'montant_avance', 'payment_key', 'date_validation', 'date_paiement')
+    readonly_fields = ('date_demande', 'montant_avance', 'payment_key', 'date_validation', 'date_paiement', 'mensualite_display')
     
     def save_model(self, request, obj, form, change):
         """Surcharge pour détecter les changements de statut et envoyer un email"""
@@ -103,9 +115,13 @@ class LoanRequestAdmin(admin.ModelAdmin):
         # Si le statut a changé, envoyer un email
         if change and old_status and old_status != obj.status:
             try:
-                FastInvestorEmailService.send_status_change_email_fast(obj, old_status, obj.status)
+                FastInvestorEmailService.send_on_commit(FastInvestorEmailService.send_status_change_email_fast, obj, old_status, obj.status)
             except Exception as e:
                 print(f"Erreur envoi email changement statut: {e}")
+            
+            # Préparer l'attestation dès le passage au statut payé
+            if obj.status == 'paye':
+                schedule_certificate_pregeneration(obj)
     
     def get_reference(self, obj):
         return f"INV-{obj.id:06d}"
@@ -132,6 +148,19 @@ class LoanRequestAdmin(admin.ModelAdmin):
         return obj.payment_key or '-'
     payment_key_display.short_description = 'Clé de paiement'
     
+    def mensualite_display(self, obj):
+        if not obj.pk:
+            return '-'
+        try:
+            schedule = obj.amortization_schedule()
+        except ValueError:
+            return 'Durée hors limites'
+        return (
+            f"{schedule.mensualite:,.2f} € / mois pendant {len(schedule)} mois "
+            f"(taux {schedule.annual_rate} %, intérêts {schedule.total_interets:,.2f} €)"
+        )
+    mensualite_display.short_description = 'Mensualité'
+    
     fieldsets = (
         ('Référence', {
             'fields': ('user',),
@@ -146,46 +175,69 @@ class LoanRequestAdmin(admin.ModelAdmin):
             'description': 'Suivi de la demande'
         }),
         ('Paiement et remboursement', {
-            'fields': ('payment_key', 'date_paiement', 'duree_remboursement_mois'),
+            'fields': ('payment_key', 'date_paiement', 'duree_remboursement_mois', 'mensualite_display'),
             'description': 'Informations de paiement et remboursement'
         }),
     )
     
-    actions = ['validate_requests', 'reject_requests']
+    actions = ['validate_requests', 'reject_requests', 'export_schedules']
     
     def validate_requests(self, request, queryset):
-        updated = 0
-        for loan_request in queryset:
-            if loan_request.status == 'en_attente':
+        now = timezone.now()
+        with transaction.atomic():
+            loan_requests = list(
+                queryset.select_for_update(of=('self',)).filter(status='en_attente').select_related('user__userprofile')
+            )
+            for loan_request in loan_requests:
                 loan_request.status = 'valide'
-                loan_request.date_validation = timezone.now()
-                loan_request.save()
-                
-                # Envoyer email d'approbation
-                try:
-                    FastInvestorEmailService.send_loan_approval_fast(loan_request)
-                except Exception as e:
-                    print(f"Erreur envoi email approbation: {e}")
-                
-                updated += 1
-        self.message_user(request, f'{updated} demande(s) validée(s) avec succès. Les emails d\'approbation ont été envoyés.')
+                loan_request.date_validation = now
+                # Comme LoanRequest.save() : clé de paiement générée à la validation
+                if not loan_request.payment_key:
+                    loan_request.payment_key = loan_request.generate_payment_key()
+            LoanRequest.objects.bulk_update(loan_requests, ['status', 'date_validation', 'payment_key'])
+        
+        # Emails d'approbation envoyés en un seul lot
+        queued, failed = FastInvestorEmailService.send_bulk_fast(FastInvestorEmailService.build_loan_approval_email, loan_requests)
+        message_bulk_result(self, request, f'{len(loan_requests)} demande(s) validée(s) avec succès.', "d'approbation", queued, failed)
     validate_requests.short_description = "Valider les demandes sélectionnées"
     
     def reject_requests(self, request, queryset):
-        updated = 0
-        for loan_request in queryset.filter(status='en_attente'):
-            loan_request.status = 'rejete'
-            loan_request.save()
-            
-            # Envoyer email de rejet
-            try:
-                FastInvestorEmailService.send_loan_rejection_fast(loan_request)
-            except Exception as e:
-                print(f"Erreur envoi email rejet: {e}")
-            
-            updated += 1
-        self.message_user(request, f'{updated} demande(s) rejetée(s). Les emails de rejet ont été envoyés.')
+        with transaction.atomic():
+            loan_requests = list(
+                queryset.select_for_update(of=('self',)).filter(status='en_attente').select_related('user__userprofile')
+            )
+            for loan_request in loan_requests:
+                loan_request.status = 'rejete'
+            LoanRequest.objects.bulk_update(loan_requests, ['status'])
+        
+        # Emails de rejet envoyés en un seul lot
+        queued, failed = FastInvestorEmailService.send_bulk_fast(FastInvestorEmailService.build_loan_rejection_email, loan_requests)
+        message_bulk_result(self, request, f'{len(loan_requests)} demande(s) rejetée(s).', 'de rejet', queued, failed)
     reject_requests.short_description = "Rejeter les demandes sélectionnées"
+    
+    def export_schedules(self, request, queryset):
+        """Échéanciers des demandes sélectionnées, calculés en un seul lot, au format CSV"""
+        loans = [loan for loan in queryset.order_by('pk') if 1 <= loan.duree_remboursement_mois <= MAX_DURATION_MONTHS]
+        schedules = schedules_for_loans(loans)
+        
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="echeanciers.csv"'
+        writer = csv.writer(response, delimiter=';')
+        writer.writerow(['Référence', 'N°', 'Échéance', 'Mensualité', 'Intérêts', 'Capital', 'Capital restant dû'])
+        for loan in loans:
+            reference = f"INV-{loan.id:06d}"
+            for echeance in schedules[loan.pk]:
+                writer.writerow([
+                    reference,
+                    echeance.numero,
+                    echeance.date_echeance.strftime('%d/%m/%Y') if echeance.date_echeance else '',
+                    echeance.mensualite,
+                    echeance.interets,
+                    echeance.capital,
+                    echeance.capital_restant,
+                ])
+        return response
+    export_schedules.short_description = "Exporter les échéanciers (CSV)"
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -223,9 +275,12 @@ class PaymentAdmin(admin.ModelAdmin):
                 obj.date_validation = timezone.now()
                 obj.save()
                 
+                # Préparer l'attestation en arrière-plan après la validation de la transaction
+                schedule_certificate_pregeneration(obj.loan_request)
+                
                 # Envoyer email de confirmation de paiement
                 try:
-                    FastInvestorEmailService.send_payment_confirmation_fast(obj.loan_request, obj)
+                    FastInvestorEmailService.send_on_commit(FastInvestorEmailService.send_payment_confirmation_fast, obj.loan_request, obj)
                 except Exception as e:
                     print(f"Erreur envoi email confirmation paiement: {e}")
                 
@@ -348,7 +403,7 @@ class MessageAdmin(admin.ModelAdmin):
         try:
             if is_new and obj.sender.is_staff and not obj.recipient.is_staff:
                 from .email_async import FastInvestorEmailService
-                FastInvestorEmailService.send_message_email_fast(obj)
+                FastInvestorEmailService.send_on_commit(FastInvestorEmailService.send_message_email_fast, obj)
         except Exception as e:
             print(f"Erreur envoi email message client: {e}")
 
@@ -357,7 +412,7 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ('get_title', 'get_recipient', 'notification_type', 'status', 'created_at', 'get_sender')
     list_filter = ('status', 'notification_type', 'created_at', 'sender__is_staff')
     search_fields = ('title', 'content', 'recipient__username', 'sender__username')
-    readonly_fields = ('created_at', 'read_at', 'time_since_created')
+    readonly_fields = ('created_at', 'read_at', 'time_since_created', 'email_digest_queued_at', 'email_digest_claimed_at', 'email_digest_sent_at')
     ordering = ['-created_at']
     
     fieldsets = (
@@ -369,7 +424,8 @@ class NotificationAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Métadonnées', {
-            'fields': ('sender', 'status', 'created_at', 'read_at', 'time_since_created'),
+            'fields': ('sender', 'status', 'created_at', 'read_at', 'time_since_created',
+                       'email_digest_queued_at', 'email_digest_claimed_at', 'email_digest_sent_at'),
             'classes': ('collapse',)
         }),
     )
@@ -436,24 +492,45 @@ class NotificationAdmin(admin.ModelAdmin):
                     trigger_fields = {'title', 'content', 'notification_type', 'status', 'action_url', 'action_text', 'recipient'}
                     if changed & trigger_fields:
                         should_send = True
-            if should_send:
-                from .email_async import FastInvestorEmailService
-                FastInvestorEmailService.send_notification_email_fast(obj)
+            if should_send and digest_enabled():
+                # Regroupée avec les autres notifications du client par send_notification_digests
+                queue_for_digest(obj)
+            elif should_send:
+                FastInvestorEmailService.send_on_commit(FastInvestorEmailService.send_notification_email_fast, obj)
         except Exception as e:
             print(f"Erreur envoi email notification: {e}")
 
     def resend_email(self, request, queryset):
-        from .email_async import FastInvestorEmailService
-        sent = 0
-        for n in queryset:
-            try:
-                if FastInvestorEmailService.send_notification_email_fast(n):
-                    sent += 1
-            except Exception:
-                pass
-        self.message_user(request, f"{sent} email(s) de notification renvoyé(s).")
+        notifications = queryset.select_related('recipient__userprofile')
+        queued, failed = FastInvestorEmailService.send_bulk_fast(FastInvestorEmailService.build_notification_email, notifications)
+        message_bulk_result(self, request, '', 'de notification', queued, failed)
     resend_email.short_description = "Renvoyer l'email au destinataire"
 
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'get_recipients', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'to', 'last_error')
+    readonly_fields = ('subject', 'body', 'html_body', 'from_email', 'to', 'attempts', 'last_error',
+                       'created_at', 'available_at', 'claimed_at', 'sent_at')
+    ordering = ['-created_at']
+    actions = ['requeue_emails']
+    
+    def get_recipients(self, obj):
+        return ', '.join(obj.to)
+    get_recipients.short_description = 'Destinataires'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def requeue_emails(self, request, queryset):
+        # Emails en cours d'envoi exclus : un worker actif les enverrait une seconde fois
+        updated = queryset.exclude(status__in=[outbox.SENT, outbox.SENDING]).update(
+            status=outbox.PENDING, attempts=0, available_at=timezone.now(), claimed_at=None, last_error=''
+        )
+        self.message_user(request, f'{updated} email(s) remis en file d\'envoi.')
+    requeue_emails.short_description = "Remettre en file d'envoi"
+
 # Personnalisation de l'interface d'administration
 admin.site.site_header = "Administration Investor Banque - Système de Prêts"
 admin.site.site_title = "Investor Banque Admin"
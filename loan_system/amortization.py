@@ -0,0 +1,274 @@
+"""
+Échéanciers d'amortissement à annuités constantes des prêts Investor Banque
+Les calculs se font en centimes entiers, mois par mois et pour tous les prêts à la fois ;
+les montants ne sont convertis en Decimal qu'à la lecture de l'échéancier
+"""
+
+import calendar
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP, localcontext
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+# Durée maximale autorisée : vingt-cinq (25) ans
+MAX_DURATION_MONTHS = 300
+
+DEFAULT_ANNUAL_INTEREST_RATE = Decimal('3.50')
+
+
+class Installment(NamedTuple):
+    numero: int
+    date_echeance: Optional[date]
+    mensualite: Decimal
+    interets: Decimal
+    capital: Decimal
+    capital_restant: Decimal
+
+
+def get_annual_rate(annual_rate=None):
+    """Taux nominal annuel en pourcentage (LOAN_ANNUAL_INTEREST_RATE par défaut)"""
+    if annual_rate is None:
+        annual_rate = getattr(settings, 'LOAN_ANNUAL_INTEREST_RATE', DEFAULT_ANNUAL_INTEREST_RATE)
+    rate = Decimal(str(annual_rate))
+    if not 0 <= rate < 100:
+        raise ValueError(f"Taux d'intérêt annuel invalide : {annual_rate}")
+    return rate
+
+
+def add_months(start, months):
+    """Même jour du mois, `months` mois plus tard (ramené au dernier jour si besoin)"""
+    month_index = start.month - 1 + months
+    year = start.year + month_index // 12
+    month = month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def _to_cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def _from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+@lru_cache(maxsize=1024)
+def annuity_factor(annual_rate, months):
+    """Part du capital remboursée chaque mois : r / (1 - (1 + r)^-n), r taux mensuel"""
+    if not 1 <= months <= MAX_DURATION_MONTHS:
+        raise ValueError(f"Durée hors limites (1 à {MAX_DURATION_MONTHS} mois) : {months}")
+    with localcontext() as context:
+        context.prec = 40
+        monthly_rate = Decimal(annual_rate) / 1200
+        if not monthly_rate:
+            return Decimal(1) / months
+        return monthly_rate / (1 - (1 + monthly_rate) ** -months)
+
+
+@lru_cache(maxsize=16)
+def annuity_factors(annual_rate):
+    """Facteurs d'annuité de toutes les durées autorisées pour un taux, indexés par nombre de mois"""
+    return (None,) + tuple(annuity_factor(annual_rate, months) for months in range(1, MAX_DURATION_MONTHS + 1))
+
+
+def _monthly_payment_cents(principal_cents, annual_rate, months):
+    if not 1 <= months <= MAX_DURATION_MONTHS:
+        raise ValueError(f"Durée hors limites (1 à {MAX_DURATION_MONTHS} mois) : {months}")
+    factor = annuity_factors(annual_rate)[months]
+    with localcontext() as context:
+        context.prec = 40
+        return int((principal_cents * factor).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def monthly_payment(principal, months, annual_rate=None):
+    """Mensualité constante, arrondie au centime"""
+    annual_rate = get_annual_rate(annual_rate)
+    return _from_cents(_monthly_payment_cents(_to_cents(principal), annual_rate, months))
+
+
+def _monthly_rate_ratio(annual_rate):
+    # Intérêts au centime le plus proche (demi vers le haut) : (2·b·num + den) // (2·den) avec r = num / den exactement,
+    # sans passer par la division décimale arrondie (0,035 / 12 ne tombe pas juste)
+    if not annual_rate:
+        return 0, 1
+    num, den = annual_rate.as_integer_ratio()
+    return num, den * 1200
+
+
+class AmortizationSchedule:
+    """Échéancier d'un prêt : une vue sur les colonnes calculées par `build_schedules`"""
+
+    def __init__(self, principal, annual_rate, duration, payment_cents, start_date, columns, position):
+        self.principal = principal
+        self.annual_rate = annual_rate
+        self.duration = duration
+        self.start_date = start_date
+        self._payment_cents = payment_cents
+        self._columns = columns
+        self._position = position
+
+    @property
+    def mensualite(self):
+        return _from_cents(self._payment_cents)
+
+    @property
+    def derniere_mensualite(self):
+        interest, capital, _ = self._row_cents(self.duration - 1)
+        return _from_cents(interest + capital)
+
+    @property
+    def total_interets(self):
+        position = self._position
+        return _from_cents(sum(self._columns[month][0][position] for month in range(self.duration)))
+
+    @property
+    def cout_total(self):
+        return self.principal + self.total_interets
+
+    @property
+    def date_fin(self):
+        return add_months(self.start_date, self.duration) if self.start_date else None
+
+    def _row_cents(self, index):
+        interests, capitals, balances = self._columns[index]
+        position = self._position
+        return interests[position], capitals[position], balances[position]
+
+    def __len__(self):
+        return self.duration
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.duration
+        if not 0 <= index < self.duration:
+            raise IndexError(index)
+        interest, capital, balance = self._row_cents(index)
+        return Installment(
+            numero=index + 1,
+            date_echeance=add_months(self.start_date, index + 1) if self.start_date else None,
+            mensualite=_from_cents(interest + capital),
+            interets=_from_cents(interest),
+            capital=_from_cents(capital),
+            capital_restant=_from_cents(balance),
+        )
+
+    def __iter__(self):
+        for index in range(self.duration):
+            yield self[index]
+
+    def __repr__(self):
+        return f"<AmortizationSchedule {self.principal} EUR sur {self.duration} mois à {self.annual_rate} %>"
+
+
+def build_schedules(loans, annual_rate=None):
+    """
+    Échéanciers d'une série de prêts (montant, durée en mois, date de départ ou None)
+    Les prêts sont rangés par durée décroissante : au mois m, les prêts encore en cours
+    forment un préfixe des colonnes, que chaque étape traite d'un seul bloc
+    """
+    annual_rate = get_annual_rate(annual_rate)
+    loans = [(Decimal(str(principal)), int(duration), start) for principal, duration, start in loans]
+    if not loans:
+        return []
+
+    order = sorted(range(len(loans)), key=lambda index: loans[index][1], reverse=True)
+    principals = [_to_cents(loans[index][0]) for index in order]
+    durations = [loans[index][1] for index in order]
+    payments = [_monthly_payment_cents(cents, annual_rate, duration) for cents, duration in zip(principals, durations)]
+
+    numerator, denominator = _monthly_rate_ratio(annual_rate)
+    twice_numerator = 2 * numerator
+    twice_denominator = 2 * denominator
+
+    columns = []
+    balances = principals
+    active = len(loans)
+    for month in range(1, durations[0] + 1):
+        while durations[active - 1] < month:
+            active -= 1
+        current = balances[:active]
+        interests = [(balance * twice_numerator + denominator) // twice_denominator for balance in current]
+        capitals = [payment - interest for payment, interest in zip(payments, interests)]
+
+        # Prêts dont c'est la dernière échéance (en fin de préfixe) : le capital restant est soldé
+        last = active
+        while last > 0 and durations[last - 1] == month:
+            last -= 1
+            capitals[last] = current[last]
+
+        balances = [balance - capital for balance, capital in zip(current, capitals)]
+        columns.append((interests, capitals, balances))
+
+    schedules = [None] * len(loans)
+    for position, index in enumerate(order):
+        principal, duration, start = loans[index]
+        if isinstance(start, datetime):
+            start = start.date()
+        schedules[index] = AmortizationSchedule(
+            principal, annual_rate, duration, payments[position], start, columns, position
+        )
+    return schedules
+
+
+def build_schedule(principal, months, start_date=None, annual_rate=None):
+    """Échéancier d'un seul prêt"""
+    return build_schedules([(principal, months, start_date)], annual_rate)[0]
+
+
+def schedules_for_loans(loans, annual_rate=None):
+    """Échéanciers d'un ensemble de demandes de prêt, indexés par identifiant"""
+    loans = list(loans)
+    schedules = build_schedules(
+        ((loan.montant, loan.duree_remboursement_mois, loan.date_paiement) for loan in loans),
+        annual_rate,
+    )
+    return {loan.pk: schedule for loan, schedule in zip(loans, schedules)}
+
+
+class Quote(NamedTuple):
+    montant: Decimal
+    duree: int
+    taux_annuel: Decimal
+    mensualite: Decimal
+    derniere_mensualite: Decimal
+    premiers_interets: Decimal
+    premier_capital: Decimal
+    total_interets: Decimal
+    cout_total: Decimal
+
+
+@lru_cache(maxsize=4096)
+def _quote(principal_cents, months, annual_rate):
+    payment = _monthly_payment_cents(principal_cents, annual_rate, months)
+    numerator, denominator = _monthly_rate_ratio(annual_rate)
+    twice_numerator = 2 * numerator
+    twice_denominator = 2 * denominator
+
+    # Même arrondi que build_schedules, sans conserver les lignes
+    balance = principal_cents
+    first_interest = total_interest = 0
+    for month in range(months):
+        interest = (balance * twice_numerator + denominator) // twice_denominator
+        if not month:
+            first_interest = interest
+        total_interest += interest
+        balance -= payment - interest
+    last_payment = payment + balance
+
+    return Quote(
+        montant=_from_cents(principal_cents),
+        duree=months,
+        taux_annuel=annual_rate,
+        mensualite=_from_cents(payment),
+        derniere_mensualite=_from_cents(last_payment),
+        premiers_interets=_from_cents(first_interest),
+        premier_capital=_from_cents(min(payment, principal_cents + first_interest) - first_interest),
+        total_interets=_from_cents(total_interest),
+        cout_total=_from_cents(principal_cents + total_interest),
+    )
+
+
+def quote(principal, months, annual_rate=None):
+    """Simulation d'un prêt (mensualité, coût total, première et dernière échéance), mémorisée"""
+    return _quote(_to_cents(principal), int(months), get_annual_rate(annual_rate))
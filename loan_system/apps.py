@@ -1,6 +1,17 @@
+import atexit
+
 from django.apps import AppConfig
 
 
 class LoanSystemConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'loan_system'
+
+    def ready(self):
+        from .email_dispatch import drain_email_queue
+
+        # ready() tourne pour chaque commande (migrate, tests...) : pas de préchauffage ici,
+        # gunicorn le fait au démarrage de ses workers (post_worker_init dans gunicorn.conf.py).
+        # Emails en mémoire envoyés ou reportés dans la file durable à la sortie du processus
+        # (gunicorn le fait plus tôt, dans worker_exit)
+        atexit.register(drain_email_queue)
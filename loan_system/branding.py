@@ -0,0 +1,161 @@
+"""
+Registre des images de marque Investor Banque (logo, cachet, signature)
+Les chemins sont résolus une seule fois depuis les settings, les images décodées
+sont gardées en mémoire et ne sont rechargées que si le fichier change
+"""
+
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Image
+
+logger = logging.getLogger(__name__)
+
+LOGO = 'logo'
+SEAL = 'seal'
+SIGNATURE = 'signature'
+
+# Setting de chaque image et chemin relatif recherché dans les fichiers statiques à défaut
+ASSETS = {
+    LOGO: ('INVESTOR_LOGO_PATH', os.path.join('images', 'logos', 'investor_logo.png')),
+    SEAL: ('BANK_SEAL_PATH', os.path.join('images', 'seals', 'bank_seal.png')),
+    SIGNATURE: ('MANAGER_SIGNATURE_PATH', os.path.join('images', 'signatures', 'manager_signature.png')),
+}
+
+# Settings dont dépend la résolution des chemins
+RESOLUTION_SETTINGS = {setting_name for setting_name, _ in ASSETS.values()} | {'STATIC_ROOT', 'STATICFILES_DIRS'}
+
+
+class AssetImage(Image):
+    """Flowable dessiné à partir de l'image déjà décodée du registre"""
+
+    def __init__(self, asset, width, height):
+        # Posé avant l'initialisation : ReportLab ne relit pas le fichier
+        self._img = asset.reader
+        super().__init__(asset.path, width=width, height=height)
+
+
+class BrandingAsset:
+    """Image décodée et dimensions intrinsèques d'un fichier dans une version donnée"""
+
+    def __init__(self, name, path, mtime):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.reader = ImageReader(path)
+        # Décodage immédiat : les documents ne font plus que réutiliser les pixels
+        self.reader.getRGBData()
+        self.width, self.height = self.reader.getSize()
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    @property
+    def aspect_ratio(self):
+        return self.width / self.height if self.height > 0 else 1
+
+    def fit(self, max_width, max_height):
+        """Dimensions d'affichage dans le cadre donné, proportions conservées"""
+        aspect_ratio = self.aspect_ratio
+        if aspect_ratio > 1:
+            # Image large
+            display_width = min(max_width, max_height * aspect_ratio)
+            display_height = display_width / aspect_ratio
+        else:
+            # Image haute
+            display_height = min(max_height, max_width / aspect_ratio)
+            display_width = display_height * aspect_ratio
+        return display_width, display_height
+
+    def flowable(self, width, height):
+        return AssetImage(self, width, height)
+
+    def fitted_flowable(self, max_width, max_height):
+        return self.flowable(*self.fit(max_width, max_height))
+
+    def derive(self, key, builder):
+        """Image dérivée de ce fichier (ex. filigrane), construite une fois par version"""
+        value = self._derived.get(key)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = self._derived[key] = builder(self.path)
+        return value
+
+
+class BrandingRegistry:
+    def __init__(self):
+        self._paths = None
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def _candidate_paths(self, name):
+        setting_name, relative_path = ASSETS[name]
+        candidates = [getattr(settings, setting_name, None)]
+        if getattr(settings, 'STATIC_ROOT', None):
+            candidates.append(os.path.join(settings.STATIC_ROOT, relative_path))
+        for static_dir in getattr(settings, 'STATICFILES_DIRS', None) or []:
+            candidates.append(os.path.join(static_dir, relative_path))
+        return [str(path) for path in candidates if path]
+
+    def resolve(self):
+        """Chemin retenu pour chaque image (None si introuvable), calculé une seule fois"""
+        if self._paths is None:
+            paths = {}
+            for name in ASSETS:
+                paths[name] = next((path for path in self._candidate_paths(name) if os.path.exists(path)), None)
+            self._paths = paths
+        return self._paths
+
+    def get(self, name):
+        """Image à jour, rechargée seulement si le fichier a changé depuis le dernier appel"""
+        path = self.resolve()[name]
+        if path is None:
+            return None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._assets.pop(name, None)
+            return None
+
+        asset = self._assets.get(name)
+        if asset is None or asset.mtime != mtime:
+            with self._lock:
+                asset = self._assets.get(name)
+                if asset is None or asset.mtime != mtime:
+                    try:
+                        asset = BrandingAsset(name, path, mtime)
+                    except Exception as e:
+                        logger.error(f"Image de marque illisible ({path}): {e}")
+                        self._assets.pop(name, None)
+                        return None
+                    self._assets[name] = asset
+        return asset
+
+    def warm(self):
+        """Résout et décode toutes les images (appelé au démarrage d'un worker gunicorn)"""
+        for name in ASSETS:
+            self.get(name)
+
+    def reset(self):
+        with self._lock:
+            self._paths = None
+            self._assets = {}
+
+
+registry = BrandingRegistry()
+
+
+def get_asset(name):
+    return registry.get(name)
+
+
+@receiver(setting_changed)
+def reset_registry(sender, setting, **kwargs):
+    if setting in RESOLUTION_SETTINGS:
+        registry.reset()
@@ -0,0 +1,191 @@
+"""
+Stockage des attestations de prêt Investor Banque
+Les PDF sont adressés par une empreinte de toutes leurs données d'entrée
+et ne sont régénérés que si l'une d'elles change
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from . import branding
+from .amortization import get_annual_rate
+from .utils import generate_loan_certificate
+
+logger = logging.getLogger(__name__)
+
+# Au-delà de cette taille, un PDF non stocké est tamponné sur disque plutôt qu'en mémoire
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# Un seul thread : la pré-génération ne doit pas concurrencer les requêtes web
+_pregeneration_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='certificates')
+
+# À incrémenter à chaque modification de la mise en page de l'attestation
+CERTIFICATE_LAYOUT_VERSION = 3
+
+LOAN_FINGERPRINT_FIELDS = (
+    'id', 'status', 'montant', 'montant_avance', 'motif', 'payment_key',
+    'duree_remboursement_mois', 'date_demande', 'date_validation', 'date_paiement',
+)
+PROFILE_FINGERPRINT_FIELDS = (
+    'nom', 'prenom', 'date_naissance', 'lieu_naissance',
+    'situation_matrimoniale', 'profession', 'adresse',
+)
+
+
+def get_certificate_storage():
+    """Backend de stockage des attestations (CERTIFICATE_STORAGE ou stockage média par défaut)"""
+    backend = getattr(settings, 'CERTIFICATE_STORAGE', None)
+    if backend:
+        return import_string(backend)()
+    return default_storage
+
+
+def _asset_versions():
+    """Version (taille, mtime) de chaque image intégrée au PDF"""
+    versions = {}
+    paths = branding.registry.resolve()
+    for name, (setting_name, _) in branding.ASSETS.items():
+        try:
+            stat = os.stat(paths[name])
+            versions[setting_name] = [stat.st_size, stat.st_mtime_ns]
+        except (TypeError, OSError):
+            versions[setting_name] = None
+    return versions
+
+
+def _fingerprint_value(value):
+    # Les montants sont imprimés au centime : 12500.0000 (avant sauvegarde) et 12500.00 sont identiques
+    if isinstance(value, Decimal):
+        return f"{value:.2f}"
+    return value
+
+
+def certificate_fingerprint(loan_request):
+    """Empreinte SHA-256 de toutes les données utilisées par l'attestation"""
+    profile = loan_request.user.userprofile
+    payload = {
+        'layout': CERTIFICATE_LAYOUT_VERSION,
+        'loan': {field: _fingerprint_value(getattr(loan_request, field)) for field in LOAN_FINGERPRINT_FIELDS},
+        'profile': {field: getattr(profile, field) for field in PROFILE_FINGERPRINT_FIELDS},
+        'assets': _asset_versions(),
+        'interest_rate': str(get_annual_rate()),
+        'schedule_appendix': bool(getattr(settings, 'CERTIFICATE_INCLUDE_SCHEDULE', False)),
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+
+def certificate_directory(loan_request):
+    prefix = getattr(settings, 'CERTIFICATE_STORAGE_PREFIX', 'certificates')
+    return f"{prefix}/INV-{loan_request.id:06d}"
+
+
+def certificate_name(loan_request, fingerprint=None):
+    """Chemin de l'attestation dans le stockage"""
+    fingerprint = fingerprint or certificate_fingerprint(loan_request)
+    return f"{certificate_directory(loan_request)}/{fingerprint}.pdf"
+
+
+def store_certificate(loan_request, pdf_content, fingerprint=None, storage=None):
+    """Enregistre le PDF et supprime les versions obsolètes de la même attestation"""
+    storage = storage or get_certificate_storage()
+    name = certificate_name(loan_request, fingerprint)
+    if not storage.exists(name):
+        saved_name = storage.save(name, ContentFile(pdf_content))
+        if saved_name != name:
+            # Un autre processus a enregistré la même version entre-temps
+            storage.delete(saved_name)
+
+    directory = certificate_directory(loan_request)
+    try:
+        _, files = storage.listdir(directory)
+    except (FileNotFoundError, NotImplementedError):
+        files = []
+    current = os.path.basename(name)
+    for filename in files:
+        if filename != current:
+            storage.delete(f"{directory}/{filename}")
+    return name
+
+
+def ensure_certificate(loan_request, storage=None):
+    """Génère et enregistre l'attestation si aucune version à jour n'existe (True si générée)"""
+    storage = storage or get_certificate_storage()
+    fingerprint = certificate_fingerprint(loan_request)
+    if storage.exists(certificate_name(loan_request, fingerprint)):
+        return False
+    pdf_content = generate_loan_certificate(loan_request)
+    store_certificate(loan_request, pdf_content, fingerprint, storage)
+    return True
+
+
+def certificate_modified_time(loan_request, fingerprint=None, storage=None):
+    """Date d'enregistrement de la version courante de l'attestation (None si absente)"""
+    storage = storage or get_certificate_storage()
+    try:
+        return storage.get_modified_time(certificate_name(loan_request, fingerprint))
+    except (OSError, NotImplementedError):
+        return None
+
+
+def open_certificate(loan_request, fingerprint=None, storage=None):
+    """Ouvre l'attestation en lecture binaire, en la générant et l'enregistrant si nécessaire"""
+    storage = storage or get_certificate_storage()
+    fingerprint = fingerprint or certificate_fingerprint(loan_request)
+    name = certificate_name(loan_request, fingerprint)
+
+    if not storage.exists(name):
+        pdf_content = generate_loan_certificate(loan_request)
+        try:
+            store_certificate(loan_request, pdf_content, fingerprint, storage)
+        except Exception as e:
+            # Le cache ne doit jamais empêcher le téléchargement
+            logger.error(f"Erreur stockage attestation INV-{loan_request.id:06d}: {e}")
+            spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            spooled.write(pdf_content)
+            spooled.seek(0)
+            return spooled
+
+    return storage.open(name, 'rb')
+
+
+def get_or_generate_certificate(loan_request, storage=None):
+    """Retourne l'attestation depuis le cache ou la génère et l'enregistre"""
+    with open_certificate(loan_request, storage=storage) as f:
+        return f.read()
+
+
+def pregenerate_certificate(loan_id):
+    """Pré-génère l'attestation d'un prêt payé, hors du cycle requête/réponse"""
+    from .models import LoanRequest
+
+    try:
+        loan_request = LoanRequest.objects.select_related('user__userprofile').get(pk=loan_id)
+        if loan_request.status != 'paye':
+            return False
+        if ensure_certificate(loan_request):
+            logger.info(f"Attestation INV-{loan_id:06d} pré-générée")
+        return True
+    except Exception as e:
+        logger.error(f"Erreur pré-génération attestation INV-{loan_id:06d}: {e}")
+        return False
+    finally:
+        # Le thread de pré-génération ne doit pas garder de connexion ouverte
+        connection.close()
+
+
+def schedule_certificate_pregeneration(loan_request):
+    """Planifie la pré-génération de l'attestation après validation de la transaction"""
+    loan_id = loan_request.pk
+    transaction.on_commit(lambda: _pregeneration_executor.submit(pregenerate_certificate, loan_id))
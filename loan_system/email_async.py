@@ -3,46 +3,243 @@ Service d'envoi d'emails asynchrone pour Investor Banque
 Optimisé pour la vitesse et la fiabilité
 """
 
-import threading
-import time
+import copy
+
 from django.core.mail import send_mail, EmailMultiAlternatives
-from django.template.loader import render_to_string
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Model
 from django.utils import timezone
 from django.contrib.auth.models import User
 from .models import UserProfile, LoanRequest, Payment, Notification, Message
+from .email_dispatch import EmailDispatcherClosed, EmailQueueFull, dispatch, dispatch_batch
+from .email_rendering import render_email
+from .email_throttle import acquire_quota, admit_message, release_message, release_quota
+from .outbox import enqueue, enqueue_admitted, enqueue_many, outbox_enabled
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _log_outcome(recipient_email):
+    def callback(future):
+        if future.cancelled():
+            # Annulé par drain_email_queue à l'arrêt du processus, qui l'a reporté dans la file durable
+            logger.info(f"Email à {recipient_email} reporté dans la file d'envoi durable")
+            return
+        error = future.exception()
+        if error is None:
+            logger.info(f"Email envoyé avec succès à {recipient_email}")
+        else:
+            logger.error(f"Erreur envoi email à {recipient_email}: {error}")
+    return callback
+
+def _log_batch_outcome(count):
+    def callback(future):
+        if future.cancelled():
+            logger.info(f"Envoi groupé de {count} email(s) reporté dans la file d'envoi durable")
+            return
+        error = future.exception()
+        if error is None:
+            logger.info(f"Envoi groupé : {future.result()}/{count} email(s) envoyé(s)")
+        else:
+            logger.error(f"Erreur envoi groupé de {count} email(s): {error}")
+    return callback
+
+def _unsent(future, messages):
+    """Emails d'un envoi terminé que le serveur n'a pas reçus (un envoi annulé est dans la file durable)"""
+    if future.cancelled():
+        return []
+    if future.exception() is not None or not future.result():
+        return list(messages)
+    return [message for message in messages if getattr(message, 'delivery_error', None)]
+
+def _release_unsent(messages):
+    """Rend les réservations d'email_throttle des emails que l'envoi n'a pas remis au serveur"""
+    def callback(future):
+        if future.cancelled():
+            # Reporté dans la file durable : le worker réservera son propre quota à l'envoi
+            release_quota(len(messages))
+            return
+        unsent = _unsent(future, messages)
+        for message in unsent:
+            release_message(message)
+        release_quota(len(unsent))
+    return callback
+
+def _snapshot(value, memo):
+    """Copie d'une instance de modèle et des objets liés déjà chargés (champs au moment de l'appel)"""
+    if not isinstance(value, Model):
+        return value
+    if id(value) not in memo:
+        copied = memo[id(value)] = copy.copy(value)
+        copied._state.fields_cache = {
+            name: _snapshot(related, memo) for name, related in value._state.fields_cache.items()
+        }
+    return memo[id(value)]
+
 class FastInvestorEmailService:
     """Service d'envoi d'emails rapide et asynchrone pour Investor Banque"""
     
     @staticmethod
-    def send_email_async(subject, html_content, text_content, recipient_email, from_email=None):
-        """Envoi asynchrone d'email pour la vitesse"""
-        def send_email_thread():
+    def send_email_async(subject, html_content, text_content, recipient_email, from_email=None, email_type=None, object_id=None):
+        """
+        Envoi asynchrone d'email via le pool d'envoi du processus
+        Retourne le Future de l'envoi, ou False si la file d'envoi est pleine ou si l'email
+        est écarté par email_throttle (doublon, limite par destinataire)
+        Avec EMAIL_USE_OUTBOX, l'email est enregistré dans la transaction courante
+        (OutboxEmail retourné) et envoyé par le worker, comme pendant l'arrêt du processus
+        ou au-delà du quota horaire
+        """
+        msg = FastInvestorEmailService.build_email(
+            subject, html_content, text_content, recipient_email, from_email, email_type=email_type, object_id=object_id
+        )
+        return FastInvestorEmailService.send_message_async(msg)
+    
+    @staticmethod
+    def send_on_commit(send, *args, using=None):
+        """
+        Appelle send(*args) (une méthode send_*_fast) après la validation de la transaction
+        courante, ou tout de suite hors transaction ; rien n'est envoyé si elle est annulée
+        Avec EMAIL_USE_OUTBOX, send est appelé tout de suite : l'email est mis en file dans la
+        transaction, sans fenêtre entre la validation et l'enregistrement où il serait perdu
+        Sinon, les instances de modèle sont copiées à l'appel : l'email décrit l'état enregistré même
+        si la requête les modifie ensuite, et le rendu se fait hors de la transaction
+        """
+        if outbox_enabled():
+            # File durable : l'email est enregistré dans la transaction elle-même, annulé avec elle
+            send(*args)
+            return
+        memo = {}
+        snapshot = [_snapshot(arg, memo) for arg in args]
+        transaction.on_commit(lambda: send(*snapshot), using=using, robust=True)
+    
+    @staticmethod
+    def build_email(subject, html_content, text_content, recipient_email, from_email=None, email_type=None, object_id=None):
+        """
+        Email HTML avec sa version texte, prêt à être envoyé
+        email_type et object_id identifient l'email pour la déduplication (email_throttle)
+        """
+        email_from = from_email if from_email else settings.DEFAULT_FROM_EMAIL
+        
+        msg = EmailMultiAlternatives(
+            subject=subject,
+            body=text_content,
+            from_email=email_from,
+            to=[recipient_email]
+        )
+        msg.attach_alternative(html_content, "text/html")
+        msg.email_type = email_type
+        msg.object_id = object_id
+        return msg
+    
+    @staticmethod
+    def send_message_async(msg):
+        """Envoi asynchrone d'un email déjà construit (voir send_email_async)"""
+        if outbox_enabled():
+            queued = enqueue_admitted([msg])
+            return queued[0][1] if queued else False
+        if not admit_message(msg):
+            return False
+        
+        granted, retry_after = acquire_quota()
+        if not granted:
+            return enqueue(msg, delay=retry_after)
+        
+        recipient_email = ', '.join(msg.to)
+        try:
+            future = dispatch(msg)
+        except EmailDispatcherClosed:
+            # Processus en cours d'arrêt : l'email sera envoyé par run_email_worker
+            release_quota(1)
+            return enqueue(msg)
+        except EmailQueueFull as e:
+            # Réservations rendues : une nouvelle tentative n'est pas prise pour un doublon
+            release_message(msg)
+            release_quota(1)
+            logger.error(f"Email à {recipient_email} non envoyé : {e}")
+            return False
+        future.add_done_callback(_log_outcome(recipient_email))
+        future.add_done_callback(_release_unsent([msg]))
+        return future
+    
+    @staticmethod
+    def send_bulk_fast(build_email, objects, on_outcome=None):
+        """
+        Envoi groupé pour les actions d'administration : les emails de tous les objets sont
+        construits puis envoyés en un seul lot (une connexion SMTP, send_messages par paquets)
+        Retourne (emails mis en envoi, emails en échec) sans attendre l'envoi ; les doublons
+        écartés par email_throttle ne comptent ni dans l'un ni dans l'autre
+        on_outcome(objets, envoyés), si fourni, est appelé dès que le sort des emails est connu :
+        envoyés vaut True pour les emails remis au serveur SMTP ou à la file durable, False pour
+        les autres (préparation impossible, doublon, échec d'envoi)
+        """
+        sources = {}
+        def report(msgs, sent):
+            if on_outcome is not None and msgs:
+                on_outcome([sources[id(msg)] for msg in msgs], sent)
+        
+        messages = []
+        rejected = []
+        failed = 0
+        for obj in objects:
             try:
-                email_from = from_email if from_email else settings.DEFAULT_FROM_EMAIL
-                
-                msg = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content,
-                    from_email=email_from,
-                    to=[recipient_email]
-                )
-                msg.attach_alternative(html_content, "text/html")
-                msg.send()
-                
-                logger.info(f"Email envoyé avec succès à {recipient_email}")
+                msg = build_email(obj)
             except Exception as e:
-                logger.error(f"Erreur envoi email à {recipient_email}: {e}")
+                logger.error(f"Erreur préparation email pour {obj}: {e}")
+                failed += 1
+                rejected.append(obj)
+                continue
+            messages.append(msg)
+            sources[id(msg)] = obj
+        if on_outcome is not None and rejected:
+            on_outcome(rejected, False)
+        
+        if outbox_enabled():
+            # Dans la transaction courante ; les doublons ne sont pas enregistrés
+            queued = {id(msg) for msg, _ in enqueue_admitted(messages)}
+            report([msg for msg in messages if id(msg) in queued], True)
+            report([msg for msg in messages if id(msg) not in queued], False)
+            return len(queued), failed
         
-        # Lancer l'envoi dans un thread séparé pour la vitesse
-        thread = threading.Thread(target=send_email_thread)
-        thread.daemon = True
-        thread.start()
-        return True
+        admitted = {id(msg) for msg in messages if admit_message(msg)}
+        report([msg for msg in messages if id(msg) not in admitted], False)
+        messages = [msg for msg in messages if id(msg) in admitted]
+        if not messages:
+            return 0, failed
+        
+        # Au-delà du quota horaire, les emails attendent dans la file durable
+        granted, retry_after = acquire_quota(len(messages))
+        deferred = messages[granted:]
+        if deferred:
+            enqueue_many(deferred, delay=retry_after)
+            report(deferred, True)
+        messages = messages[:granted]
+        if not messages:
+            return len(deferred), failed
+        
+        try:
+            future = dispatch_batch(messages)
+        except EmailDispatcherClosed:
+            release_quota(len(messages))
+            enqueue_many(messages)
+            report(messages, True)
+            return len(messages) + len(deferred), failed
+        except EmailQueueFull as e:
+            for msg in messages:
+                release_message(msg)
+            release_quota(len(messages))
+            logger.error(f"Envoi groupé de {len(messages)} email(s) refusé : {e}")
+            report(messages, False)
+            return len(deferred), failed + len(messages)
+        future.add_done_callback(_log_batch_outcome(len(messages)))
+        future.add_done_callback(_release_unsent(messages))
+        if on_outcome is not None:
+            def report_outcome(future):
+                unsent = {id(msg) for msg in _unsent(future, messages)}
+                report([msg for msg in messages if id(msg) not in unsent], True)
+                report([msg for msg in messages if id(msg) in unsent], False)
+            future.add_done_callback(report_outcome)
+        return len(messages) + len(deferred), failed
     
     @staticmethod
     def send_welcome_email_fast(user):
@@ -53,19 +250,13 @@ class FastInvestorEmailService:
                 'user': user,
                 'profile': profile,
                 'date_inscription': timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'support_email': 'support@virement.net',
-                'phone_support': '+49 157 50098219',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
             }
             
             subject = f"🏦 Bienvenue chez Investor Banque - Compte créé avec succès"
-            html_content = render_to_string('emails/welcome_email.html', context)
-            text_content = render_to_string('emails/welcome_email.txt', context)
+            html_content, text_content = render_email('welcome_email', context)
             
             return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
+                subject, html_content, text_content, user.email, email_type='welcome', object_id=user.pk
             )
             
         except Exception as e:
@@ -82,17 +273,13 @@ class FastInvestorEmailService:
                 'profile': profile,
                 'login_time': timezone.now().strftime('%d/%m/%Y à %H:%M'),
                 'ip_address': ip_address or 'Non disponible',
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
             }
             
             subject = f"🔐 Connexion à votre compte Investor Banque"
-            html_content = render_to_string('emails/login_alert.html', context)
-            text_content = render_to_string('emails/login_alert.txt', context)
+            html_content, text_content = render_email('login_alert', context)
             
             return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
+                subject, html_content, text_content, user.email, email_type='login_alert', object_id=user.pk
             )
             
         except Exception as e:
@@ -108,18 +295,13 @@ class FastInvestorEmailService:
                 'user': user,
                 'profile': profile,
                 'change_time': timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
             }
             
             subject = f"🔒 Modification de votre mot de passe Investor Banque"
-            html_content = render_to_string('emails/password_change_alert.html', context)
-            text_content = render_to_string('emails/password_change_alert.txt', context)
+            html_content, text_content = render_email('password_change_alert', context)
             
             return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
+                subject, html_content, text_content, user.email, email_type='password_change_alert', object_id=user.pk
             )
             
         except Exception as e:
@@ -137,106 +319,94 @@ class FastInvestorEmailService:
                 'profile': profile,
                 'loan_request': loan_request,
                 'request_date': loan_request.date_demande.strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
             }
             
             subject = f"📋 Confirmation de votre demande de prêt INV-{loan_request.id:06d}"
-            html_content = render_to_string('emails/loan_request_confirmation.html', context)
-            text_content = render_to_string('emails/loan_request_confirmation.txt', context)
+            html_content, text_content = render_email('loan_request_confirmation', context)
             
             return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
+                subject, html_content, text_content, user.email, email_type='loan_request_confirmation', object_id=loan_request.pk
             )
             
         except Exception as e:
             logger.error(f"Erreur confirmation demande prêt: {e}")
             return False
     
+    @staticmethod
+    def build_loan_approval_email(loan_request):
+        """Email d'approbation de prêt"""
+        user = loan_request.user
+        profile = user.userprofile
+        context = {
+            'user': user,
+            'profile': profile,
+            'loan_request': loan_request,
+            'approval_date': timezone.now().strftime('%d/%m/%Y à %H:%M'),
+        }
+
+        subject = f"🎉 Félicitations ! Votre prêt INV-{loan_request.id:06d} a été approuvé"
+        html_content, text_content = render_email('loan_approval', context)
+        return FastInvestorEmailService.build_email(
+            subject, html_content, text_content, user.email, email_type='loan_approval', object_id=loan_request.pk
+        )
+    
     @staticmethod
     def send_loan_approval_fast(loan_request):
         """Email d'approbation de prêt rapide"""
         try:
-            user = loan_request.user
-            profile = user.userprofile
-            context = {
-                'user': user,
-                'profile': profile,
-                'loan_request': loan_request,
-                'approval_date': timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
-            }
-            
-            subject = f"🎉 Félicitations ! Votre prêt INV-{loan_request.id:06d} a été approuvé"
-            html_content = render_to_string('emails/loan_approval.html', context)
-            text_content = render_to_string('emails/loan_approval.txt', context)
-            
-            return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
-            )
-            
+            return FastInvestorEmailService.send_message_async(FastInvestorEmailService.build_loan_approval_email(loan_request))
         except Exception as e:
             logger.error(f"Erreur email approbation: {e}")
             return False
     
+    @staticmethod
+    def build_subscription_activated_email(user):
+        """Email d'activation de compte"""
+        profile = user.userprofile
+        context = {
+            'user': user,
+            'profile': profile,
+            'activation_date': timezone.now().strftime('%d/%m/%Y à %H:%M'),
+        }
+
+        subject = f"✅ Votre compte Investor Banque est maintenant actif"
+        html_content, text_content = render_email('subscription_activated', context)
+        return FastInvestorEmailService.build_email(
+            subject, html_content, text_content, user.email, email_type='subscription_activated', object_id=user.pk
+        )
+    
     @staticmethod
     def send_subscription_activated_fast(user):
         """Email d'activation de compte rapide"""
         try:
-            profile = user.userprofile
-            context = {
-                'user': user,
-                'profile': profile,
-                'activation_date': timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
-            }
-            
-            subject = f"✅ Votre compte Investor Banque est maintenant actif"
-            html_content = render_to_string('emails/subscription_activated.html', context)
-            text_content = render_to_string('emails/subscription_activated.txt', context)
-            
-            return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
-            )
-            
+            return FastInvestorEmailService.send_message_async(FastInvestorEmailService.build_subscription_activated_email(user))
         except Exception as e:
             logger.error(f"Erreur email activation: {e}")
             return False
     
+    @staticmethod
+    def build_loan_rejection_email(loan_request):
+        """Email de rejet de prêt"""
+        user = loan_request.user
+        profile = user.userprofile
+        context = {
+            'user': user,
+            'profile': profile,
+            'loan_request': loan_request,
+            'rejection_date': timezone.now().strftime('%d/%m/%Y à %H:%M'),
+        }
+
+        subject = f"❌ Décision concernant votre demande de prêt INV-{loan_request.id:06d}"
+        html_content, text_content = render_email('loan_rejection', context)
+        return FastInvestorEmailService.build_email(
+            subject, html_content, text_content, user.email, email_type='loan_rejection', object_id=loan_request.pk
+        )
+    
     @staticmethod
     def send_loan_rejection_fast(loan_request):
         """Email de rejet de prêt rapide"""
         try:
-            user = loan_request.user
-            profile = user.userprofile
-            context = {
-                'user': user,
-                'profile': profile,
-                'loan_request': loan_request,
-                'rejection_date': timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
-                'phone_support': '+49 157 50098219',
-            }
-            
-            subject = f"❌ Décision concernant votre demande de prêt INV-{loan_request.id:06d}"
-            html_content = render_to_string('emails/loan_rejection.html', context)
-            text_content = render_to_string('emails/loan_rejection.txt', context)
-            
-            return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
-            )
-            
+            return FastInvestorEmailService.send_message_async(FastInvestorEmailService.build_loan_rejection_email(loan_request))
         except Exception as e:
             logger.error(f"Erreur email rejet: {e}")
             return False
@@ -253,19 +423,13 @@ class FastInvestorEmailService:
                 'loan_request': loan_request,
                 'payment': payment,
                 'payment_date': payment.date_validation.strftime('%d/%m/%Y à %H:%M') if payment.date_validation else timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
-                'phone_support': '+49 157 50098219',
             }
             
             subject = f"✅ Paiement confirmé - Prêt INV-{loan_request.id:06d}"
-            html_content = render_to_string('emails/payment_confirmation.html', context)
-            text_content = render_to_string('emails/payment_confirmation.txt', context)
+            html_content, text_content = render_email('payment_confirmation', context)
             
             return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
+                subject, html_content, text_content, user.email, email_type='payment_confirmation', object_id=payment.pk
             )
             
         except Exception as e:
@@ -300,77 +464,85 @@ class FastInvestorEmailService:
                 'status_date': status_date,
                 'old_status': old_status,
                 'new_status': new_status,
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
-                'phone_support': '+49 157 50098219',
             }
             
             # Sélection du template et sujet selon le statut
             if new_status == 'valide':
                 subject = f"✅ Votre prêt INV-{loan_request.id:06d} a été validé"
-                html_template = 'emails/loan_status_validated.html'
-                txt_template = 'emails/loan_status_validated.txt'
+                template = 'loan_status_validated'
             elif new_status == 'rejete':
                 subject = f"❌ Décision concernant votre demande de prêt INV-{loan_request.id:06d}"
-                html_template = 'emails/loan_rejection.html'
-                txt_template = 'emails/loan_rejection.txt'
+                template = 'loan_rejection'
             elif new_status == 'paye':
                 subject = f"✅ Paiement confirmé - Prêt INV-{loan_request.id:06d}"
-                html_template = 'emails/loan_status_paid.html'
-                txt_template = 'emails/loan_status_paid.txt'
+                template = 'loan_status_paid'
             elif new_status == 'active':
                 subject = f"🎉 Votre prêt INV-{loan_request.id:06d} est maintenant actif"
-                html_template = 'emails/loan_status_active.html'
-                txt_template = 'emails/loan_status_active.txt'
+                template = 'loan_status_active'
             elif new_status == 'en_attente':
                 subject = f"📋 Votre demande de prêt INV-{loan_request.id:06d} est en attente"
-                html_template = 'emails/loan_status_pending.html'
-                txt_template = 'emails/loan_status_pending.txt'
+                template = 'loan_status_pending'
             else:
                 return False
             
-            html_content = render_to_string(html_template, context)
-            text_content = render_to_string(txt_template, context)
+            html_content, text_content = render_email(template, context)
             
             return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
+                subject, html_content, text_content, user.email,
+                email_type='status_change', object_id=f'{loan_request.pk}:{new_status}'
             )
             
         except Exception as e:
             logger.error(f"Erreur email changement statut {new_status}: {e}")
             return False
 
+    @staticmethod
+    def build_notification_email(notification: Notification):
+        """Email d'une Notification pour un client"""
+        user = notification.recipient
+        profile = user.userprofile
+        context = {
+            'user': user,
+            'profile': profile,
+            'notification': notification,
+            'title': notification.title,
+            'content': notification.content,
+            'created_at': notification.created_at.strftime('%d/%m/%Y à %H:%M') if notification.created_at else timezone.now().strftime('%d/%m/%Y à %H:%M'),
+            'action_url': notification.action_url,
+            'action_text': notification.action_text,
+        }
+
+        subject = f"🔔 Notification: {notification.title}"
+        html_content, text_content = render_email('notification', context)
+        return FastInvestorEmailService.build_email(
+            subject, html_content, text_content, user.email, email_type='notification', object_id=notification.pk
+        )
+    
+    @staticmethod
+    def build_notification_digest_email(digest):
+        """Récapitulatif des notifications d'un client : digest = (destinataire, [Notification])"""
+        user, notifications = digest
+        profile = user.userprofile
+        context = {
+            'user': user,
+            'profile': profile,
+            'notifications': notifications,
+            'count': len(notifications),
+            'digest_date': timezone.now().strftime('%d/%m/%Y à %H:%M'),
+        }
+
+        subject = f"🔔 {len(notifications)} nouvelle(s) notification(s) - Investor Banque"
+        html_content, text_content = render_email('notification_digest', context)
+        return FastInvestorEmailService.build_email(
+            subject, html_content, text_content, user.email,
+            email_type='notification_digest', object_id=max(notification.pk for notification in notifications)
+        )
+    
     @staticmethod
     def send_notification_email_fast(notification: Notification):
         """Envoi d'un email lors de la création d'une Notification pour un client"""
         try:
-            user = notification.recipient
-            profile = user.userprofile
-            context = {
-                'user': user,
-                'profile': profile,
-                'notification': notification,
-                'title': notification.title,
-                'content': notification.content,
-                'created_at': notification.created_at.strftime('%d/%m/%Y à %H:%M') if notification.created_at else timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'action_url': notification.action_url,
-                'action_text': notification.action_text,
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
-                'phone_support': '+49 157 50098219',
-            }
-
-            subject = f"🔔 Notification: {notification.title}"
-            html_content = render_to_string('emails/notification.html', context)
-            text_content = render_to_string('emails/notification.txt', context)
-
-            return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
-            )
+            return FastInvestorEmailService.send_message_async(FastInvestorEmailService.build_notification_email(notification))
         except Exception as e:
             logger.error(f"Erreur email notification: {e}")
             return False
@@ -393,19 +565,13 @@ class FastInvestorEmailService:
                 'content': message.content,
                 'created_at': message.created_at.strftime('%d/%m/%Y à %H:%M') if message.created_at else timezone.now().strftime('%d/%m/%Y à %H:%M'),
                 'loan_request': message.loan_request,
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
-                'phone_support': '+49 157 50098219',
             }
 
             subject = f"📩 Nouveau message de votre gestionnaire: {message.subject}"
-            html_content = render_to_string('emails/new_message.html', context)
-            text_content = render_to_string('emails/new_message.txt', context)
+            html_content, text_content = render_email('new_message', context)
 
             return FastInvestorEmailService.send_email_async(
-                subject, html_content, text_content, user.email
+                subject, html_content, text_content, user.email, email_type='message', object_id=message.pk
             )
         except Exception as e:
             logger.error(f"Erreur email message: {e}")
@@ -0,0 +1,370 @@
+"""
+Pool d'envoi des emails Investor Banque
+Un seul pool de threads par processus, avec une file bornée : au-delà, la politique
+de débordement s'applique (attendre, refuser ou envoyer dans le thread appelant).
+Avec EMAIL_DELIVERY_ENGINE = 'asyncio' et un backend SMTP, les emails passent par le
+moteur asyncio de smtp_async à la place.
+À l'arrêt du processus, drain_email_queue() termine les envois dans un délai borné et
+reporte les emails restants dans la file durable (OutboxEmail)
+"""
+
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+BLOCK = 'block'
+REJECT = 'reject'
+CALLER_RUNS = 'caller_runs'
+OVERFLOW_POLICIES = (BLOCK, REJECT, CALLER_RUNS)
+
+DISPATCH_SETTINGS = {
+    'EMAIL_DISPATCH_WORKERS', 'EMAIL_DISPATCH_QUEUE_SIZE', 'EMAIL_DISPATCH_OVERFLOW',
+    'EMAIL_DISPATCH_BLOCK_TIMEOUT',
+}
+DEFAULT_SHUTDOWN_TIMEOUT = 20
+
+THREADS = 'threads'
+ASYNCIO = 'asyncio'
+DELIVERY_ENGINES = (THREADS, ASYNCIO)
+# Backends dont le moteur asyncio reprend le rôle (même serveur, mêmes identifiants)
+SMTP_BACKENDS = {'django.core.mail.backends.smtp.EmailBackend', 'loan_system.smtp_pool.PooledEmailBackend'}
+
+# Nombre d'envois récents conservés pour les percentiles de latence
+LATENCY_SAMPLES = 1000
+
+
+class EmailQueueFull(Exception):
+    """La file d'envoi est pleine et la politique de débordement refuse l'email"""
+
+
+class EmailDispatcherClosed(EmailQueueFull):
+    """Le processus s'arrête : le pool n'accepte plus d'emails (à mettre dans la file durable)"""
+
+
+class EmailBatch:
+    """
+    Lot d'emails envoyé comme un seul email par le pool : une connexion pour tout le lot,
+    emails envoyés un à un par paquets de chunk_size (un bilan d'erreurs par paquet) ; un email
+    en échec n'arrête pas les suivants et garde l'erreur dans `delivery_error`
+    """
+
+    def __init__(self, messages, chunk_size=50):
+        self.messages = list(messages)
+        self.chunk_size = max(1, chunk_size)
+
+    def send(self):
+        sent = 0
+        with get_connection() as connection:
+            for start in range(0, len(self.messages), self.chunk_size):
+                chunk = self.messages[start:start + self.chunk_size]
+                errors = []
+                for message in chunk:
+                    # Un email à la fois : seuls ceux que le serveur n'a pas acceptés sont en échec
+                    try:
+                        if not connection.send_messages([message]):
+                            raise RuntimeError("Email refusé par le serveur")
+                    except Exception as e:
+                        message.delivery_error = e
+                        errors.append(e)
+                        # Connexion peut-être rompue : rouverte pour l'email suivant
+                        connection.close()
+                    else:
+                        sent += 1
+                if errors:
+                    logger.error(f"Erreur envoi de {len(errors)}/{len(chunk)} email(s) d'un paquet: {errors[-1]}")
+        return sent
+
+    def __len__(self):
+        return len(self.messages)
+
+
+class EmailDispatcher:
+    def __init__(self, workers=4, queue_size=200, overflow=BLOCK, block_timeout=10):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Politique de débordement inconnue : {overflow}")
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='emails')
+        # Une place par email en cours d'envoi ou en attente
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._counters = {'submitted': 0, 'sent': 0, 'failed': 0, 'rejected': 0, 'caller_runs': 0}
+        self.closed = False
+        # Emails confiés au pool et pas encore envoyés, pour les reporter à l'arrêt
+        self._unfinished = {}
+        self._send_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._queue_waits = deque(maxlen=LATENCY_SAMPLES)
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def _send(self, message, queued_at):
+        started = time.perf_counter()
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+            self._queue_waits.append(started - queued_at)
+        try:
+            result = message.send()
+        except Exception:
+            self._count('failed', _size(message))
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._send_latencies.append(time.perf_counter() - started)
+        if isinstance(message, EmailBatch):
+            # Compteurs en emails : les paquets en échec du lot sont comptés un à un
+            self._count('sent', result)
+            self._count('failed', len(message) - result)
+        else:
+            self._count('sent')
+        return result
+
+    def _send_inline(self, message):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(self._send(message, time.perf_counter()))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def submit(self, message):
+        """Planifie l'envoi d'un EmailMessage ; le Future donne le résultat de message.send()"""
+        if self.closed:
+            raise EmailDispatcherClosed("Pool d'envoi arrêté")
+        self._count('submitted', _size(message))
+        if self.overflow == BLOCK:
+            acquired = self._slots.acquire(timeout=self.block_timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+
+        if not acquired:
+            if self.overflow == CALLER_RUNS:
+                self._count('caller_runs', _size(message))
+                with self._lock:
+                    self._pending += 1
+                return self._send_inline(message)
+            self._count('rejected', _size(message))
+            raise EmailQueueFull(f"File d'envoi pleine ({self.workers + self.queue_size} emails en cours)")
+
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._send, message, time.perf_counter())
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+            raise
+        with self._lock:
+            self._unfinished[future] = message
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._unfinished.pop(future, None)
+        self._slots.release()
+
+    def send_now(self, message):
+        """Envoi synchrone, compté dans les mêmes métriques"""
+        self._count('submitted', _size(message))
+        with self._lock:
+            self._pending += 1
+        return self._send_inline(message)
+
+    def metrics(self):
+        """Profondeur de file, compteurs et latences (p50/p95 en ms) des derniers envois"""
+        with self._lock:
+            send_latencies = sorted(self._send_latencies)
+            queue_waits = sorted(self._queue_waits)
+            metrics = dict(self._counters)
+            metrics.update({
+                'workers': self.workers,
+                'queue_capacity': self.queue_size,
+                'queue_depth': self._pending,
+                'in_flight': self._running,
+            })
+        metrics['send_latency_ms'] = _percentiles(send_latencies)
+        metrics['queue_wait_ms'] = _percentiles(queue_waits)
+        return metrics
+
+    def drain(self, timeout):
+        """
+        N'accepte plus d'emails et attend au plus `timeout` secondes les envois planifiés
+        Retourne (emails jamais commencés, nombre d'envois encore en cours)
+        """
+        self.closed = True
+        with self._lock:
+            unfinished = dict(self._unfinished)
+        wait(unfinished, timeout=max(0, timeout))
+        leftovers, running = [], 0
+        for future, message in unfinished.items():
+            if future.cancel():
+                leftovers.append(message)
+            elif not future.done():
+                running += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        return leftovers, running
+
+    def shutdown(self, wait=True):
+        self.closed = True
+        self._executor.shutdown(wait=wait)
+
+
+def _size(message):
+    return len(message) if isinstance(message, EmailBatch) else 1
+
+
+def _percentiles(sorted_values):
+    if not sorted_values:
+        return {'p50': None, 'p95': None}
+    return {
+        'p50': round(statistics.median(sorted_values) * 1000, 1),
+        'p95': round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * 0.95))] * 1000, 1),
+    }
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Pool d'envoi du processus, créé au premier email (après le fork des workers gunicorn)"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = EmailDispatcher(
+                    workers=getattr(settings, 'EMAIL_DISPATCH_WORKERS', 4),
+                    queue_size=getattr(settings, 'EMAIL_DISPATCH_QUEUE_SIZE', 200),
+                    overflow=getattr(settings, 'EMAIL_DISPATCH_OVERFLOW', BLOCK),
+                    block_timeout=getattr(settings, 'EMAIL_DISPATCH_BLOCK_TIMEOUT', 10),
+                )
+    return _dispatcher
+
+
+def reset_dispatcher(wait=True):
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.shutdown(wait=wait)
+
+
+def delivery_engine():
+    """
+    Moteur d'envoi effectif : 'asyncio' seulement pour un backend SMTP et un envoi asynchrone ;
+    les autres backends (console, locmem…) passent toujours par le pool de threads
+    """
+    engine = getattr(settings, 'EMAIL_DELIVERY_ENGINE', THREADS)
+    if engine not in DELIVERY_ENGINES:
+        raise ValueError(f"Moteur d'envoi inconnu : {engine}")
+    if (
+        engine == ASYNCIO
+        and getattr(settings, 'EMAIL_ASYNC_SENDING', True)
+        and settings.EMAIL_BACKEND in SMTP_BACKENDS
+    ):
+        return ASYNCIO
+    return THREADS
+
+
+def dispatch(message):
+    """Envoie un email via le pool (ou immédiatement si EMAIL_ASYNC_SENDING est désactivé)"""
+    if delivery_engine() == ASYNCIO:
+        from .smtp_async import get_async_engine
+        return get_async_engine().submit(message)
+    dispatcher = get_dispatcher()
+    if not getattr(settings, 'EMAIL_ASYNC_SENDING', True):
+        return dispatcher.send_now(message)
+    return dispatcher.submit(message)
+
+
+def dispatch_batch(messages):
+    """Envoie plusieurs emails sur une seule connexion via le pool ; le Future donne le nombre envoyé"""
+    if delivery_engine() == ASYNCIO:
+        from .smtp_async import get_async_engine
+        return get_async_engine().submit_many(messages)
+    return dispatch(EmailBatch(messages, getattr(settings, 'EMAIL_BULK_CHUNK_SIZE', 50)))
+
+
+def drain_email_queue(timeout=None):
+    """
+    Arrêt du processus : plus aucun email accepté, envois en cours terminés en au plus
+    EMAIL_SHUTDOWN_TIMEOUT secondes, emails restants enregistrés dans la file durable pour
+    run_email_worker ; retourne le bilan (aussi écrit dans les logs), ou None si déjà fait
+    """
+    from .outbox import enqueue_many
+    from .smtp_async import active_async_engine
+
+    if timeout is None:
+        timeout = getattr(settings, 'EMAIL_SHUTDOWN_TIMEOUT', DEFAULT_SHUTDOWN_TIMEOUT)
+    deadline = time.monotonic() + timeout
+    engines = [engine for engine in (_dispatcher, active_async_engine()) if engine is not None and not engine.closed]
+    if not engines:
+        return None
+
+    summary = {'sent': 0, 'failed': 0, 'spilled': 0, 'running': 0, 'lost': 0}
+    leftovers = []
+    for engine in engines:
+        engine_leftovers, running = engine.drain(deadline - time.monotonic())
+        leftovers += _expand(engine_leftovers)
+        summary['running'] += running
+        metrics = engine.metrics()
+        summary['sent'] += metrics['sent']
+        summary['failed'] += metrics['failed']
+
+    if leftovers:
+        try:
+            enqueue_many(leftovers)
+            summary['spilled'] = len(leftovers)
+        except Exception as e:
+            summary['lost'] = len(leftovers)
+            recipients = ', '.join(address for message in leftovers for address in message.to)
+            logger.error(f"Arrêt : {len(leftovers)} email(s) non reportés dans la file durable ({recipients}): {e}")
+
+    log = logger.warning if summary['running'] or summary['lost'] else logger.info
+    log(
+        f"Arrêt du pool d'envoi : {summary['sent']} email(s) envoyé(s), {summary['failed']} en échec, "
+        f"{summary['spilled']} reporté(s) dans la file durable, {summary['running']} envoi(s) encore en cours "
+        f"après {timeout} s, {summary['lost']} perdu(s)"
+    )
+    return summary
+
+
+def _expand(items):
+    """Emails d'une liste d'envois planifiés (un EmailBatch compte pour tous ses emails)"""
+    messages = []
+    for item in items:
+        messages.extend(item.messages if isinstance(item, EmailBatch) else [item])
+    return messages
+
+
+def email_metrics():
+    if delivery_engine() == ASYNCIO:
+        from .smtp_async import get_async_engine
+        return get_async_engine().metrics()
+    return get_dispatcher().metrics()
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(sender, setting, **kwargs):
+    if setting in DISPATCH_SETTINGS:
+        reset_dispatcher()
@@ -0,0 +1,305 @@
+"""
+Préparation des gabarits d'emails au déploiement (manage.py build_email_templates)
+Les règles CSS des blocs <style> sont recopiées dans l'attribut style des éléments, pour
+les messageries qui suppriment les feuilles de style, puis le HTML est minifié.
+Le travail se fait sur la source des gabarits : les balises Django sont conservées et
+le rendu à l'envoi se limite à la substitution des variables
+"""
+
+import hashlib
+import json
+import re
+from pathlib import Path
+
+MANIFEST_NAME = 'manifest.json'
+STYLE_PLACEHOLDER = '<!--[if styles]-->'
+
+# Les espaces autour de ces éléments n'apparaissent pas à l'affichage
+BLOCK_ELEMENTS = {
+    'html', 'head', 'body', 'title', 'meta', 'link', 'style', 'div', 'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'ul', 'ol', 'li', 'table', 'thead', 'tbody', 'tr', 'td', 'th', 'br', 'hr', 'header', 'footer', 'section',
+}
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'}
+
+STYLE_BLOCK_RE = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+EXTENDS_RE = re.compile(r'{%\s*extends\s+["\']([^"\']+)["\']\s*%}')
+CONTENT_BLOCK_RE = re.compile(r'{%\s*block\s+content\s*%}')
+TAG_RE = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][\w-]*)((?:[^<>"\']|"[^"]*"|\'[^\']*\')*)>', re.S)
+ATTRIBUTE_RE = re.compile(r'([\w:-]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s"\'>]+))?')
+COMPOUND_RE = re.compile(r'^([a-zA-Z][\w-]*)?((?:\.[\w-]+)*)$')
+
+
+class CSSRule:
+    __slots__ = ('parts', 'specificity', 'order', 'declarations')
+
+    def __init__(self, parts, order, declarations):
+        self.parts = parts
+        self.specificity = (sum(len(classes) for _, classes in parts), sum(1 for tag, _ in parts if tag))
+        self.order = order
+        self.declarations = declarations
+
+    def matches(self, stack):
+        """stack : éléments ouverts (balise, classes), l'élément testé en dernier"""
+        if not _compound_matches(self.parts[-1], stack[-1]):
+            return False
+        position = len(stack) - 1
+        for part in reversed(self.parts[:-1]):
+            position -= 1
+            while position >= 0 and not _compound_matches(part, stack[position]):
+                position -= 1
+            if position < 0:
+                return False
+        return True
+
+
+def _compound_matches(part, element):
+    tag, classes = part
+    return (not tag or tag == element[0]) and classes <= element[1]
+
+
+def _parse_selector(selector):
+    """Sélecteur simple (balises, classes, descendants) ou None s'il ne peut pas être recopié"""
+    parts = []
+    for compound in selector.split():
+        match = COMPOUND_RE.match(compound)
+        if not match or compound == '*':
+            return None
+        tag, classes = match.groups()
+        parts.append(((tag or '').lower(), frozenset(filter(None, classes.split('.')))))
+    return parts or None
+
+
+def _split_blocks(css):
+    """Découpe une feuille de style en (prélude, corps) au premier niveau d'accolades"""
+    blocks, depth, start, prelude = [], 0, 0, ''
+    for index, char in enumerate(css):
+        if char == '{':
+            if depth == 0:
+                prelude, start = css[start:index].strip(), index + 1
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                blocks.append((prelude, css[start:index].strip()))
+                start = index + 1
+    return blocks
+
+
+def _parse_declarations(body):
+    declarations = []
+    for declaration in body.split(';'):
+        name, colon, value = declaration.partition(':')
+        if colon and name.strip() and value.strip():
+            declarations.append((name.strip().lower(), ' '.join(value.split())))
+    return declarations
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = ' '.join(css.split())
+    css = re.sub(r'\s*([{};:,])\s*', r'\1', css).replace(';}', '}')
+    # Jamais de {{, {% ou {# : le CSS est inséré dans un gabarit Django
+    return re.sub(r'{(?=[{%#])', '{ ', css)
+
+
+def parse_stylesheet(css):
+    """
+    Règles recopiables dans les éléments, et CSS restant (pseudo-classes, @media, @keyframes…)
+    à garder dans un bloc <style> pour les messageries qui le prennent en charge
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    rules, residual = [], []
+    for prelude, body in _split_blocks(css):
+        if prelude.startswith('@'):
+            residual.append(f'{prelude}{{{body}}}')
+            continue
+        declarations = _parse_declarations(body)
+        kept = []
+        for selector in prelude.split(','):
+            parts = _parse_selector(selector.strip())
+            if parts is None:
+                kept.append(selector.strip())
+            else:
+                rules.append(CSSRule(parts, len(rules), declarations))
+        if kept:
+            residual.append(f"{','.join(kept)}{{{body}}}")
+    return rules, minify_css(''.join(residual))
+
+
+def _element(tag, attributes):
+    classes = attributes.get('class', '')
+    return tag.lower(), frozenset(name for name in classes.split() if '{' not in name and '%' not in name)
+
+
+def _parse_attributes(text):
+    attributes = {}
+    for name, value in ATTRIBUTE_RE.findall(text):
+        if value[:1] in ('"', "'"):
+            value = value[1:-1]
+        attributes[name.lower()] = value
+    return attributes
+
+
+def _with_style(tag_text, declarations):
+    """Balise ouvrante avec les déclarations calculées ; un attribut style existant reste prioritaire"""
+    style = ';'.join(f'{name}:{value}' for name, value in declarations).replace('"', "'")
+    match = re.search(r'\sstyle\s*=\s*("([^"]*)"|\'([^\']*)\')', tag_text)
+    if match:
+        existing = match.group(2) if match.group(2) is not None else match.group(3)
+        merged = f"{style};{existing.strip()}"
+        return tag_text[:match.start()] + f' style="{merged}"' + tag_text[match.end():]
+    closing = '/>' if tag_text.endswith('/>') else '>'
+    return tag_text[:-len(closing)].rstrip() + f' style="{style}"' + closing
+
+
+def inline_css(source, rules, ancestors=()):
+    """
+    Recopie les règles dans l'attribut style de chaque élément de la source
+    ancestors : éléments englobants (gabarit parent) pour les sélecteurs descendants
+    """
+    stack = list(ancestors)
+    output, position = [], 0
+    for match in TAG_RE.finditer(source):
+        closing, tag = match.group(1), match.group(2)
+        if tag is None:
+            continue
+        tag = tag.lower()
+        if closing:
+            # Fermeture : dépile jusqu'à l'élément correspondant, s'il est ouvert
+            for index in range(len(stack) - 1, len(ancestors) - 1, -1):
+                if stack[index][0] == tag:
+                    del stack[index:]
+                    break
+            continue
+
+        element = _element(tag, _parse_attributes(match.group(3)))
+        stack.append(element)
+        matching = sorted((rule for rule in rules if rule.matches(stack)), key=lambda rule: (rule.specificity, rule.order))
+        if matching:
+            declarations = {}
+            for rule in matching:
+                for name, value in rule.declarations:
+                    declarations.pop(name, None)
+                    declarations[name] = value
+            output.append(source[position:match.start()])
+            output.append(_with_style(match.group(0), declarations.items()))
+            position = match.end()
+        if tag in VOID_ELEMENTS or match.group(0).endswith('/>'):
+            stack.pop()
+    output.append(source[position:])
+    return ''.join(output)
+
+
+def open_elements(source):
+    """Éléments encore ouverts à la fin de la source (ex. avant le bloc content du gabarit parent)"""
+    stack = []
+    for match in TAG_RE.finditer(source):
+        closing, tag = match.group(1), match.group(2)
+        if tag is None:
+            continue
+        tag = tag.lower()
+        if closing:
+            for index in range(len(stack) - 1, -1, -1):
+                if stack[index][0] == tag:
+                    del stack[index:]
+                    break
+        elif tag not in VOID_ELEMENTS and not match.group(0).endswith('/>'):
+            stack.append(_element(tag, _parse_attributes(match.group(3))))
+    return stack
+
+
+def minify_html(source):
+    """
+    Supprime les commentaires HTML et l'indentation autour des éléments de bloc ; ailleurs,
+    les suites d'espaces sont réduites à un seul caractère sans jamais coller deux mots
+    """
+    source = re.sub(r'<!--(?!\[if).*?-->', '', source, flags=re.S)
+    pieces = []
+    position, previous_tag = 0, None
+    for match in TAG_RE.finditer(source):
+        tag = (match.group(2) or '').lower()
+        pieces.append(_minify_text(source[position:match.start()], previous_tag, tag))
+        pieces.append(match.group(0))
+        position, previous_tag = match.end(), tag
+    pieces.append(_minify_text(source[position:], previous_tag, None))
+    return ''.join(pieces).strip() + '\n'
+
+
+def _minify_text(text, previous_tag, next_tag):
+    if not text.strip():
+        if not text or (previous_tag in BLOCK_ELEMENTS or next_tag in BLOCK_ELEMENTS):
+            return ''
+        return ' '
+    text = re.sub(r'\s*\n\s*', '\n', text)
+    return re.sub(r'[ \t]{2,}', ' ', text)
+
+
+def _source_hash(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def build_email_templates(source_dir, build_dir, template_dir='emails'):
+    """
+    Écrit dans build_dir/<template_dir> une version recopiée et minifiée de chaque gabarit HTML,
+    et un manifeste des empreintes des sources ; retourne [(nom, taille source, taille construite)]
+    """
+    source_root = Path(source_dir)
+    output_dir = Path(build_dir, template_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    sources = {
+        f'{template_dir}/{path.name}': path.read_text(encoding='utf-8')
+        for path in sorted(Path(source_root, template_dir).glob('*.html'))
+    }
+    stylesheets = {}
+
+    def stylesheet(name):
+        if name not in stylesheets:
+            source = sources[name]
+            css = ''.join(STYLE_BLOCK_RE.findall(source))
+            parent = EXTENDS_RE.search(source)
+            if not css and parent and parent.group(1) in sources:
+                stylesheets[name] = stylesheet(parent.group(1))
+            else:
+                stylesheets[name] = parse_stylesheet(css)
+        return stylesheets[name]
+
+    report = []
+    for name, source in sources.items():
+        rules, residual = stylesheet(name)
+        ancestors = ()
+        parent = EXTENDS_RE.search(source)
+        if parent and parent.group(1) in sources:
+            parent_source = sources[parent.group(1)]
+            block = CONTENT_BLOCK_RE.search(parent_source)
+            if block:
+                ancestors = open_elements(STYLE_BLOCK_RE.sub('', parent_source[:block.start()]))
+
+        # Les blocs <style> sont retirés avant l'analyse (une URL data: peut contenir du SVG) ;
+        # le premier est remplacé par ce qui n'a pas pu être recopié
+        built = STYLE_BLOCK_RE.sub(STYLE_PLACEHOLDER, source, count=1)
+        built = minify_html(inline_css(STYLE_BLOCK_RE.sub('', built), rules, ancestors))
+        built = built.replace(STYLE_PLACEHOLDER, f'<style>{residual}</style>' if residual else '')
+        Path(build_dir, name).write_text(built, encoding='utf-8')
+        report.append((name, len(source.encode('utf-8')), len(built.encode('utf-8'))))
+
+    manifest = {
+        f'{template_dir}/{path.name}': _source_hash(path)
+        for path in sorted(Path(source_root, template_dir).glob('*.html'))
+    }
+    Path(build_dir, MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    return report
+
+
+def build_is_current(source_dir, build_dir, template_dir='emails'):
+    """Vrai si chaque gabarit HTML a une version construite à partir de sa source actuelle"""
+    try:
+        manifest = json.loads(Path(build_dir, MANIFEST_NAME).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return False
+    sources = sorted(Path(source_dir, template_dir).glob('*.html'))
+    return (
+        set(manifest) == {f'{template_dir}/{path.name}' for path in sources}
+        and all(manifest[f'{template_dir}/{path.name}'] == _source_hash(path) for path in sources)
+        and all(Path(build_dir, name).is_file() for name in manifest)
+    )
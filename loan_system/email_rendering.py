@@ -0,0 +1,158 @@
+"""
+Rendu des emails Investor Banque
+Les gabarits templates/emails/* sont compilés une fois par processus et rendus avec le
+contexte de marque commun ; les durées de rendu sont mesurées par gabarit.
+Les versions préparées au déploiement (CSS recopié, HTML minifié) sont utilisées en priorité
+"""
+
+import logging
+import threading
+import time
+from pathlib import Path
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template import Context, Engine, engines
+from django.utils.autoreload import file_changed
+
+from .email_inlining import build_is_current
+
+logger = logging.getLogger(__name__)
+
+EMAIL_TEMPLATE_DIR = 'emails'
+
+# Valeurs communes à tous les emails, fusionnées sous le contexte de chaque envoi
+BRANDING_CONTEXT = MappingProxyType({
+    'bank_name': 'Investor Banque',
+    'manager_name': 'Damien Boudraux',
+    'manager_email': 'damien.boudraux17@outlook.fr',
+    'support_email': 'support@virement.net',
+    'phone_support': '+49 157 50098219',
+})
+
+
+def email_engine():
+    """
+    Moteur des emails : dossier EMAIL_TEMPLATES_BUILD_DIR en tête de recherche s'il a été
+    construit à partir des gabarits actuels, sinon le moteur du projet
+    """
+    engine = engines['django'].engine
+    build_dir = getattr(settings, 'EMAIL_TEMPLATES_BUILD_DIR', None)
+    if not build_dir or not engine.dirs:
+        return engine
+    if not build_is_current(engine.dirs[0], build_dir):
+        if Path(build_dir).exists():
+            logger.warning("Gabarits d'emails préparés périmés, sources utilisées : relancer build_email_templates")
+        return engine
+    return Engine(
+        dirs=[str(build_dir), *engine.dirs],
+        loaders=engine.loaders,
+        context_processors=engine.context_processors,
+        debug=engine.debug,
+        string_if_invalid=engine.string_if_invalid,
+        file_charset=engine.file_charset,
+        libraries=engine.libraries,
+        builtins=engine.builtins[len(Engine.default_builtins):],
+        autoescape=engine.autoescape,
+    )
+
+
+class EmailRenderer:
+    def __init__(self, engine=None):
+        self.engine = engine or email_engine()
+        self._templates = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    @property
+    def prebuilt(self):
+        return self.engine is not engines['django'].engine
+
+    def template_names(self):
+        names = set()
+        for directory in self.engine.dirs:
+            for path in Path(directory, EMAIL_TEMPLATE_DIR).glob('*.*'):
+                names.add(f'{EMAIL_TEMPLATE_DIR}/{path.name}')
+        return sorted(names)
+
+    def compile_all(self):
+        """Compile tous les gabarits d'emails ; retourne leur nombre"""
+        for name in self.template_names():
+            self.get_template(name)
+        return len(self._templates)
+
+    def get_template(self, name):
+        template = self._templates.get(name)
+        if template is None:
+            template = self._templates[name] = self.engine.get_template(name)
+        return template
+
+    def render(self, name, context):
+        template = self.get_template(name)
+        started = time.perf_counter()
+        render_context = Context(BRANDING_CONTEXT, autoescape=self.engine.autoescape)
+        render_context.push(context)
+        rendered = template.render(render_context)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            count, total, slowest = self._timings.get(name, (0, 0.0, 0.0))
+            self._timings[name] = (count + 1, total + elapsed, max(slowest, elapsed))
+        return rendered
+
+    def render_email(self, name, context):
+        """Versions HTML et texte de l'email `name` (emails/<name>.html et .txt)"""
+        return (
+            self.render(f'{EMAIL_TEMPLATE_DIR}/{name}.html', context),
+            self.render(f'{EMAIL_TEMPLATE_DIR}/{name}.txt', context),
+        )
+
+    def timings(self):
+        """Nombre de rendus, durée moyenne et maximale (ms) par gabarit"""
+        with self._lock:
+            timings = sorted(self._timings.items())
+        return {
+            name: {'count': count, 'mean_ms': round(total / count * 1000, 3), 'max_ms': round(slowest * 1000, 3)}
+            for name, (count, total, slowest) in timings
+        }
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = EmailRenderer()
+    return _renderer
+
+
+def reset_renderer():
+    global _renderer
+    with _renderer_lock:
+        _renderer = None
+
+
+def render_email(name, context):
+    return get_renderer().render_email(name, context)
+
+
+def render_timings():
+    return get_renderer().timings()
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(sender, setting, **kwargs):
+    if setting in ('TEMPLATES', 'EMAIL_TEMPLATES_BUILD_DIR'):
+        reset_renderer()
+
+
+@receiver(file_changed)
+def reset_on_template_change(sender, file_path, **kwargs):
+    # Serveur de développement : les gabarits modifiés sont recompilés au prochain rendu
+    if file_path.suffix in ('.html', '.txt'):
+        reset_renderer()
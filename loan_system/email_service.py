@@ -4,11 +4,12 @@ Gère tous les emails professionnels aux grandes étapes bancaires
 """
 
 from django.core.mail import send_mail, EmailMultiAlternatives
-from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.models import User
 from .models import UserProfile, LoanRequest, Payment
+from .email_rendering import render_email
+from .outbox import deliver
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,16 +26,10 @@ class InvestorEmailService:
                 'user': user,
                 'profile': profile,
                 'date_inscription': timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'support_email': 'support@virement.net',
-                'phone_support': '+49 157 50098219',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
             }
             
             subject = f"Bienvenue chez Investor Banque - Compte créé avec succès"
-            html_content = render_to_string('emails/welcome_email.html', context)
-            text_content = render_to_string('emails/welcome_email.txt', context)
+            html_content, text_content = render_email('welcome_email', context)
             
             msg = EmailMultiAlternatives(
                 subject=subject,
@@ -43,7 +38,8 @@ class InvestorEmailService:
                 to=[user.email]
             )
             msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            if not deliver(msg, email_type='welcome', object_id=user.pk):
+                return False
             
             logger.info(f"Email de bienvenue envoyé à {user.email}")
             return True
@@ -62,14 +58,10 @@ class InvestorEmailService:
                 'profile': profile,
                 'login_time': timezone.now().strftime('%d/%m/%Y à %H:%M'),
                 'ip_address': ip_address or 'Non disponible',
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
             }
             
             subject = f"Connexion à votre compte Investor Banque"
-            html_content = render_to_string('emails/login_alert.html', context)
-            text_content = render_to_string('emails/login_alert.txt', context)
+            html_content, text_content = render_email('login_alert', context)
             
             msg = EmailMultiAlternatives(
                 subject=subject,
@@ -78,7 +70,8 @@ class InvestorEmailService:
                 to=[user.email]
             )
             msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            if not deliver(msg, email_type='login_alert', object_id=user.pk):
+                return False
             
             logger.info(f"Notification de connexion envoyée à {user.email}")
             return True
@@ -97,15 +90,10 @@ class InvestorEmailService:
                 'profile': profile,
                 'reset_link': reset_link,
                 'expiry_time': '24 heures',
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
             }
             
             subject = f"Réinitialisation de votre mot de passe Investor Banque"
-            html_content = render_to_string('emails/password_reset.html', context)
-            text_content = render_to_string('emails/password_reset.txt', context)
+            html_content, text_content = render_email('password_reset', context)
             
             msg = EmailMultiAlternatives(
                 subject=subject,
@@ -114,7 +102,8 @@ class InvestorEmailService:
                 to=[user.email]
             )
             msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            if not deliver(msg, email_type='password_reset', object_id=user.pk):
+                return False
             
             logger.info(f"Email de réinitialisation envoyé à {user.email}")
             return True
@@ -132,15 +121,10 @@ class InvestorEmailService:
                 'user': user,
                 'profile': profile,
                 'change_time': timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
             }
             
             subject = f"Modification de votre mot de passe Investor Banque"
-            html_content = render_to_string('emails/password_change_alert.html', context)
-            text_content = render_to_string('emails/password_change_alert.txt', context)
+            html_content, text_content = render_email('password_change_alert', context)
             
             msg = EmailMultiAlternatives(
                 subject=subject,
@@ -149,7 +133,8 @@ class InvestorEmailService:
                 to=[user.email]
             )
             msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            if not deliver(msg, email_type='password_change_alert', object_id=user.pk):
+                return False
             
             logger.info(f"Alerte changement mot de passe envoyée à {user.email}")
             return True
@@ -169,15 +154,10 @@ class InvestorEmailService:
                 'profile': profile,
                 'loan_request': loan_request,
                 'request_date': loan_request.date_demande.strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
             }
             
             subject = f"Confirmation de votre demande de prêt INV-{loan_request.id:06d}"
-            html_content = render_to_string('emails/loan_request_confirmation.html', context)
-            text_content = render_to_string('emails/loan_request_confirmation.txt', context)
+            html_content, text_content = render_email('loan_request_confirmation', context)
             
             msg = EmailMultiAlternatives(
                 subject=subject,
@@ -186,7 +166,8 @@ class InvestorEmailService:
                 to=[user.email]
             )
             msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            if not deliver(msg, email_type='loan_request_confirmation', object_id=loan_request.pk):
+                return False
             
             logger.info(f"Confirmation demande prêt envoyée à {user.email}")
             return True
@@ -206,15 +187,10 @@ class InvestorEmailService:
                 'profile': profile,
                 'loan_request': loan_request,
                 'approval_date': timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
             }
             
             subject = f"Félicitations ! Votre prêt INV-{loan_request.id:06d} a été approuvé"
-            html_content = render_to_string('emails/loan_approval.html', context)
-            text_content = render_to_string('emails/loan_approval.txt', context)
+            html_content, text_content = render_email('loan_approval', context)
             
             msg = EmailMultiAlternatives(
                 subject=subject,
@@ -223,7 +199,8 @@ class InvestorEmailService:
                 to=[user.email]
             )
             msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            if not deliver(msg, email_type='loan_approval', object_id=loan_request.pk):
+                return False
             
             logger.info(f"Email d'approbation envoyé à {user.email}")
             return True
@@ -244,15 +221,10 @@ class InvestorEmailService:
                 'loan_request': loan_request,
                 'payment': payment,
                 'payment_date': timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
             }
             
             subject = f"Instructions de paiement - Prêt INV-{loan_request.id:06d}"
-            html_content = render_to_string('emails/payment_instructions.html', context)
-            text_content = render_to_string('emails/payment_instructions.txt', context)
+            html_content, text_content = render_email('payment_instructions', context)
             
             msg = EmailMultiAlternatives(
                 subject=subject,
@@ -261,7 +233,8 @@ class InvestorEmailService:
                 to=[user.email]
             )
             msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            if not deliver(msg, email_type='payment_instructions', object_id=payment.pk):
+                return False
             
             logger.info(f"Instructions de paiement envoyées à {user.email}")
             return True
@@ -279,15 +252,10 @@ class InvestorEmailService:
                 'user': user,
                 'profile': profile,
                 'activation_date': timezone.now().strftime('%d/%m/%Y à %H:%M'),
-                'bank_name': 'Investor Banque',
-                'manager_name': 'Damien Boudraux',
-                'manager_email': 'damien.boudraux17@outlook.fr',
-                'support_email': 'support@virement.net',
             }
             
             subject = f"Votre compte Investor Banque est maintenant actif"
-            html_content = render_to_string('emails/subscription_activated.html', context)
-            text_content = render_to_string('emails/subscription_activated.txt', context)
+            html_content, text_content = render_email('subscription_activated', context)
             
             msg = EmailMultiAlternatives(
                 subject=subject,
@@ -296,7 +264,8 @@ class InvestorEmailService:
                 to=[user.email]
             )
             msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            if not deliver(msg, email_type='subscription_activated', object_id=user.pk):
+                return False
             
             logger.info(f"Email d'activation envoyé à {user.email}")
             return True
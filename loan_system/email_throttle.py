@@ -0,0 +1,222 @@
+"""
+Limitation des envois d'emails Investor Banque
+Chaque email typé passe par admit() : un même email (destinataire, type, objet) n'est envoyé
+qu'une fois par fenêtre de déduplication, et le nombre d'emails d'un type par destinataire est
+plafonné sur une fenêtre glissante. acquire_quota() garde le volume total sous le quota horaire
+du fournisseur SMTP ; les emails au-delà attendent dans la file durable.
+admit() et acquire_quota() réservent avant l'envoi : un envoi qui échoue rend sa réservation
+(release_message(), release_quota()) pour ne pas bloquer la nouvelle tentative. Un email mis
+dans la file durable au sein d'une transaction n'est que vérifié (allowed()) et réservé à la
+validation, pour qu'une transaction annulée ne laisse aucune réservation.
+L'état est conservé dans le cache Django EMAIL_THROTTLE_CACHE avec des opérations atomiques
+(add, incr) : un cache partagé (Redis, Memcached) applique les limites à tous les processus,
+le cache mémoire par défaut à chaque processus
+"""
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# dedup : secondes pendant lesquelles le même email n'est pas renvoyé
+# limit / window : emails de ce type au plus par destinataire sur `window` secondes glissantes
+DEFAULT_POLICIES = {
+    'welcome': {'dedup': 86400},
+    'login_alert': {'dedup': 900, 'limit': 4, 'window': 3600},
+    'password_change_alert': {'dedup': 300, 'limit': 5, 'window': 3600},
+    'password_reset': {'dedup': 60, 'limit': 5, 'window': 3600},
+    'loan_request_confirmation': {'dedup': 3600},
+    'loan_approval': {'dedup': 3600},
+    'loan_rejection': {'dedup': 3600},
+    'subscription_activated': {'dedup': 3600},
+    'payment_confirmation': {'dedup': 3600},
+    'payment_instructions': {'dedup': 3600},
+    'status_change': {'dedup': 300},
+    'notification': {'dedup': 600, 'limit': 20, 'window': 3600},
+    'notification_digest': {'dedup': 3600},
+    'message': {'dedup': 60, 'limit': 30, 'window': 3600},
+}
+QUOTA_WINDOW = 3600
+# Une fenêtre glissante est découpée en compartiments de window / BUCKETS secondes, chacun un
+# compteur du cache : la fenêtre avance d'un compartiment à la fois
+BUCKETS = 60
+
+
+def _cache():
+    return caches[getattr(settings, 'EMAIL_THROTTLE_CACHE', 'default')]
+
+
+def _key(*parts):
+    # Adresses et identifiants hachés : clés valides pour tous les backends de cache
+    digest = hashlib.sha1(':'.join(str(part).lower() for part in parts).encode()).hexdigest()
+    return f'emails:{parts[0]}:{digest}'
+
+
+def policy(email_type):
+    policies = getattr(settings, 'EMAIL_THROTTLE_POLICIES', {})
+    return {**DEFAULT_POLICIES.get(email_type, {}), **policies.get(email_type, {})}
+
+
+def _buckets(key, window, now):
+    """Durée d'un compartiment et clés des compartiments de la fenêtre, du plus ancien au courant"""
+    size = max(1, int(window) // BUCKETS)
+    current = int(now // size)
+    return size, [f'{key}:{index}' for index in range(current - BUCKETS + 1, current + 1)]
+
+
+def _take(key, limit, window, count=1, now=None):
+    """
+    Fenêtre glissante : enregistre jusqu'à `count` envois si la fenêtre le permet
+    Retourne (nombre accepté, secondes avant qu'une place se libère)
+    Le compartiment courant est incrémenté d'abord puis corrigé de l'excédent : deux processus
+    concurrents peuvent se refuser une place, jamais dépasser la limite
+    """
+    now = time.time() if now is None else now
+    cache = _cache()
+    size, keys = _buckets(key, window, now)
+    current = keys[-1]
+    cache.add(current, 0, window + size)
+    try:
+        taken = cache.incr(current, count)
+    except ValueError:
+        # Compartiment expiré entre add() et incr()
+        cache.add(current, 0, window + size)
+        taken = cache.incr(current, count)
+    previous = cache.get_many(keys[:-1])
+    excess = min(count, max(0, sum(previous.values()) + taken - limit))
+    if excess:
+        cache.decr(current, excess)
+    granted = count - excess
+    retry_after = 0
+    if granted < count:
+        # Le plus ancien compartiment occupé sort de la fenêtre en premier
+        oldest = next(index for index, bucket in enumerate(keys) if previous.get(bucket) or bucket == current)
+        retry_after = (int(now // size) + 1 + oldest) * size - now
+    return granted, retry_after
+
+
+def _give_back(key, window, count, now=None):
+    """Retire `count` envois de la fenêtre, en commençant par les plus récents"""
+    now = time.time() if now is None else now
+    cache = _cache()
+    _, keys = _buckets(key, window, now)
+    for bucket in reversed(keys):
+        if count <= 0:
+            return
+        taken = min(count, cache.get(bucket) or 0)
+        if not taken:
+            continue
+        try:
+            remaining = cache.decr(bucket, taken)
+        except ValueError:
+            continue
+        if remaining < 0:
+            # Compartiment vidé entre-temps par un autre processus
+            cache.incr(bucket, -remaining)
+            taken += remaining
+        count -= taken
+
+
+def _used(key, window, now=None):
+    now = time.time() if now is None else now
+    _, keys = _buckets(key, window, now)
+    return sum(_cache().get_many(keys).values())
+
+
+def allowed(recipient, email_type, object_id=None):
+    """Comme admit(), sans rien réserver (la réservation est prise plus tard par admit())"""
+    if not email_type or not getattr(settings, 'EMAIL_THROTTLE_ENABLED', True):
+        return True
+    rules = policy(email_type)
+    if rules.get('dedup') and _cache().get(_key('dedup', email_type, recipient, object_id)) is not None:
+        logger.info(f"Email {email_type} déjà envoyé à {recipient} (objet {object_id}), ignoré")
+        return False
+    if rules.get('limit') and _used(_key('rate', email_type, recipient), rules.get('window', 3600)) >= rules['limit']:
+        logger.warning(f"Limite d'emails {email_type} atteinte pour {recipient} ({rules['limit']} par {rules.get('window', 3600)} s), ignoré")
+        return False
+    return True
+
+
+def admit(recipient, email_type, object_id=None):
+    """
+    Vrai si l'email peut partir ; l'envoi est alors réservé pour les prochains appels
+    (release() le rend si l'envoi échoue). Un email sans type n'est pas limité
+    """
+    if not email_type or not getattr(settings, 'EMAIL_THROTTLE_ENABLED', True):
+        return True
+    rules = policy(email_type)
+    dedup_key = _key('dedup', email_type, recipient, object_id)
+    if rules.get('dedup') and not _cache().add(dedup_key, 1, rules['dedup']):
+        logger.info(f"Email {email_type} déjà envoyé à {recipient} (objet {object_id}), ignoré")
+        return False
+    if rules.get('limit'):
+        granted, _ = _take(_key('rate', email_type, recipient), rules['limit'], rules.get('window', 3600))
+        if not granted:
+            if rules.get('dedup'):
+                _cache().delete(dedup_key)
+            logger.warning(f"Limite d'emails {email_type} atteinte pour {recipient} ({rules['limit']} par {rules.get('window', 3600)} s), ignoré")
+            return False
+    return True
+
+
+def release(recipient, email_type, object_id=None):
+    """Annule la réservation d'admit() pour un email finalement non envoyé"""
+    if not email_type or not getattr(settings, 'EMAIL_THROTTLE_ENABLED', True):
+        return
+    rules = policy(email_type)
+    if rules.get('dedup'):
+        _cache().delete(_key('dedup', email_type, recipient, object_id))
+    if rules.get('limit'):
+        _give_back(_key('rate', email_type, recipient), rules.get('window', 3600), 1)
+
+
+def admit_message(message):
+    """admit() pour un EmailMessage construit par FastInvestorEmailService.build_email"""
+    email_type = getattr(message, 'email_type', None)
+    object_id = getattr(message, 'object_id', None)
+    admitted = []
+    for recipient in message.to:
+        if not admit(recipient, email_type, object_id):
+            # Tous les destinataires ou aucun
+            for previous in admitted:
+                release(previous, email_type, object_id)
+            return False
+        admitted.append(recipient)
+    return True
+
+
+def allowed_message(message):
+    """allowed() pour tous les destinataires d'un email"""
+    email_type = getattr(message, 'email_type', None)
+    return all(allowed(recipient, email_type, getattr(message, 'object_id', None)) for recipient in message.to)
+
+
+def release_message(message):
+    """release() pour tous les destinataires d'un email admis par admit_message()"""
+    for recipient in message.to:
+        release(recipient, getattr(message, 'email_type', None), getattr(message, 'object_id', None))
+
+
+def acquire_quota(count=1):
+    """
+    Réserve jusqu'à `count` envois dans le quota horaire EMAIL_HOURLY_QUOTA
+    Retourne (nombre accordé, secondes avant qu'une place se libère)
+    """
+    quota = getattr(settings, 'EMAIL_HOURLY_QUOTA', None)
+    if not quota or not getattr(settings, 'EMAIL_THROTTLE_ENABLED', True):
+        return count, 0
+    granted, retry_after = _take(_key('quota', 'all'), quota, QUOTA_WINDOW, count)
+    if granted < count:
+        logger.warning(f"Quota horaire d'envoi atteint ({quota} emails), {count - granted} email(s) différé(s)")
+    return granted, retry_after
+
+
+def release_quota(count):
+    """Rend des envois réservés par acquire_quota() et finalement non effectués"""
+    if count <= 0 or not getattr(settings, 'EMAIL_HOURLY_QUOTA', None) or not getattr(settings, 'EMAIL_THROTTLE_ENABLED', True):
+        return
+    _give_back(_key('quota', 'all'), QUOTA_WINDOW, count)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from loan_system.certificates import ensure_certificate
+from loan_system.models import LoanRequest
+
+
+class Command(BaseCommand):
+    help = "Pré-génère les attestations manquantes ou obsolètes de tous les prêts payés"
+
+    def handle(self, *args, **options):
+        generated = up_to_date = failed = 0
+        loans = LoanRequest.objects.filter(status='paye').select_related('user__userprofile').order_by('pk')
+
+        for loan_request in loans.iterator():
+            try:
+                if ensure_certificate(loan_request):
+                    generated += 1
+                else:
+                    up_to_date += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"INV-{loan_request.id:06d} : {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{generated} attestation(s) générée(s), {up_to_date} déjà à jour, {failed} en erreur."
+        ))
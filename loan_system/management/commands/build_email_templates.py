@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from loan_system.email_inlining import build_email_templates
+
+
+class Command(BaseCommand):
+    help = "Prépare les gabarits d'emails : CSS recopié dans les éléments et HTML minifié (à lancer au déploiement)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Dossier de sortie (défaut : EMAIL_TEMPLATES_BUILD_DIR)")
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.EMAIL_TEMPLATES_BUILD_DIR
+        source_dir = settings.TEMPLATES[0]['DIRS'][0]
+        report = build_email_templates(source_dir, output)
+
+        total_source = total_built = 0
+        for name, source_size, built_size in report:
+            total_source += source_size
+            total_built += built_size
+            self.stdout.write(f"{name}: {source_size / 1024:.1f} Ko -> {built_size / 1024:.1f} Ko")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(report)} gabarit(s) préparé(s) dans {output} "
+            f"({total_source / 1024:.1f} Ko -> {total_built / 1024:.1f} Ko)"
+        ))
@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loan_system.certificates import store_certificate
+
+
+def _init_worker():
+    """Initialise Django dans chaque processus de rendu"""
+    import django
+    django.setup()
+
+
+def _render(loan_request):
+    """Génère une attestation et retourne (prêt, contenu, durée, erreur)"""
+    from loan_system.utils import generate_loan_certificate
+
+    start = time.perf_counter()
+    try:
+        pdf_content = generate_loan_certificate(loan_request)
+        return loan_request, pdf_content, time.perf_counter() - start, None
+    except Exception as e:
+        return loan_request, None, time.perf_counter() - start, str(e)
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Date invalide : {value} (format attendu AAAA-MM-JJ)")
+
+
+class Command(BaseCommand):
+    help = "Génère en parallèle les attestations d'un ensemble de prêts (stockage ou archive ZIP)"
+
+    def add_arguments(self, parser):
+        # Seuls les prêts payés ont une attestation (generate_loan_certificate refuse les autres)
+        parser.add_argument('--status', action='append', choices=['paye'], help="Statut des prêts (seul 'paye' est accepté)")
+        parser.add_argument('--since', help="Date de demande minimale (AAAA-MM-JJ)")
+        parser.add_argument('--until', help="Date de demande maximale (AAAA-MM-JJ)")
+        parser.add_argument('--ids', nargs='+', type=int, help="Identifiants des prêts")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Nombre de processus de rendu")
+        parser.add_argument('--zip', dest='zip_path', help="Écrire les PDF dans cette archive ZIP au lieu du stockage")
+
+    def get_queryset(self, options):
+        # Import local : ce module est rechargé par les processus de rendu avant django.setup()
+        from loan_system.models import LoanRequest
+
+        loans = LoanRequest.objects.filter(status__in=options['status'] or ['paye'])
+        if options['since']:
+            loans = loans.filter(date_demande__date__gte=_parse_date(options['since']))
+        if options['until']:
+            loans = loans.filter(date_demande__date__lte=_parse_date(options['until']))
+        if options['ids']:
+            loans = loans.filter(pk__in=options['ids'])
+        return loans.select_related('user__userprofile').order_by('pk')
+
+    def handle(self, *args, **options):
+        loans = self.get_queryset(options).iterator(chunk_size=200)
+        workers = max(1, options['workers'])
+        archive = zipfile.ZipFile(options['zip_path'], 'w', zipfile.ZIP_DEFLATED) if options['zip_path'] else None
+
+        latencies = []
+        failed = 0
+        start = time.perf_counter()
+
+        def collect(result):
+            nonlocal failed
+            loan_request, pdf_content, elapsed, error = result
+            if error:
+                failed += 1
+                self.stderr.write(f"INV-{loan_request.id:06d} : {error}")
+                return
+            latencies.append(elapsed)
+            if archive:
+                archive.writestr(f"attestation_pret_INV_{loan_request.id:06d}.pdf", pdf_content)
+            else:
+                store_certificate(loan_request, pdf_content)
+
+        try:
+            if workers == 1:
+                for loan_request in loans:
+                    collect(_render(loan_request))
+            else:
+                # Contexte "spawn" : les processus de rendu n'héritent pas des connexions à la base
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+                    pending = set()
+                    for loan_request in loans:
+                        pending.add(pool.submit(_render, loan_request))
+                        # Nombre de rendus en vol borné pour garder une mémoire constante
+                        if len(pending) >= workers * 4:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                collect(future.result())
+                    for future in wait(pending).done:
+                        collect(future.result())
+        finally:
+            if archive:
+                archive.close()
+
+        total_time = time.perf_counter() - start
+        latencies.sort()
+        generated = len(latencies)
+        throughput = generated / total_time if total_time > 0 else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"{generated} attestation(s) générée(s), {failed} en erreur en {total_time:.2f} s "
+            f"({throughput:.1f} docs/s, {workers} processus)."
+        ))
+        self.stdout.write(
+            "Latence par document : "
+            f"p50 {_percentile(latencies, 50) * 1000:.0f} ms, "
+            f"p90 {_percentile(latencies, 90) * 1000:.0f} ms, "
+            f"p99 {_percentile(latencies, 99) * 1000:.0f} ms, "
+            f"max {(latencies[-1] if latencies else 0) * 1000:.0f} ms"
+        )
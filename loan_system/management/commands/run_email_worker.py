@@ -0,0 +1,56 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from loan_system.outbox import process_batch
+
+
+class Command(BaseCommand):
+    help = "Envoie en continu les emails de la file d'envoi (OutboxEmail)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Emails réservés par lot (défaut : EMAIL_OUTBOX_BATCH_SIZE)")
+        parser.add_argument('--interval', type=float, default=5, help="Attente en secondes quand la file est vide")
+        parser.add_argument('--once', action='store_true', help="Vider la file puis s'arrêter")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # Arrêt propre : le lot en cours est terminé avant de quitter
+        previous_handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            self.run(options)
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def run(self, options):
+        total_sent = total_failed = 0
+        self.stdout.write("📨 Worker d'envoi des emails démarré")
+        while not self.stopping:
+            close_old_connections()
+            try:
+                sent, failed = process_batch(options['batch_size'])
+            except Exception as e:
+                self.stderr.write(f"Erreur traitement de la file d'envoi : {e}")
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"{sent} email(s) envoyé(s), {failed} en échec")
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker arrêté : {total_sent} email(s) envoyé(s), {total_failed} en échec."
+        ))
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from loan_system.notification_digest import send_digests
+
+
+class Command(BaseCommand):
+    help = "Envoie un récapitulatif par client des notifications en attente (à lancer périodiquement, ex. cron Render)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window', type=int,
+            help="Attente minimale en secondes de la plus ancienne notification d'un client (défaut : NOTIFICATION_DIGEST_WINDOW)",
+        )
+
+    def handle(self, *args, **options):
+        recipients, notifications, failed = send_digests(options['window'])
+        if failed:
+            self.stderr.write(f"{failed} récapitulatif(s) n'ont pas pu être préparés")
+        self.stdout.write(self.style.SUCCESS(
+            f"{recipients} récapitulatif(s) mis en file pour {notifications} notification(s)."
+        ))
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:01
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_system', '0003_notification'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loanrequest',
+            name='montant',
+            field=models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('5000.00')), django.core.validators.MaxValueValidator(Decimal('5000000.00'))], verbose_name='Montant demandé (EUR)'),
+        ),
+        migrations.AlterField(
+            model_name='loanrequest',
+            name='montant_avance',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12, verbose_name="Montant d'avance (10%)"),
+        ),
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=500, verbose_name='Sujet')),
+                ('body', models.TextField(blank=True, verbose_name='Texte')),
+                ('html_body', models.TextField(blank=True, verbose_name='HTML')),
+                ('from_email', models.CharField(max_length=254, verbose_name='Expéditeur')),
+                ('to', models.JSONField(default=list, verbose_name='Destinataires')),
+                ('status', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', "En cours d'envoi"), ('envoye', 'Envoyé'), ('echec', 'Échec')], default='en_attente', max_length=20, verbose_name='Statut')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Tentatives')),
+                ('last_error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Envoi possible à partir de')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Pris en charge le')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name="Date d'envoi")),
+            ],
+            options={
+                'verbose_name': "Email en file d'envoi",
+                'verbose_name_plural': "File d'envoi des emails",
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='loan_system_status_eda1dc_idx')],
+            },
+        ),
+    ]
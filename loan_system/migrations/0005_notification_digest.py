@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_system', '0004_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='email_digest_queued_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='En attente du récapitulatif depuis'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='email_digest_sent_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Envoyée dans le récapitulatif le'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='email_digest_claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Récapitulatif en cours d'envoi depuis"),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['email_digest_sent_at', 'email_digest_queued_at'], name='loan_system_email_d_45fb4e_idx'),
+        ),
+    ]
@@ -9,6 +9,8 @@ import secrets
 import string
 from datetime import date, timedelta
 
+from .amortization import add_months, build_schedule
+
 class UserProfile(models.Model):
     MARITAL_STATUS_CHOICES = [
         ('celibataire', 'Célibataire'),
@@ -171,9 +173,13 @@ class LoanRequest(models.Model):
     @property
     def date_fin_remboursement(self):
         if self.date_paiement:
-            return self.date_paiement.date() + timedelta(days=self.duree_remboursement_mois * 30)
+            return add_months(self.date_paiement.date(), self.duree_remboursement_mois)
         return None
     
+    def amortization_schedule(self, annual_rate=None):
+        """Échéancier à annuités constantes, à compter de la date de paiement"""
+        return build_schedule(self.montant, self.duree_remboursement_mois, self.date_paiement, annual_rate)
+    
     def __str__(self):
         return f"Demande de {self.user.username} - {self.montant:,.0f} EUR"
 
@@ -395,10 +401,16 @@ class Notification(models.Model):
     action_url = models.URLField(blank=True, null=True, verbose_name="Lien d'action")
     action_text = models.CharField(max_length=100, blank=True, null=True, verbose_name="Texte du lien")
     
+    # Récapitulatif par email (NOTIFICATION_EMAIL_MODE = 'digest', manage.py send_notification_digests)
+    email_digest_queued_at = models.DateTimeField(blank=True, null=True, verbose_name="En attente du récapitulatif depuis")
+    email_digest_claimed_at = models.DateTimeField(blank=True, null=True, verbose_name="Récapitulatif en cours d'envoi depuis")
+    email_digest_sent_at = models.DateTimeField(blank=True, null=True, verbose_name="Envoyée dans le récapitulatif le")
+    
     class Meta:
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['email_digest_sent_at', 'email_digest_queued_at'])]
     
     def __str__(self):
         return f"Notification pour {self.recipient.username}: {self.title}"
@@ -438,4 +450,46 @@ class Notification(models.Model):
             minutes = delta.seconds // 60
             return f"{minutes} minute(s) ago"
         else:
-            return "À l'instant"
\ No newline at end of file
+            return "À l'instant"
+
+
+class OutboxEmail(models.Model):
+    """Email enregistré avec la transaction courante, envoyé par le worker (run_email_worker)"""
+    STATUS_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', "En cours d'envoi"),
+        ('envoye', 'Envoyé'),
+        ('echec', 'Échec'),
+    ]
+    
+    # Contenu
+    subject = models.CharField(max_length=500, verbose_name="Sujet")
+    body = models.TextField(blank=True, verbose_name="Texte")
+    html_body = models.TextField(blank=True, verbose_name="HTML")
+    from_email = models.CharField(max_length=254, verbose_name="Expéditeur")
+    to = models.JSONField(default=list, verbose_name="Destinataires")
+    
+    # Suivi de l'envoi
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='en_attente',
+        verbose_name="Statut"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Tentatives")
+    last_error = models.TextField(blank=True, verbose_name="Dernière erreur")
+    
+    # Dates
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    available_at = models.DateTimeField(default=timezone.now, verbose_name="Envoi possible à partir de")
+    claimed_at = models.DateTimeField(blank=True, null=True, verbose_name="Pris en charge le")
+    sent_at = models.DateTimeField(blank=True, null=True, verbose_name="Date d'envoi")
+    
+    class Meta:
+        verbose_name = "Email en file d'envoi"
+        verbose_name_plural = "File d'envoi des emails"
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'available_at'])]
+    
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)}"
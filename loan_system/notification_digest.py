@@ -0,0 +1,94 @@
+"""
+Récapitulatif des notifications par email (NOTIFICATION_EMAIL_MODE = 'digest')
+Les notifications enregistrées dans l'administration sont mises en attente au lieu d'être
+envoyées une à une ; manage.py send_notification_digests, lancé périodiquement, envoie à
+chaque client un seul email pour toutes ses notifications en attente, une fois que la plus
+ancienne a attendu NOTIFICATION_DIGEST_WINDOW secondes.
+Les notifications d'un récapitulatif sont réservées (email_digest_claimed_at) pendant l'envoi
+et marquées envoyées seulement une fois l'email remis ; en cas d'échec, la réservation est
+levée et le prochain passage les renvoie. Une réservation abandonnée (processus arrêté) est
+reprise après NOTIFICATION_DIGEST_CLAIM_TIMEOUT secondes
+"""
+
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .email_async import FastInvestorEmailService
+from .models import Notification
+
+IMMEDIATE = 'immediate'
+DIGEST = 'digest'
+
+
+def digest_enabled():
+    return getattr(settings, 'NOTIFICATION_EMAIL_MODE', IMMEDIATE) == DIGEST
+
+
+def queue_for_digest(notification):
+    """Met une notification en attente du prochain récapitulatif de son destinataire"""
+    if notification.email_digest_queued_at and not notification.email_digest_sent_at:
+        return
+    notification.email_digest_queued_at = timezone.now()
+    notification.email_digest_claimed_at = None
+    notification.email_digest_sent_at = None
+    Notification.objects.filter(pk=notification.pk).update(
+        email_digest_queued_at=notification.email_digest_queued_at, email_digest_claimed_at=None, email_digest_sent_at=None
+    )
+
+
+def claim_digests(window=None, now=None):
+    """
+    Réserve les récapitulatifs prêts : [(destinataire, [Notification])] des clients dont la plus
+    ancienne notification en attente a au moins `window` secondes ; record_outcome() lève la
+    réservation ou marque les notifications envoyées
+    """
+    now = now or timezone.now()
+    if window is None:
+        window = getattr(settings, 'NOTIFICATION_DIGEST_WINDOW', 900)
+    stale = now - timedelta(seconds=getattr(settings, 'NOTIFICATION_DIGEST_CLAIM_TIMEOUT', 600))
+    with transaction.atomic():
+        pending = list(
+            Notification.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(email_digest_queued_at__isnull=False, email_digest_sent_at__isnull=True)
+            .filter(Q(email_digest_claimed_at__isnull=True) | Q(email_digest_claimed_at__lt=stale))
+            .select_related('recipient__userprofile')
+            .order_by('recipient_id', 'created_at', 'pk')
+        )
+        digests = []
+        for _, group in groupby(pending, key=lambda notification: notification.recipient_id):
+            notifications = list(group)
+            if min(notification.email_digest_queued_at for notification in notifications) <= now - timedelta(seconds=window):
+                digests.append((notifications[0].recipient, notifications))
+        Notification.objects.filter(
+            pk__in=[notification.pk for _, notifications in digests for notification in notifications]
+        ).update(email_digest_claimed_at=now)
+    return digests
+
+
+def record_outcome(digests, sent):
+    """Marque envoyées les notifications des récapitulatifs remis, ou les remet en attente"""
+    pks = [notification.pk for _, notifications in digests for notification in notifications]
+    if sent:
+        Notification.objects.filter(pk__in=pks).update(email_digest_sent_at=timezone.now(), email_digest_claimed_at=None)
+    else:
+        Notification.objects.filter(pk__in=pks).update(email_digest_claimed_at=None)
+
+
+def send_digests(window=None):
+    """
+    Envoie les récapitulatifs prêts en un seul lot ; retourne (clients, notifications, emails en échec)
+    Sans attendre l'envoi : les notifications sont marquées envoyées (ou remises en attente) par
+    record_outcome() quand son sort est connu
+    """
+    digests = claim_digests(window)
+    if not digests:
+        return 0, 0, 0
+    _, failed = FastInvestorEmailService.send_bulk_fast(
+        FastInvestorEmailService.build_notification_digest_email, digests, on_outcome=record_outcome
+    )
+    return len(digests), sum(len(notifications) for _, notifications in digests), failed
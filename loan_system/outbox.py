@@ -0,0 +1,203 @@
+"""
+File d'envoi durable des emails Investor Banque
+Les emails sont enregistrés dans la transaction de la requête (OutboxEmail) et envoyés
+par un processus séparé (manage.py run_email_worker) : rien n'est perdu au redémarrage
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .email_throttle import acquire_quota, admit_message, allowed_message, release_message, release_quota
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'en_attente'
+SENDING = 'en_cours'
+SENT = 'envoye'
+FAILED = 'echec'
+
+
+def outbox_enabled():
+    return getattr(settings, 'EMAIL_USE_OUTBOX', False)
+
+
+def _from_message(message, delay=0):
+    html_body = ''
+    for content, mimetype in getattr(message, 'alternatives', []):
+        if mimetype == 'text/html':
+            html_body = content
+    return OutboxEmail(
+        subject=message.subject,
+        body=message.body,
+        html_body=html_body,
+        from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(message.to),
+        available_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue(message, delay=0):
+    """Enregistre un EmailMessage dans la file d'envoi (dans la transaction courante), à envoyer dans `delay` secondes"""
+    outbox_email = _from_message(message, delay)
+    outbox_email.save()
+    return outbox_email
+
+
+def enqueue_many(messages, delay=0):
+    """Enregistre plusieurs emails en une seule requête"""
+    return OutboxEmail.objects.bulk_create([_from_message(message, delay) for message in messages])
+
+
+def enqueue_admitted(messages):
+    """
+    Enregistre dans la file d'envoi les emails que email_throttle laisse passer ; retourne
+    [(EmailMessage, OutboxEmail)] des emails enregistrés
+    Dans une transaction, les emails sont enregistrés avec elle et seulement vérifiés : la
+    réservation (doublon, limite) est prise à la validation, une transaction annulée n'en laisse
+    aucune ; un doublon validé entre-temps par une autre requête est retiré de la file
+    """
+    if not transaction.get_connection().in_atomic_block:
+        admitted = [message for message in messages if admit_message(message)]
+        return list(zip(admitted, enqueue_many(admitted)))
+
+    candidates = [message for message in messages if allowed_message(message)]
+    queued = list(zip(candidates, enqueue_many(candidates)))
+
+    def admit_on_commit():
+        duplicates = [outbox_email.pk for message, outbox_email in queued if not admit_message(message)]
+        if duplicates:
+            OutboxEmail.objects.filter(pk__in=duplicates, status=PENDING).delete()
+
+    if queued:
+        transaction.on_commit(admit_on_commit, robust=True)
+    return queued
+
+
+def deliver(message, email_type=None, object_id=None):
+    """
+    Envoi d'un email : mis en file d'envoi si EMAIL_USE_OUTBOX, sinon envoyé immédiatement
+    Passe par email_throttle comme les envois de FastInvestorEmailService : retourne 0 pour un
+    doublon ou au-delà de la limite du destinataire ; au-delà du quota horaire, l'email attend
+    dans la file d'envoi
+    """
+    message.email_type = email_type
+    message.object_id = object_id
+    if outbox_enabled():
+        return len(enqueue_admitted([message]))
+    if not admit_message(message):
+        return 0
+    granted, retry_after = acquire_quota()
+    if not granted:
+        enqueue(message, delay=retry_after)
+        return 1
+    sent = 0
+    try:
+        sent = message.send()
+    finally:
+        # Échec : réservations rendues pour que la nouvelle tentative parte
+        if not sent:
+            release_message(message)
+            release_quota(1)
+    return sent
+
+
+def to_message(outbox_email, connection=None):
+    message = EmailMultiAlternatives(
+        subject=outbox_email.subject,
+        body=outbox_email.body,
+        from_email=outbox_email.from_email,
+        to=outbox_email.to,
+        connection=connection,
+    )
+    if outbox_email.html_body:
+        message.attach_alternative(outbox_email.html_body, "text/html")
+    return message
+
+
+def claim_batch(batch_size):
+    """
+    Réserve jusqu'à batch_size emails à envoyer
+    SKIP LOCKED : plusieurs workers se partagent la file sans s'attendre ; un email
+    réservé par un worker disparu est repris après EMAIL_OUTBOX_CLAIM_TIMEOUT secondes
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_CLAIM_TIMEOUT', 600))
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=PENDING, available_at__lte=now) | Q(status=SENDING, claimed_at__lt=stale))
+            .order_by('available_at', 'pk')[:batch_size]
+        )
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            status=SENDING, claimed_at=now, attempts=F('attempts') + 1
+        )
+    for email in emails:
+        email.status = SENDING
+        email.claimed_at = now
+        email.attempts += 1
+    return emails
+
+
+def _record_success(outbox_email):
+    outbox_email.status = SENT
+    outbox_email.sent_at = timezone.now()
+    outbox_email.last_error = ''
+    outbox_email.save(update_fields=['status', 'sent_at', 'last_error'])
+
+
+def _record_failure(outbox_email, error):
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    outbox_email.last_error = str(error)
+    if outbox_email.attempts >= max_attempts:
+        outbox_email.status = FAILED
+        logger.error(f"Email {outbox_email.pk} abandonné après {outbox_email.attempts} tentative(s): {error}")
+    else:
+        # Délai doublé à chaque tentative
+        delay = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60) * 2 ** (outbox_email.attempts - 1)
+        outbox_email.status = PENDING
+        outbox_email.available_at = timezone.now() + timedelta(seconds=delay)
+        logger.warning(f"Email {outbox_email.pk} en échec (tentative {outbox_email.attempts}), nouvel essai dans {delay} s: {error}")
+    outbox_email.save(update_fields=['status', 'available_at', 'last_error'])
+
+
+def process_batch(batch_size=None):
+    """Réserve et envoie un lot d'emails sur une seule connexion SMTP ; retourne (envoyés, en échec)"""
+    # Lot limité à ce que le quota horaire permet encore
+    granted, _ = acquire_quota(batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50))
+    if not granted:
+        return 0, 0
+    emails = claim_batch(granted)
+    release_quota(granted - len(emails))
+    if not emails:
+        return 0, 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for outbox_email in emails:
+            _record_failure(outbox_email, e)
+        return 0, len(emails)
+
+    sent = failed = 0
+    try:
+        for outbox_email in emails:
+            try:
+                if not connection.send_messages([to_message(outbox_email, connection)]):
+                    raise RuntimeError("Email refusé par le serveur")
+            except Exception as e:
+                _record_failure(outbox_email, e)
+                failed += 1
+            else:
+                _record_success(outbox_email)
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,500 @@
+"""
+Envoi des emails en asyncio (EMAIL_DELIVERY_ENGINE = 'asyncio')
+Une boucle d'événements dans un thread dédié envoie les emails sur quelques sessions SMTP
+persistantes, avec les commandes d'une transaction en pipeline quand le serveur annonce
+PIPELINING ; un sémaphore par domaine destinataire limite les envois simultanés vers un domaine
+"""
+
+import asyncio
+import base64
+import logging
+import re
+import smtplib
+import ssl
+import threading
+import time
+from concurrent.futures import wait
+from contextlib import AsyncExitStack, asynccontextmanager
+from email.utils import parseaddr
+
+from django.conf import settings
+from django.core.mail.message import sanitize_address
+from django.core.mail.utils import DNS_NAME
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .email_dispatch import EmailDispatcherClosed, EmailQueueFull
+from .smtp_pool import is_transient_error, pool_kwargs
+
+logger = logging.getLogger(__name__)
+
+ASYNC_ENGINE_SETTINGS = {
+    'EMAIL_ASYNC_SESSIONS', 'EMAIL_ASYNC_PER_DOMAIN', 'EMAIL_HOST', 'EMAIL_PORT', 'EMAIL_HOST_USER',
+    'EMAIL_HOST_PASSWORD', 'EMAIL_USE_TLS', 'EMAIL_USE_SSL', 'EMAIL_TIMEOUT', 'EMAIL_CONNECTION_POOL_KWARGS',
+    'EMAIL_DISPATCH_QUEUE_SIZE', 'EMAIL_DISPATCH_BLOCK_TIMEOUT',
+}
+
+
+class AsyncSMTPSession:
+    """Session SMTP asyncio : EHLO, STARTTLS, AUTH PLAIN/LOGIN et transactions en pipeline"""
+
+    def __init__(self, host, port, username='', password='', use_tls=False, use_ssl=False, timeout=None, ssl_context=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.reader = self.writer = None
+        self.extensions = {}
+        self.created_at = time.monotonic()
+        self.messages = 0
+
+    async def _read_reply(self):
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not line:
+                raise smtplib.SMTPServerDisconnected("Connexion fermée par le serveur")
+            lines.append(line[4:].strip())
+            if line[3:4] != b'-':
+                try:
+                    return int(line[:3]), b'\n'.join(lines)
+                except ValueError:
+                    raise smtplib.SMTPServerDisconnected(f"Réponse SMTP invalide : {line!r}")
+
+    async def _write(self, *commands):
+        self.writer.write(b''.join(command.encode('utf-8') + b'\r\n' for command in commands))
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+
+    async def command(self, command, expected=(250,)):
+        await self._write(command)
+        code, message = await self._read_reply()
+        if code not in expected:
+            raise smtplib.SMTPResponseException(code, message)
+        return code, message
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl_context if self.use_ssl else None),
+            self.timeout,
+        )
+        code, message = await self._read_reply()
+        if code != 220:
+            raise smtplib.SMTPConnectError(code, message)
+        await self.ehlo()
+        if self.use_tls:
+            if 'starttls' not in self.extensions:
+                raise smtplib.SMTPNotSupportedError("STARTTLS non proposé par le serveur")
+            await self.command('STARTTLS', (220,))
+            await self.writer.start_tls(self.ssl_context, server_hostname=self.host)
+            await self.ehlo()
+        if self.username and self.password:
+            await self.login()
+
+    async def ehlo(self):
+        _, message = await self.command(f'EHLO {DNS_NAME.get_fqdn()}')
+        self.extensions = {}
+        for line in message.decode('utf-8', 'replace').split('\n')[1:]:
+            name, _, params = line.partition(' ')
+            self.extensions[name.lower()] = params
+
+    async def login(self):
+        methods = self.extensions.get('auth', '').upper().split()
+        try:
+            if 'LOGIN' in methods and 'PLAIN' not in methods:
+                await self.command('AUTH LOGIN', (334,))
+                await self.command(base64.b64encode(self.username.encode()).decode(), (334,))
+                await self.command(base64.b64encode(self.password.encode()).decode(), (235,))
+            else:
+                token = base64.b64encode(f'\0{self.username}\0{self.password}'.encode()).decode()
+                await self.command(f'AUTH PLAIN {token}', (235,))
+        except smtplib.SMTPResponseException as e:
+            raise smtplib.SMTPAuthenticationError(e.smtp_code, e.smtp_error)
+
+    async def sendmail(self, from_addr, recipients, data):
+        """Une transaction ; retourne les destinataires refusés, comme smtplib.SMTP.sendmail"""
+        commands = [f'MAIL FROM:{smtplib.quoteaddr(from_addr)}']
+        commands += [f'RCPT TO:{smtplib.quoteaddr(recipient)}' for recipient in recipients]
+        commands.append('DATA')
+
+        replies = []
+        if 'pipelining' in self.extensions:
+            # Un seul aller-retour pour MAIL, RCPT et DATA
+            await self._write(*commands)
+            for _ in commands:
+                replies.append(await self._read_reply())
+        else:
+            for command in commands:
+                await self._write(command)
+                replies.append(await self._read_reply())
+                if replies[0][0] != 250:
+                    break
+
+        mail_code, mail_message = replies[0]
+        if mail_code != 250:
+            await self._reset()
+            raise smtplib.SMTPSenderRefused(mail_code, mail_message, from_addr)
+        refused = {
+            recipient: reply for recipient, reply in zip(recipients, replies[1:1 + len(recipients)])
+            if reply[0] not in (250, 251)
+        }
+        data_code, data_message = replies[-1] if len(replies) == len(commands) else (503, b'')
+        if data_code == 354 and len(refused) == len(recipients):
+            # Serveur qui accepte DATA sans destinataire valide : transaction vide puis abandon
+            await self._write('.')
+            await self._read_reply()
+        if len(refused) == len(recipients):
+            await self._reset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        if data_code != 354:
+            await self._reset()
+            raise smtplib.SMTPDataError(data_code, data_message)
+
+        data = re.sub(rb'(?m)^\.', b'..', data)
+        if not data.endswith(b'\r\n'):
+            data += b'\r\n'
+        self.writer.write(data + b'.\r\n')
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+        code, message = await self._read_reply()
+        if code != 250:
+            await self._reset()
+            raise smtplib.SMTPDataError(code, message)
+        self.messages += 1
+        return refused
+
+    async def _reset(self):
+        try:
+            await self.command('RSET')
+        except (smtplib.SMTPException, OSError):
+            self.close()
+
+    async def quit(self):
+        try:
+            await self.command('QUIT', (221,))
+        except (smtplib.SMTPException, OSError):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+
+class AsyncEmailEngine:
+    """
+    Boucle asyncio dédiée : au plus `sessions` sessions SMTP ouvertes, `per_domain` envois
+    simultanés par domaine destinataire ; submit() retourne un concurrent.futures.Future
+    """
+
+    def __init__(self, host, port, username='', password='', use_tls=False, use_ssl=False, timeout=None,
+                 sessions=8, per_domain=4, max_messages=100, max_age=300, max_retries=3, retry_delay=1,
+                 capacity=200, block_timeout=10):
+        self.session_kwargs = {
+            'host': host, 'port': port, 'username': username, 'password': password,
+            'use_tls': use_tls, 'use_ssl': use_ssl, 'timeout': timeout,
+        }
+        self.sessions = max(1, sessions)
+        self.per_domain = max(1, per_domain)
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.capacity = max(1, capacity)
+        self.block_timeout = block_timeout
+        # Une place par envoi planifié et pas encore terminé
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        # Nom d'hôte local résolu ici : socket.getfqdn() bloquerait la boucle
+        DNS_NAME.get_fqdn()
+
+        self._idle = []
+        self._session_slots = asyncio.Semaphore(self.sessions)
+        self._domain_slots = {}
+        self._domain_in_flight = {}
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'sent': 0, 'failed': 0, 'retried': 0, 'sessions_opened': 0}
+        self._peak_per_domain = 0
+        self.closed = False
+        # Emails pas encore commencés / en cours d'envoi, pour les reporter à l'arrêt
+        self._queued = {}
+        self._sending = {}
+        self._unfinished = set()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='emails-asyncio', daemon=True)
+        self._thread.start()
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def _schedule(self, messages, coroutine):
+        if self.closed:
+            coroutine.close()
+            raise EmailDispatcherClosed("Moteur d'envoi asyncio arrêté")
+        if not self._slots.acquire(timeout=self.block_timeout):
+            coroutine.close()
+            raise EmailQueueFull(f"File d'envoi asyncio pleine ({self.capacity} envois en cours)")
+        with self._lock:
+            self._counters['submitted'] += len(messages)
+            self._queued.update((id(message), message) for message in messages)
+        try:
+            future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        except BaseException:
+            coroutine.close()
+            with self._lock:
+                for message in messages:
+                    self._queued.pop(id(message), None)
+            self._slots.release()
+            raise
+        with self._lock:
+            self._unfinished.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._unfinished.discard(future)
+        self._slots.release()
+
+    def submit(self, message):
+        """Planifie l'envoi d'un EmailMessage ; le Future donne le nombre d'emails envoyés (0 ou 1)"""
+        return self._schedule([message], self._deliver(message))
+
+    def submit_many(self, messages):
+        """
+        Planifie l'envoi de plusieurs emails ; le Future donne le nombre envoyé
+        Les emails en échec gardent l'erreur dans `delivery_error`, comme avec EmailBatch
+        """
+        messages = list(messages)
+        return self._schedule(messages, self._deliver_many(messages))
+
+    async def _deliver_many(self, messages):
+        results = await asyncio.gather(*(self._deliver(message) for message in messages), return_exceptions=True)
+        for message, result in zip(messages, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Erreur envoi email à {', '.join(message.to)}: {result}")
+                message.delivery_error = result
+        return sum(result for result in results if not isinstance(result, BaseException))
+
+    async def _deliver(self, message):
+        try:
+            return await self._deliver_message(message)
+        finally:
+            with self._lock:
+                self._queued.pop(id(message), None)
+                self._sending.pop(id(message), None)
+
+    async def _deliver_message(self, message):
+        if not message.recipients():
+            return 0
+        encoding = message.encoding or settings.DEFAULT_CHARSET
+        from_email = sanitize_address(message.from_email, encoding)
+        recipients = [sanitize_address(address, encoding) for address in message.recipients()]
+        data = message.message().as_bytes(linesep='\r\n')
+        domains = sorted({parseaddr(recipient)[1].rpartition('@')[2].lower() for recipient in recipients})
+
+        try:
+            async with AsyncExitStack() as stack:
+                # Domaines pris dans l'ordre : deux emails multi-domaines ne peuvent pas s'attendre
+                for domain in domains:
+                    await stack.enter_async_context(self._domain_slot(domain))
+                with self._lock:
+                    self._queued.pop(id(message), None)
+                    self._sending[id(message)] = message
+                await self._send_with_retry(from_email, recipients, data)
+        except asyncio.CancelledError:
+            # Interrompu par drain() : l'email est reporté, pas en échec
+            raise
+        except BaseException:
+            self._count('failed')
+            raise
+        self._count('sent')
+        return 1
+
+    @asynccontextmanager
+    async def _domain_slot(self, domain):
+        slot = self._domain_slots.setdefault(domain, asyncio.Semaphore(self.per_domain))
+        async with slot:
+            in_flight = self._domain_in_flight[domain] = self._domain_in_flight.get(domain, 0) + 1
+            self._peak_per_domain = max(self._peak_per_domain, in_flight)
+            try:
+                yield
+            finally:
+                self._domain_in_flight[domain] -= 1
+
+    def _expired(self, session):
+        return session.messages >= self.max_messages or time.monotonic() - session.created_at >= self.max_age
+
+    async def _checkout(self):
+        await self._session_slots.acquire()
+        try:
+            while self._idle:
+                session = self._idle.pop()
+                if session.connected and not self._expired(session):
+                    return session
+                await session.quit()
+            session = AsyncSMTPSession(**self.session_kwargs)
+            await session.connect()
+            self._count('sessions_opened')
+            return session
+        except BaseException:
+            self._session_slots.release()
+            raise
+
+    async def _checkin(self, session, reusable=True):
+        try:
+            if reusable and session.connected and not self._expired(session):
+                self._idle.append(session)
+            elif reusable:
+                await session.quit()
+            else:
+                session.close()
+        finally:
+            self._session_slots.release()
+
+    async def _send_with_retry(self, from_email, recipients, data):
+        attempt = 0
+        while True:
+            try:
+                session = await self._checkout()
+            except (OSError, asyncio.TimeoutError) as e:
+                session, error = None, e
+            else:
+                try:
+                    await session.sendmail(from_email, recipients, data)
+                except (OSError, asyncio.TimeoutError) as e:
+                    # Refus du serveur : la session reste utilisable ; coupure : elle est abandonnée
+                    await self._checkin(session, reusable=isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)))
+                    error = e
+                except BaseException:
+                    # Annulation (arrêt du processus) : la session est dans un état inconnu
+                    await self._checkin(session, reusable=False)
+                    raise
+                else:
+                    await self._checkin(session)
+                    return
+            if not is_transient_error(error) or attempt >= self.max_retries:
+                raise error
+            attempt += 1
+            self._count('retried')
+            logger.warning(f"Envoi SMTP interrompu ({error}), nouvel essai {attempt}/{self.max_retries}")
+            await asyncio.sleep(self.retry_delay * attempt)
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._counters)
+        metrics.update({
+            'capacity': self.capacity,
+            'sessions': self.sessions,
+            'per_domain': self.per_domain,
+            'idle_sessions': len(self._idle),
+            'peak_per_domain': self._peak_per_domain,
+        })
+        return metrics
+
+    async def _close_sessions(self, wait=True):
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        if not wait:
+            for task in tasks:
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        idle, self._idle = self._idle, []
+        for session in idle:
+            if wait:
+                await session.quit()
+            else:
+                session.close()
+
+    def drain(self, timeout):
+        """
+        N'accepte plus d'emails et attend au plus `timeout` secondes les envois planifiés
+        Retourne (emails à reporter, 0) : les envois interrompus en cours de transmission sont
+        reportés aussi, quitte à être reçus deux fois si le serveur les avait déjà acceptés
+        """
+        self.closed = True
+        with self._lock:
+            unfinished = list(self._unfinished)
+        wait(unfinished, timeout=max(0, timeout))
+        with self._lock:
+            interrupted = list(self._sending.values())
+            leftovers = list(self._queued.values()) + interrupted
+        for future in unfinished:
+            future.cancel()
+        self.shutdown(wait=False)
+        if interrupted:
+            logger.warning(f"Arrêt : {len(interrupted)} envoi(s) interrompu(s) en cours de transmission, reporté(s)")
+        return leftovers, 0
+
+    def shutdown(self, wait=True):
+        """Termine les envois en cours (wait=True), ferme les sessions et arrête la boucle"""
+        self.closed = True
+        if self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._close_sessions(wait), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_async_engine():
+    """Moteur asyncio du processus, créé au premier email comme le pool de threads"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine()
+    return _engine
+
+
+def active_async_engine():
+    """Moteur asyncio du processus s'il a déjà été créé, sans le créer"""
+    return _engine
+
+
+def reset_async_engine(wait=True):
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.shutdown(wait=wait)
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(sender, setting, **kwargs):
+    if setting in ASYNC_ENGINE_SETTINGS:
+        reset_async_engine()
+
+
+def _create_engine():
+    kwargs = pool_kwargs()
+    return AsyncEmailEngine(
+        host=settings.EMAIL_HOST,
+        port=settings.EMAIL_PORT,
+        username=settings.EMAIL_HOST_USER,
+        password=settings.EMAIL_HOST_PASSWORD,
+        use_tls=settings.EMAIL_USE_TLS,
+        use_ssl=settings.EMAIL_USE_SSL,
+        timeout=settings.EMAIL_TIMEOUT,
+        sessions=getattr(settings, 'EMAIL_ASYNC_SESSIONS', 8),
+        per_domain=getattr(settings, 'EMAIL_ASYNC_PER_DOMAIN', 4),
+        max_messages=kwargs['max_messages'],
+        max_age=kwargs['max_age'],
+        max_retries=kwargs['max_retries'],
+        retry_delay=kwargs['retry_delay'],
+        capacity=getattr(settings, 'EMAIL_DISPATCH_QUEUE_SIZE', 200),
+        block_timeout=getattr(settings, 'EMAIL_DISPATCH_BLOCK_TIMEOUT', 10),
+    )
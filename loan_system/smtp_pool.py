@@ -0,0 +1,303 @@
+"""
+Connexions SMTP persistantes Investor Banque
+Le backend PooledEmailBackend emprunte des connexions déjà authentifiées (STARTTLS + AUTH)
+au lieu d'en ouvrir une par email ; elles sont vérifiées par NOOP après une période
+d'inactivité et renouvelées après un âge ou un nombre d'emails maximal
+"""
+
+import logging
+import os
+import smtplib
+import ssl
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail.backends import smtp
+from django.core.mail.message import sanitize_address
+from django.core.mail.utils import DNS_NAME
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+POOL_SETTINGS = {'EMAIL_CONNECTION_POOL_SIZE', 'EMAIL_CONNECTION_POOL_KWARGS'}
+
+DEFAULT_POOL_KWARGS = {
+    'max_connections': 10,
+    'max_retries': 3,
+    'retry_delay': 1,
+    'max_age': 300,
+    'max_messages': 100,
+    'health_check_after': 30,
+}
+
+
+class SMTPPoolExhausted(smtplib.SMTPException):
+    """Toutes les connexions SMTP du pool sont occupées"""
+
+
+def _quit(connection):
+    try:
+        connection.quit()
+    except (ssl.SSLError, OSError):
+        connection.close()
+
+
+def is_transient_error(error):
+    """Erreurs pour lesquelles un nouvel essai sur une autre connexion a un sens"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, SMTPPoolExhausted)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    # Erreurs réseau (délai dépassé, connexion réinitialisée…)
+    return not isinstance(error, smtplib.SMTPException)
+
+
+class PooledConnection:
+    __slots__ = ('smtp', 'created_at', 'last_used', 'messages')
+
+    def __init__(self, connection):
+        self.smtp = connection
+        self.created_at = self.last_used = time.monotonic()
+        self.messages = 0
+
+
+class SMTPConnectionPool:
+    def __init__(self, size=10, max_connections=10, max_age=300, max_messages=100, health_check_after=30):
+        self.size = max(0, size)
+        self.max_connections = max(1, max_connections)
+        self.max_age = max_age
+        self.max_messages = max_messages
+        self.health_check_after = health_check_after
+        self._idle = []
+        self._lock = threading.Lock()
+        # Une place par connexion empruntée
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._counters = {'created': 0, 'reused': 0, 'recycled': 0, 'health_check_failed': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def expired(self, pooled):
+        return (
+            time.monotonic() - pooled.created_at >= self.max_age
+            or pooled.messages >= self.max_messages
+        )
+
+    def _healthy(self, pooled):
+        if time.monotonic() - pooled.last_used < self.health_check_after:
+            return True
+        try:
+            return pooled.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def acquire(self, connect, timeout=None):
+        """Connexion prête à l'emploi ; `connect()` en ouvre une nouvelle si aucune n'est disponible"""
+        if not self._slots.acquire(timeout=timeout):
+            raise SMTPPoolExhausted(f"Aucune connexion SMTP libre ({self.max_connections} en cours d'utilisation)")
+        try:
+            while True:
+                with self._lock:
+                    pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    break
+                if self.expired(pooled):
+                    self._count('recycled')
+                    _quit(pooled.smtp)
+                elif not self._healthy(pooled):
+                    self._count('health_check_failed')
+                    pooled.smtp.close()
+                else:
+                    self._count('reused')
+                    return pooled
+            pooled = PooledConnection(connect())
+            self._count('created')
+            return pooled
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, pooled, reusable=True):
+        """Rend une connexion empruntée ; elle est fermée si elle est usée ou si le pool est plein"""
+        try:
+            pooled.last_used = time.monotonic()
+            if reusable and not self.expired(pooled):
+                with self._lock:
+                    if len(self._idle) < self.size:
+                        self._idle.append(pooled)
+                        return
+            else:
+                self._count('recycled')
+            if reusable:
+                _quit(pooled.smtp)
+            else:
+                pooled.smtp.close()
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            _quit(pooled.smtp)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['idle'] = len(self._idle)
+        return stats
+
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def pool_kwargs():
+    kwargs = dict(DEFAULT_POOL_KWARGS)
+    kwargs.update(getattr(settings, 'EMAIL_CONNECTION_POOL_KWARGS', {}))
+    return kwargs
+
+
+def get_pool(key):
+    """Pool du processus pour un serveur et un compte SMTP donnés"""
+    global _pools_pid
+    with _pools_lock:
+        # Les connexions héritées d'un fork appartiennent au processus parent
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            kwargs = pool_kwargs()
+            pool = _pools[key] = SMTPConnectionPool(
+                size=getattr(settings, 'EMAIL_CONNECTION_POOL_SIZE', 10),
+                max_connections=kwargs['max_connections'],
+                max_age=kwargs['max_age'],
+                max_messages=kwargs['max_messages'],
+                health_check_after=kwargs['health_check_after'],
+            )
+    return pool
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(sender, setting, **kwargs):
+    if setting in POOL_SETTINGS:
+        close_pools()
+
+
+class PooledEmailBackend(smtp.EmailBackend):
+    """
+    Backend SMTP à connexions persistantes (EMAIL_CONNECTION_POOL_SIZE connexions gardées
+    ouvertes par processus) avec nouvel essai sur une autre connexion en cas d'erreur passagère
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = pool_kwargs()
+        self.max_retries = options['max_retries']
+        self.retry_delay = options['retry_delay']
+        self._pool = None
+        self._pooled = None
+
+    @property
+    def pool(self):
+        return get_pool((self.host, self.port, self.username, self.use_tls, self.use_ssl))
+
+    def _connect(self):
+        connection_params = {'local_hostname': DNS_NAME.get_fqdn()}
+        if self.timeout is not None:
+            connection_params['timeout'] = self.timeout
+        if self.use_ssl:
+            connection_params['context'] = self.ssl_context
+        connection = self.connection_class(self.host, self.port, **connection_params)
+        try:
+            if not self.use_ssl and self.use_tls:
+                connection.starttls(context=self.ssl_context)
+            if self.username and self.password:
+                connection.login(self.username, self.password)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def open(self):
+        if self.connection:
+            return False
+        try:
+            # Le pool est mémorisé : la connexion lui est rendue même s'il a été remplacé entre-temps
+            self._pool = self.pool
+            self._pooled = self._pool.acquire(self._connect, timeout=self.timeout)
+        except OSError:
+            if not self.fail_silently:
+                raise
+            return None
+        self.connection = self._pooled.smtp
+        return True
+
+    def close(self, reusable=True):
+        """Rend la connexion au pool (sans QUIT, sauf si elle est usée)"""
+        if self._pooled is None:
+            return
+        pooled, self._pooled, self.connection = self._pooled, None, None
+        self._pool.release(pooled, reusable)
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        with self._lock:
+            new_conn_created = self.open()
+            if not self.connection or new_conn_created is None:
+                return 0
+            num_sent = 0
+            try:
+                for message in email_messages:
+                    if self._send(message):
+                        num_sent += 1
+            finally:
+                # La connexion revient au pool même si un envoi a échoué
+                if new_conn_created:
+                    self.close()
+        return num_sent
+
+    def _send(self, email_message):
+        if not email_message.recipients():
+            return False
+        encoding = email_message.encoding or settings.DEFAULT_CHARSET
+        from_email = sanitize_address(email_message.from_email, encoding)
+        recipients = [sanitize_address(addr, encoding) for addr in email_message.recipients()]
+        message = email_message.message().as_bytes(linesep='\r\n')
+
+        attempt = 0
+        while True:
+            try:
+                if self._pooled is not None and self._pool.expired(self._pooled):
+                    self.close()
+                if self.connection is None and self.open() is None:
+                    return False
+                self.connection.sendmail(from_email, recipients, message)
+            except OSError as e:
+                if not is_transient_error(e) or attempt >= self.max_retries:
+                    if is_transient_error(e):
+                        self.close(reusable=False)
+                    if self.fail_silently and isinstance(e, smtplib.SMTPException):
+                        return False
+                    raise
+                attempt += 1
+                logger.warning(f"Envoi SMTP interrompu ({e}), nouvel essai {attempt}/{self.max_retries}")
+                self.close(reusable=False)
+                time.sleep(self.retry_delay * attempt)
+                continue
+            self._pooled.messages += 1
+            return True
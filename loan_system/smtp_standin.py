@@ -0,0 +1,155 @@
+"""
+Serveur SMTP de test en mémoire (tests et bench_email_engines.py)
+Répond à EHLO (PIPELINING, AUTH), AUTH, MAIL, RCPT, DATA, RSET, NOOP et QUIT, avec un délai
+de réponse simulé par aller-retour ; les emails reçus sont conservés dans `messages`
+"""
+
+import asyncio
+import base64
+import re
+import threading
+
+
+class SMTPStandIn:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, refuse=(), pipelining=True):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        # Adresses refusées (expressions régulières) : RCPT TO répond 550
+        self.refuse = [re.compile(pattern) for pattern in refuse]
+        self.pipelining = pipelining
+        self.messages = []
+        self.sessions = 0
+        self.max_concurrent_sessions = 0
+        self._open_sessions = 0
+        self._writers = set()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._session, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._thread = threading.Thread(target=self._loop.run_forever, name='smtp-standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        async def close():
+            self._server.close()
+            await self._server.wait_closed()
+            # Sessions encore ouvertes par les clients : fermées, elles se terminent d'elles-mêmes
+            current = asyncio.current_task()
+            tasks = [task for task in asyncio.all_tasks() if task is not current]
+            for writer in list(self._writers):
+                writer.close()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def recipients(self):
+        with self._lock:
+            return [recipient for _, recipients, _ in self.messages for recipient in recipients]
+
+    async def _reply(self, writer, *lines):
+        writer.write(''.join(f'{line}\r\n' for line in lines).encode())
+        await writer.drain()
+
+    async def _session(self, reader, writer):
+        with self._lock:
+            self.sessions += 1
+            self._open_sessions += 1
+            self.max_concurrent_sessions = max(self.max_concurrent_sessions, self._open_sessions)
+        self._writers.add(writer)
+        try:
+            await self._reply(writer, '220 standin ESMTP')
+            await self._dialogue(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            with self._lock:
+                self._open_sessions -= 1
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _dialogue(self, reader, writer):
+        sender, recipients = None, []
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            # Un seul délai par lot de commandes reçues ensemble (pipeline)
+            if self.latency and not reader._buffer:
+                await asyncio.sleep(self.latency)
+            command, _, argument = line.decode().strip().partition(' ')
+            command = command.upper()
+            if command in ('EHLO', 'HELO'):
+                extensions = ['250-standin', '250-AUTH PLAIN LOGIN']
+                if self.pipelining:
+                    extensions.append('250-PIPELINING')
+                await self._reply(writer, *extensions, '250 8BITMIME')
+            elif command == 'AUTH':
+                await self._authenticate(reader, writer, argument)
+            elif command == 'MAIL':
+                sender, recipients = _address(argument), []
+                await self._reply(writer, '250 OK')
+            elif command == 'RCPT':
+                address = _address(argument)
+                if any(pattern.search(address) for pattern in self.refuse):
+                    await self._reply(writer, '550 Mailbox unavailable')
+                else:
+                    recipients.append(address)
+                    await self._reply(writer, '250 OK')
+            elif command == 'DATA':
+                if sender is None or not recipients:
+                    await self._reply(writer, '503 Bad sequence of commands')
+                    continue
+                await self._reply(writer, '354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = await reader.readuntil(b'\r\n')
+                    if data_line == b'.\r\n':
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b'.') else data_line)
+                with self._lock:
+                    self.messages.append((sender, recipients, b''.join(lines)))
+                sender, recipients = None, []
+                await self._reply(writer, '250 OK queued')
+            elif command == 'RSET':
+                sender, recipients = None, []
+                await self._reply(writer, '250 OK')
+            elif command == 'NOOP':
+                await self._reply(writer, '250 OK')
+            elif command == 'STARTTLS':
+                await self._reply(writer, '454 TLS not available')
+            elif command == 'QUIT':
+                await self._reply(writer, '221 Bye')
+                return
+            else:
+                await self._reply(writer, '502 Command not implemented')
+
+    async def _authenticate(self, reader, writer, argument):
+        mechanism, _, initial = argument.partition(' ')
+        if mechanism.upper() == 'LOGIN':
+            for prompt in ('VXNlcm5hbWU6', 'UGFzc3dvcmQ6'):
+                await self._reply(writer, f'334 {prompt}')
+                base64.b64decode(await reader.readline())
+        elif not initial:
+            await self._reply(writer, '334 ')
+            await reader.readline()
+        await self._reply(writer, '235 Authentication successful')
+
+
+def _address(argument):
+    return argument.partition(':')[2].strip().strip('<>')
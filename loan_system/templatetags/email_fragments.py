@@ -0,0 +1,28 @@
+from django import template
+
+from ..email_rendering import BRANDING_CONTEXT
+
+register = template.Library()
+
+
+class StaticFragmentNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+        self.rendered = None
+
+    def render(self, context):
+        # Rendu avec le seul contexte de marque : aucune donnée du destinataire ne peut être mise en cache
+        if self.rendered is None:
+            self.rendered = self.nodelist.render(context.new(BRANDING_CONTEXT))
+        return self.rendered
+
+
+@register.tag
+def static_fragment(parser, token):
+    """
+    {% static_fragment %}…{% endstatic_fragment %}
+    Bloc commun à tous les emails (en-tête, pied de page), rendu une seule fois par gabarit compilé
+    """
+    nodelist = parser.parse(('endstatic_fragment',))
+    parser.delete_first_token()
+    return StaticFragmentNode(nodelist)
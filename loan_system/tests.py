@@ -1,3 +1,1047 @@
-from django.test import TestCase
+import os
+import shutil
+import smtplib
+import tempfile
+import threading
+import tracemalloc
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    amortization, branding, certificates, email_dispatch, email_inlining, email_rendering, email_throttle, notification_digest,
+    outbox, smtp_async, smtp_pool, utils,
+)
+from .email_async import FastInvestorEmailService
+from .email_service import InvestorEmailService
+from .models import LoanRequest, Notification, OutboxEmail, UserProfile
+from .smtp_standin import SMTPStandIn
+
+
+class BrandingRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.logo_path = os.path.join(self.tmpdir, 'logo.png')
+        shutil.copy(settings.INVESTOR_LOGO_PATH, self.logo_path)
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        override = override_settings(INVESTOR_LOGO_PATH=self.logo_path, STATIC_ROOT=None, STATICFILES_DIRS=[])
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_logo_is_decoded_once_per_file_version(self):
+        first = branding.get_asset(branding.LOGO)
+        self.assertEqual(first.path, self.logo_path)
+        self.assertIs(branding.get_asset(branding.LOGO), first)
+        watermark = utils.get_watermark()
+        self.assertIs(utils.get_watermark(), watermark)
+        self.assertIs(utils.create_logo_placeholder()._img, first.reader)
+
+        mtime = os.path.getmtime(self.logo_path) + 10
+        os.utime(self.logo_path, (mtime, mtime))
+        reloaded = branding.get_asset(branding.LOGO)
+        self.assertIsNot(reloaded, first)
+        self.assertIsNot(utils.get_watermark(), watermark)
+
+    def test_missing_logo_falls_back_to_text(self):
+        with override_settings(INVESTOR_LOGO_PATH=os.path.join(self.tmpdir, 'absent.png')):
+            self.assertIsNone(branding.get_asset(branding.LOGO))
+            self.assertIsNone(utils.get_watermark())
+            self.assertIn('INVESTOR BANQUE', utils.create_logo_placeholder().text)
+
+
+class NumberedCanvasTests(SimpleTestCase):
+    def test_pages_are_numbered_without_keeping_page_state(self):
+        buffer = BytesIO()
+        canv = utils.NumberedCanvas(buffer, pagesize=utils.A4, pageCompression=0)
+        for page in range(3):
+            canv.drawString(100, 700, f"Contenu {page}")
+            canv.showPage()
+            self.assertEqual(canv._code, [])
+        canv.save()
+
+        pdf = buffer.getvalue()
+        self.assertNotIn('_saved_page_states', vars(canv))
+        for page_num in (1, 2, 3):
+            self.assertIn(f"(Page {page_num}/3)".encode(), pdf)
+        self.assertEqual(pdf.count(b'/Type /Page\n'), 3)
+
+
+class CertificateStyleRegistryTests(SimpleTestCase):
+    def test_styles_are_built_once_per_process(self):
+        self.assertIs(utils.get_certificate_styles(), utils.get_certificate_styles())
+        self.assertIs(utils.get_certificate_table_styles(), utils.get_certificate_table_styles())
+
+    def test_static_paragraphs_share_parsed_markup_but_not_layout(self):
+        first = utils.static_paragraph('<b>LA BANQUE</b>', 'sig_title')
+        second = utils.static_paragraph('<b>LA BANQUE</b>', 'sig_title')
+        self.assertIsNot(first, second)
+        self.assertIs(first.frags, second.frags)
+        first.wrap(100, 100)
+        self.assertFalse(hasattr(second, 'blPara'))
+
+
+class ConditionsTemplateTests(SimpleTestCase):
+    def test_static_blocks_share_their_line_breaking(self):
+        first = utils.conditions_paragraphs('AAAA')
+        second = utils.conditions_paragraphs('BBBB')
+        first[0].wrap(480, 1000)
+        self.assertIs(first[0]._line_cache, second[0]._line_cache)
+        self.assertTrue(second[0]._line_cache)
+        variable = [p for p in first if 'AAAA' in getattr(p, 'text', '')]
+        self.assertEqual(len(variable), 1)
+        self.assertNotIsInstance(variable[0], utils.TemplateParagraph)
+
+    def test_blocks_take_the_height_of_a_single_paragraph(self):
+        styles = utils.get_certificate_styles()
+        text = utils.CONDITIONS_TEXT.format(payment_key='ABCDEF123456').replace('\n', '<br/>')
+        _, expected = utils.Paragraph(text, styles['normal']).wrap(480, 10000)
+        height = sum(f.wrap(480, 10000)[1] for f in utils.conditions_paragraphs('ABCDEF123456'))
+        self.assertEqual(height, expected)
+
+
+class NumberToWordsTests(SimpleTestCase):
+    def test_french_spelling(self):
+        cases = {
+            0: 'zéro',
+            21: 'vingt et un',
+            71: 'soixante et onze',
+            80: 'quatre-vingts',
+            81: 'quatre-vingt-un',
+            91: 'quatre-vingt-onze',
+            200: 'deux cents',
+            201: 'deux cent un',
+            1000: 'mille',
+            80000: 'quatre-vingt mille',
+            200000: 'deux cent mille',
+            2000000: 'deux millions',
+            200000000: 'deux cents millions',
+            1234567890: 'un milliard deux cent trente-quatre millions cinq cent soixante-sept mille huit cent quatre-vingt-dix',
+        }
+        for number, words in cases.items():
+            with self.subTest(number=number):
+                self.assertEqual(utils.number_to_words(number), words)
+        with self.assertRaises(ValueError):
+            utils.number_to_words(utils.NUMBER_WORDS_LIMIT)
+
+    def test_amounts_with_cents(self):
+        self.assertEqual(utils.amount_to_words(Decimal('125000.00')), 'cent vingt-cinq mille euros')
+        self.assertEqual(utils.amount_to_words(Decimal('1.01')), 'un euro et un centime')
+        self.assertEqual(utils.amount_to_words(Decimal('3000000')), "trois millions d'euros")
+        self.assertEqual(
+            utils.amount_to_words(Decimal('9999999999.99')),
+            'neuf milliards neuf cent quatre-vingt-dix-neuf millions neuf cent quatre-vingt-dix-neuf mille '
+            'neuf cent quatre-vingt-dix-neuf euros et quatre-vingt-dix-neuf centimes',
+        )
+        amounts = [Decimal('5000.50'), Decimal('12000'), Decimal('5000.50')]
+        self.assertEqual(utils.amounts_to_words(amounts), [utils.amount_to_words(a) for a in amounts])
+
+
+class EmailRenderingTests(SimpleTestCase):
+    def setUp(self):
+        email_rendering.reset_renderer()
+        self.addCleanup(email_rendering.reset_renderer)
+        self.context = {'user': User(username='jdupont'), 'profile': None, 'title': 'Échéance', 'content': 'Votre échéance approche.'}
+
+    def test_templates_are_compiled_once_with_branding_context(self):
+        renderer = email_rendering.get_renderer()
+        self.assertGreaterEqual(renderer.compile_all(), 30)
+        self.assertIn('emails/notification.txt', renderer.template_names())
+
+        html, text = email_rendering.render_email('notification', self.context)
+        expected = render_to_string('emails/notification.html', {**email_rendering.BRANDING_CONTEXT, **self.context})
+        self.assertEqual(html, expected)
+        self.assertIn('Votre échéance approche.', text)
+        self.assertIs(renderer.get_template('emails/notification.html'), renderer.get_template('emails/notification.html'))
+
+        timings = email_rendering.render_timings()
+        self.assertEqual(timings['emails/notification.html']['count'], 1)
+        self.assertGreater(timings['emails/notification.txt']['max_ms'], 0)
+
+    def test_static_fragments_ignore_recipient_context(self):
+        html, _ = email_rendering.render_email('notification', {**self.context, 'manager_name': 'Quelqu’un'})
+        self.assertIn('Gestionnaire: Damien Boudraux', html)
+        html, _ = email_rendering.render_email('notification', self.context)
+        self.assertEqual(html.count('Damien Boudraux'), 2)
+
+
+class EmailTemplateBuildTests(SimpleTestCase):
+    def setUp(self):
+        self.build_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.build_dir)
+        email_rendering.reset_renderer()
+        self.addCleanup(email_rendering.reset_renderer)
+
+    def test_rules_are_inlined_by_specificity_and_existing_styles_win(self):
+        rules, residual = email_inlining.parse_stylesheet(
+            '.box { color: red; padding: 4px } .box h3 { color: blue } h3 { margin: 0 } .box:hover { color: green }'
+        )
+        source = '<div class="box">\n  <h3 style="color: black">{{ title }}</h3>\n  <span>A :</span>\n  <span>{{ b }}</span>\n</div>'
+        built = email_inlining.minify_html(email_inlining.inline_css(source, rules))
+        self.assertEqual(
+            built,
+            '<div class="box" style="color:red;padding:4px"><h3 style="margin:0;color:blue;color: black">{{ title }}</h3>'
+            '<span>A :</span> <span>{{ b }}</span></div>\n',
+        )
+        self.assertEqual(residual, '.box:hover{color:green}')
+
+    def test_build_output_is_preferred_while_sources_are_unchanged(self):
+        out = StringIO()
+        call_command('build_email_templates', '--output', self.build_dir, stdout=out)
+        self.assertIn('gabarit(s) préparé(s)', out.getvalue())
+        base = Path(self.build_dir, 'emails', 'base_email.html').read_text(encoding='utf-8')
+        self.assertIn('<div class="header" style="background:#2C3E50;', base)
+        self.assertNotIn('.greeting{', base)
+        self.assertIn('@media (max-width:600px)', base)
+
+        context = {
+            'user': User(username='jdupont'), 'profile': None, 'approval_date': '02/01/2026',
+            'loan_request': LoanRequest(id=42, montant=Decimal('125000.00'), duree_remboursement_mois=84),
+        }
+        source_html, _ = email_rendering.render_email('loan_approval', context)
+        with override_settings(EMAIL_TEMPLATES_BUILD_DIR=self.build_dir):
+            renderer = email_rendering.get_renderer()
+            self.assertTrue(renderer.prebuilt)
+            html, text = renderer.render_email('loan_approval', context)
+        self.assertLess(len(html), len(source_html) * 0.7)
+        self.assertIn('<span class="info-value" style="color:#34495E;font-weight:600;font-size:15px">INV-000042</span>', html)
+        self.assertIn('INV-000042', text)
+
+        manifest = Path(self.build_dir, email_inlining.MANIFEST_NAME)
+        manifest.write_text(manifest.read_text().replace('"emails/notification.html": "', '"emails/notification.html": "0'))
+        with override_settings(EMAIL_TEMPLATES_BUILD_DIR=self.build_dir), self.assertLogs('loan_system.email_rendering', 'WARNING'):
+            self.assertFalse(email_rendering.get_renderer().prebuilt)
+
+
+class AmortizationScheduleTests(SimpleTestCase):
+    def test_constant_annuity_schedule(self):
+        schedule = amortization.build_schedule(Decimal('125000.00'), 84, date(2024, 1, 31), annual_rate='3.50')
+        self.assertEqual(schedule.mensualite, Decimal('1679.98'))
+        self.assertEqual(len(schedule), 84)
+        self.assertEqual(schedule[0], amortization.Installment(
+            1, date(2024, 2, 29), Decimal('1679.98'), Decimal('364.58'), Decimal('1315.40'), Decimal('123684.60')
+        ))
+        self.assertEqual(schedule[-1].date_echeance, date(2031, 1, 31))
+        self.assertEqual(schedule[-1].capital_restant, Decimal('0.00'))
+        self.assertEqual(sum(row.capital for row in schedule), Decimal('125000.00'))
+        self.assertEqual(sum(row.interets for row in schedule), schedule.total_interets)
+
+        zero_rate = amortization.build_schedule(12000, 12, annual_rate=0)
+        self.assertEqual({row.mensualite for row in zero_rate}, {Decimal('1000.00')})
+        with self.assertRaises(ValueError):
+            amortization.build_schedule(12000, amortization.MAX_DURATION_MONTHS + 1)
+
+    def test_interest_rounds_exact_half_cents_up(self):
+        # 3,4 % : r = 17 / 6000 ; 30,00 € donnent 8,5 centimes d'intérêts tout juste
+        self.assertEqual(amortization._monthly_rate_ratio(Decimal('3.4')), (17, 6000))
+        schedule = amortization.build_schedule(Decimal('30.00'), 1, annual_rate='3.4')
+        self.assertEqual(schedule[0].interets, Decimal('0.09'))
+
+    def test_batch_matches_individual_schedules(self):
+        loans = [(Decimal('5000.00'), 12, None), (Decimal('4999999.99'), 300, None), (Decimal('80000.50'), 84, None)]
+        batch = amortization.build_schedules(loans, annual_rate='4.2')
+        for (principal, months, start), schedule in zip(loans, batch):
+            with self.subTest(months=months):
+                self.assertEqual(schedule.principal, principal)
+                self.assertEqual(list(schedule), list(amortization.build_schedule(principal, months, start, '4.2')))
+
+    @override_settings(LOAN_ANNUAL_INTEREST_RATE='6')
+    def test_model_uses_configured_rate_and_calendar_months(self):
+        loan = LoanRequest(id=7, montant=Decimal('5000.00'), duree_remboursement_mois=12,
+                           date_paiement=timezone.make_aware(timezone.datetime(2024, 1, 31, 12)))
+        schedule = loan.amortization_schedule()
+        self.assertEqual(schedule.annual_rate, Decimal('6'))
+        self.assertEqual(schedule.mensualite, amortization.monthly_payment(Decimal('5000.00'), 12, '6'))
+        self.assertEqual(loan.date_fin_remboursement, date(2025, 1, 31))
+        self.assertEqual(amortization.schedules_for_loans([loan])[7].mensualite, schedule.mensualite)
+
+
+class LoanSimulationTests(TestCase):
+    def test_quote_matches_full_schedule(self):
+        for principal, months, rate in [(Decimal('125000.00'), 84, '3.50'), (Decimal('5000.01'), 12, '0'), (Decimal('4999999.99'), 300, '7.25')]:
+            with self.subTest(months=months, rate=rate):
+                simulation = amortization.quote(principal, months, rate)
+                schedule = amortization.build_schedule(principal, months, annual_rate=rate)
+                self.assertEqual(simulation.mensualite, schedule.mensualite)
+                self.assertEqual(simulation.derniere_mensualite, schedule.derniere_mensualite)
+                self.assertEqual(simulation.total_interets, schedule.total_interets)
+                self.assertEqual((simulation.premiers_interets, simulation.premier_capital), (schedule[0].interets, schedule[0].capital))
+
+    def test_endpoint_answers_without_database(self):
+        url = reverse('loan_simulation')
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'montant': '125000', 'duree': '84', 'taux': '3.5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['mensualite'], '1679.98')
+        self.assertEqual(response.json()['duree'], 84)
+        self.assertIn('max-age=300', response['Cache-Control'])
+
+        hits = amortization._quote.cache_info().hits
+        self.client.get(url, {'montant': '125000.00', 'duree': '84', 'taux': '3.50'})
+        self.assertEqual(amortization._quote.cache_info().hits, hits + 1)
+
+        for params in ({'montant': '100', 'duree': '84'}, {'montant': '125000', 'duree': '600'}, {'montant': 'abc'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+class BlockingMessage:
+    """Email factice dont l'envoi attend un signal"""
+
+    def __init__(self, release):
+        self.release = release
+        self.thread = None
+
+    def send(self):
+        self.thread = threading.current_thread()
+        self.release.wait(5)
+        return 1
+
+
+class EmailDispatcherTests(SimpleTestCase):
+    def test_bounded_queue_rejects_overflow_and_reports_metrics(self):
+        release = threading.Event()
+        dispatcher = email_dispatch.EmailDispatcher(workers=1, queue_size=1, overflow=email_dispatch.REJECT)
+        self.addCleanup(dispatcher.shutdown)
+        futures = [dispatcher.submit(BlockingMessage(release)) for _ in range(2)]
+        with self.assertRaises(email_dispatch.EmailQueueFull):
+            dispatcher.submit(BlockingMessage(release))
+        self.assertEqual(dispatcher.metrics()['queue_depth'] + dispatcher.metrics()['in_flight'], 2)
+
+        release.set()
+        self.assertEqual([future.result(5) for future in futures], [1, 1])
+        metrics = dispatcher.metrics()
+        self.assertEqual((metrics['submitted'], metrics['sent'], metrics['rejected']), (3, 2, 1))
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertIsNotNone(metrics['send_latency_ms']['p50'])
+
+    def test_caller_runs_when_queue_is_full(self):
+        release = threading.Event()
+        dispatcher = email_dispatch.EmailDispatcher(workers=1, queue_size=0, overflow=email_dispatch.CALLER_RUNS)
+        self.addCleanup(dispatcher.shutdown)
+        pooled = dispatcher.submit(BlockingMessage(release))
+        overflow = BlockingMessage(threading.Event())
+        overflow.release.set()
+        self.assertEqual(dispatcher.submit(overflow).result(), 1)
+        self.assertIs(overflow.thread, threading.current_thread())
+        release.set()
+        self.assertEqual(pooled.result(5), 1)
+        self.assertEqual(dispatcher.metrics()['caller_runs'], 1)
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_batches_are_counted_per_email(self):
+        dispatcher = email_dispatch.EmailDispatcher(workers=1)
+        self.addCleanup(dispatcher.shutdown)
+        messages = [FastInvestorEmailService.build_email('Sujet', '<p>Corps</p>', 'Corps', f'client{i}@example.com') for i in range(5)]
+        failing = mock.patch.object(
+            locmem.EmailBackend, 'send_messages', side_effect=[1, 1, OSError('SMTP indisponible'), 0, 1]
+        )
+        with failing, self.assertLogs('loan_system.email_dispatch', 'ERROR'):
+            self.assertEqual(dispatcher.submit(email_dispatch.EmailBatch(messages, chunk_size=2)).result(5), 3)
+        metrics = dispatcher.metrics()
+        self.assertEqual((metrics['submitted'], metrics['sent'], metrics['failed']), (5, 3, 2))
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_only_the_failed_emails_of_a_chunk_are_marked(self):
+        messages = [FastInvestorEmailService.build_email('Sujet', '<p>Corps</p>', 'Corps', f'client{i}@example.com') for i in range(3)]
+        send_messages = locmem.EmailBackend.send_messages
+
+        def fail_on_second(backend, batch):
+            if batch[0] is messages[1]:
+                raise smtplib.SMTPRecipientsRefused({'client1@example.com': (550, b'Refus')})
+            return send_messages(backend, batch)
+
+        failing = mock.patch.object(locmem.EmailBackend, 'send_messages', autospec=True, side_effect=fail_on_second)
+        with failing, self.assertLogs('loan_system.email_dispatch', 'ERROR'):
+            self.assertEqual(email_dispatch.EmailBatch(messages, chunk_size=3).send(), 2)
+        self.assertEqual([m.to[0] for m in mail.outbox], ['client0@example.com', 'client2@example.com'])
+        self.assertEqual([hasattr(m, 'delivery_error') for m in messages], [False, True, False])
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_DISPATCH_WORKERS=2)
+    def test_send_email_async_returns_a_future(self):
+        future = FastInvestorEmailService.send_email_async('Sujet', '<p>Corps</p>', 'Corps', 'client@example.com')
+        self.assertEqual(future.result(5), 1)
+        self.assertEqual(mail.outbox[-1].to, ['client@example.com'])
+        self.assertEqual(email_dispatch.email_metrics()['workers'], 2)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_DISPATCH_WORKERS=1)
+class EmailShutdownDrainTests(TestCase):
+    def setUp(self):
+        email_dispatch.reset_dispatcher()
+        self.addCleanup(email_dispatch.reset_dispatcher)
+
+    def test_unsent_emails_spill_to_outbox_within_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        running = email_dispatch.dispatch(BlockingMessage(release))
+        queued = [
+            FastInvestorEmailService.send_email_async('Sujet', '<p>Corps</p>', 'Corps', f'client{i}@example.com')
+            for i in range(2)
+        ]
+        batch = FastInvestorEmailService.send_bulk_fast(
+            lambda address: FastInvestorEmailService.build_email('Lot', '<p>Corps</p>', 'Corps', address),
+            ['lot@example.com'],
+        )
+        self.assertEqual(batch, (1, 0))
+
+        with self.assertLogs('loan_system.email_dispatch', 'WARNING') as logs:
+            summary = email_dispatch.drain_email_queue(timeout=0.1)
+        self.assertEqual((summary['spilled'], summary['running'], summary['lost']), (3, 1, 0))
+        self.assertIn('3 reporté(s) dans la file durable', logs.output[0])
+        self.assertTrue(all(future.cancelled() for future in queued))
+        self.assertEqual(
+            sorted(address for email in OutboxEmail.objects.all() for address in email.to),
+            ['client0@example.com', 'client1@example.com', 'lot@example.com'],
+        )
+
+        # Plus aucun email accepté par le pool : la file durable prend le relais
+        late = FastInvestorEmailService.send_email_async('Sujet', '<p>Corps</p>', 'Corps', 'tard@example.com')
+        self.assertIsInstance(late, OutboxEmail)
+        self.assertIsNone(email_dispatch.drain_email_queue(timeout=0))
+        release.set()
+        self.assertEqual(running.result(5), 1)
+
+
+@override_settings(EMAIL_USE_OUTBOX=True, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboxTests(TestCase):
+    def send(self, recipient='client@example.com'):
+        return FastInvestorEmailService.send_email_async('Sujet', '<p>Corps</p>', 'Corps', recipient)
+
+    def test_emails_are_stored_with_the_transaction(self):
+        self.assertIsInstance(self.send(), OutboxEmail)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.send('annule@example.com')
+                raise RuntimeError
+        self.assertEqual(list(OutboxEmail.objects.values_list('to', flat=True)), [['client@example.com']])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_worker_sends_pending_emails(self):
+        self.send()
+        self.send('autre@example.com')
+        out = StringIO()
+        call_command('run_email_worker', '--once', stdout=out)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['autre@example.com', 'client@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives, [('<p>Corps</p>', 'text/html')])
+        self.assertEqual(set(OutboxEmail.objects.values_list('status', flat=True)), {outbox.SENT})
+        self.assertIn('2 email(s) envoyé(s), 0 en échec', out.getvalue())
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_are_retried_then_abandoned(self):
+        email = self.send()
+        failing = mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP indisponible'))
+        with failing, self.assertLogs('loan_system.outbox', 'WARNING') as logs:
+            self.assertEqual(outbox.process_batch(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), (outbox.PENDING, 1, 'SMTP indisponible'))
+            self.assertGreater(email.available_at, timezone.now())
+            # Pas encore disponible
+            self.assertEqual(outbox.process_batch(), (0, 0))
+
+            OutboxEmail.objects.update(available_at=timezone.now())
+            self.assertEqual(outbox.process_batch(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (outbox.FAILED, 2))
+        self.assertIn('abandonné après 2 tentative(s)', logs.output[-1])
+
+    def test_stale_claims_are_taken_over(self):
+        email = self.send()
+        self.assertEqual(outbox.claim_batch(10), [email])
+        self.assertEqual(outbox.claim_batch(10), [])
+        OutboxEmail.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual([claimed.attempts for claimed in outbox.claim_batch(10)], [2])
+
+    def test_commit_aware_sends_enqueue_inside_the_transaction(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        loan = create_paid_loan(status='en_attente')
+        send = FastInvestorEmailService.send_loan_request_confirmation_fast
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                FastInvestorEmailService.send_on_commit(send, loan)
+                self.assertEqual(OutboxEmail.objects.count(), 1)
+                raise RuntimeError
+        # Annulée avec la transaction, sans réservation laissée derrière elle
+        self.assertFalse(OutboxEmail.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                FastInvestorEmailService.send_on_commit(send, loan)
+                self.assertEqual(OutboxEmail.objects.count(), 1)
+        with self.assertLogs('loan_system.email_throttle', 'INFO'):
+            self.assertFalse(send(loan))
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_admin_requeue_skips_emails_being_sent(self):
+        failed, sending, sent = self.send(), self.send(), self.send()
+        OutboxEmail.objects.filter(pk=failed.pk).update(status=outbox.FAILED, attempts=5, claimed_at=timezone.now())
+        OutboxEmail.objects.filter(pk=sending.pk).update(status=outbox.SENDING, claimed_at=timezone.now())
+        OutboxEmail.objects.filter(pk=sent.pk).update(status=outbox.SENT)
+        admin_user = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        self.client.force_login(admin_user)
+        self.client.post(reverse('admin:loan_system_outboxemail_changelist'), {
+            'action': 'requeue_emails', '_selected_action': [failed.pk, sending.pk, sent.pk],
+        })
+        statuses = dict(OutboxEmail.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {failed.pk: outbox.PENDING, sending.pk: outbox.SENDING, sent.pk: outbox.SENT})
+        failed.refresh_from_db()
+        self.assertEqual((failed.attempts, failed.claimed_at), (0, None))
+
+
+def create_paid_loan(username='client', **loan_fields):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password='x')
+    profile = user.userprofile
+    profile.nom = 'Dupont'
+    profile.prenom = 'Jean'
+    profile.date_naissance = date(1980, 1, 2)
+    profile.lieu_naissance = 'Lyon'
+    profile.situation_matrimoniale = 'marie'
+    profile.profession = 'Ingénieur'
+    profile.adresse = '1 rue de Paris'
+    profile.save()
+    fields = {
+        'montant': Decimal('125000.00'),
+        'motif': 'Achat de matériel professionnel',
+        'status': 'paye',
+        'payment_key': 'ABCDEF123456',
+        'date_paiement': timezone.now(),
+    }
+    fields.update(loan_fields)
+    return LoanRequest.objects.create(user=user, **fields)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_ASYNC_SENDING=False, EMAIL_BULK_CHUNK_SIZE=2)
+class AdminBulkActionTests(TestCase):
+    def setUp(self):
+        admin_user = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        self.client.force_login(admin_user)
+        self.loans = [create_paid_loan(f'client{i}', status='en_attente', payment_key='') for i in range(3)]
+        self.url = reverse('admin:loan_system_loanrequest_changelist')
+
+    def run_action(self, action, loans):
+        send_messages = mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages', autospec=True,
+            side_effect=locmem.EmailBackend.send_messages,
+        )
+        with send_messages as sends:
+            response = self.client.post(self.url, {'action': action, '_selected_action': [loan.pk for loan in loans]}, follow=True)
+        # Une connexion (backend) par envoi, un email par appel
+        return response, [call.args[0] for call in sends.call_args_list]
+
+    def test_validate_requests_updates_in_bulk_and_sends_one_batch(self):
+        response, connections = self.run_action('validate_requests', self.loans)
+        self.assertEqual(len(connections), 3)
+        self.assertEqual(len(set(connections)), 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['client0@example.com', 'client1@example.com', 'client2@example.com'])
+        for loan in self.loans:
+            loan.refresh_from_db()
+            self.assertEqual(loan.status, 'valide')
+            self.assertEqual(len(loan.payment_key), 12)
+        self.assertContains(response, "3 demande(s) validée(s) avec succès. 3 email(s) d&#x27;approbation en cours d&#x27;envoi.")
+
+    def test_reject_requests_skips_processed_loans_and_reports_failures(self):
+        LoanRequest.objects.filter(pk=self.loans[0].pk).update(status='valide')
+        UserProfile.objects.filter(user__username='client2').delete()
+        with self.assertLogs('loan_system.email_async', 'ERROR'):
+            response, connections = self.run_action('reject_requests', self.loans)
+        self.assertEqual(len(connections), 1)
+        self.assertEqual([m.to[0] for m in mail.outbox], ['client1@example.com'])
+        self.assertEqual(list(LoanRequest.objects.order_by('pk').values_list('status', flat=True)), ['valide', 'rejete', 'rejete'])
+        self.assertContains(response, '2 demande(s) rejetée(s). 1 email(s) de rejet en cours d&#x27;envoi. 1 email(s) n&#x27;ont pas pu être envoyés.')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_ASYNC_SENDING=False)
+class CommitAwareEmailTests(TestCase):
+    def setUp(self):
+        self.loan = create_paid_loan('client', status='en_attente', payment_key='')
+        self.send = FastInvestorEmailService.send_loan_request_confirmation_fast
+
+    def test_email_is_sent_after_commit_with_snapshot_fields(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                FastInvestorEmailService.send_on_commit(self.send, self.loan)
+                self.loan.montant = Decimal('1.00')
+            self.assertEqual(mail.outbox, [])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Montant demandé : 125000 EUR', mail.outbox[0].body)
+
+    def test_no_email_for_rolled_back_write(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    FastInvestorEmailService.send_on_commit(self.send, self.loan)
+                    raise RuntimeError
+        self.assertEqual((callbacks, mail.outbox), ([], []))
+
+    def test_loan_request_view_sends_confirmation_on_commit(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        # Superutilisateur : dispensé des pièces justificatives du profil
+        User.objects.filter(pk=self.loan.user.pk).update(is_superuser=True)
+        self.loan.delete()
+        self.client.force_login(self.loan.user)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, self.settings(MEDIA_ROOT=media_root):
+            self.client.post(reverse('loan_request'), {
+                'montant': '20000', 'motif': 'Travaux',
+                'document_projet': SimpleUploadedFile('projet.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            })
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual([m.to for m in mail.outbox], [['client@example.com']])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_ASYNC_SENDING=False)
+class EmailThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.loans = [create_paid_loan(f'client{i}', status='valide') for i in range(3)]
+        self.user = self.loans[0].user
+
+    def test_duplicate_email_is_sent_once_per_window(self):
+        self.assertNotEqual(FastInvestorEmailService.send_login_alert_fast(self.user, '10.0.0.1'), False)
+        with self.assertLogs('loan_system.email_throttle', 'INFO'):
+            self.assertFalse(FastInvestorEmailService.send_login_alert_fast(self.user, '10.0.0.2'))
+        # Autre type ou autre objet : pas un doublon
+        FastInvestorEmailService.send_password_change_alert_fast(self.user)
+        FastInvestorEmailService.send_bulk_fast(FastInvestorEmailService.build_loan_approval_email, self.loans)
+        self.assertEqual(len(mail.outbox), 5)
+
+    @override_settings(EMAIL_THROTTLE_POLICIES={'status_change': {'dedup': 0, 'limit': 2, 'window': 60}})
+    def test_rate_limit_per_recipient_and_type(self):
+        loan = self.loans[0]
+        FastInvestorEmailService.send_status_change_email_fast(loan, 'en_attente', 'rejete')
+        FastInvestorEmailService.send_status_change_email_fast(loan, 'rejete', 'valide')
+        with self.assertLogs('loan_system.email_throttle', 'WARNING'):
+            self.assertFalse(FastInvestorEmailService.send_status_change_email_fast(loan, 'valide', 'paye'))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(email_throttle.policy('status_change'), {'dedup': 0, 'limit': 2, 'window': 60})
+
+    @override_settings(EMAIL_HOURLY_QUOTA=2, EMAIL_OUTBOX_BATCH_SIZE=10)
+    def test_emails_over_hourly_quota_wait_in_outbox(self):
+        with self.assertLogs('loan_system.email_throttle', 'WARNING'):
+            queued, failed = FastInvestorEmailService.send_bulk_fast(FastInvestorEmailService.build_loan_approval_email, self.loans)
+        self.assertEqual((queued, failed, len(mail.outbox)), (3, 0, 2))
+        deferred = OutboxEmail.objects.get()
+        self.assertEqual(deferred.to, ['client2@example.com'])
+        self.assertGreater(deferred.available_at, timezone.now() + timedelta(minutes=59))
+        with self.assertLogs('loan_system.email_throttle', 'WARNING'):
+            self.assertEqual(outbox.process_batch(), (0, 0))
+
+    @override_settings(EMAIL_HOURLY_QUOTA=1)
+    def test_failed_sends_give_back_their_reservations(self):
+        full = mock.patch('loan_system.email_async.dispatch', side_effect=email_dispatch.EmailQueueFull('pleine'))
+        with full, self.assertLogs('loan_system.email_async', 'ERROR'):
+            self.assertFalse(FastInvestorEmailService.send_login_alert_fast(self.user, '10.0.0.1'))
+        failing = mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=smtplib.SMTPServerDisconnected('coupure'))
+        with failing, self.assertLogs('loan_system.email_async', 'ERROR'):
+            self.assertIsNotNone(FastInvestorEmailService.send_login_alert_fast(self.user, '10.0.0.1').exception())
+        # Ni doublon ni quota consommé par les échecs : la nouvelle tentative part
+        self.assertTrue(FastInvestorEmailService.send_login_alert_fast(self.user, '10.0.0.1').result())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_emails_of_a_batch_can_be_resent(self):
+        build = FastInvestorEmailService.build_loan_approval_email
+        failing_chunk = mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=[OSError('SMTP indisponible'), OSError('SMTP indisponible'), 1])
+        with override_settings(EMAIL_BULK_CHUNK_SIZE=2), failing_chunk, self.assertLogs('loan_system.email_dispatch', 'ERROR'):
+            FastInvestorEmailService.send_bulk_fast(build, self.loans)
+        self.assertEqual(FastInvestorEmailService.send_bulk_fast(build, self.loans), (2, 0))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['client0@example.com', 'client1@example.com'])
+
+    def test_investor_email_service_is_throttled(self):
+        self.assertTrue(InvestorEmailService.send_login_notification(self.user, '10.0.0.1'))
+        with self.assertLogs('loan_system.email_throttle', 'INFO'):
+            self.assertFalse(InvestorEmailService.send_login_notification(self.user, '10.0.0.2'))
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_HOURLY_QUOTA=10)
+    def test_quota_holds_under_concurrent_callers(self):
+        granted = []
+        threads = [threading.Thread(target=lambda: granted.append(email_throttle.acquire_quota(3)[0])) for _ in range(8)]
+        with self.assertLogs('loan_system.email_throttle', 'WARNING'):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertLessEqual(sum(granted), 10)
+        email_throttle.release_quota(sum(granted))
+        self.assertEqual(email_throttle.acquire_quota(10)[0], 10)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_ASYNC_SENDING=False, NOTIFICATION_EMAIL_MODE='digest',
+)
+class NotificationDigestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.admin_user = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        self.client.force_login(self.admin_user)
+        self.clients = [create_paid_loan(f'client{i}').user for i in range(2)]
+
+    def post_notification(self, recipient, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:loan_system_notification_add'), {
+                'recipient': recipient.pk, 'title': title, 'content': f'Contenu {title}', 'notification_type': 'info',
+                'action_url': '', 'action_text': '', 'sender': self.admin_user.pk, 'status': 'non_lu',
+            })
+
+    def test_notifications_are_coalesced_per_recipient(self):
+        for title in ('Relevé disponible', 'Rendez-vous confirmé', 'Document reçu'):
+            self.post_notification(self.clients[0], title)
+        self.post_notification(self.clients[1], 'Bienvenue')
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Notification.objects.filter(email_digest_queued_at__isnull=False).count(), 4)
+
+        # La plus ancienne notification n'a pas encore attendu la fenêtre
+        call_command('send_notification_digests', stdout=StringIO())
+        self.assertEqual(mail.outbox, [])
+
+        out = StringIO()
+        call_command('send_notification_digests', window=0, stdout=out)
+        self.assertIn('2 récapitulatif(s) mis en file pour 4 notification(s)', out.getvalue())
+        digests = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(sorted(digests), ['client0@example.com', 'client1@example.com'])
+        self.assertTrue(digests['client0@example.com'].subject.startswith('🔔 3 nouvelle(s) notification(s)'))
+        for title in ('Relevé disponible', 'Rendez-vous confirmé', 'Document reçu'):
+            self.assertIn(title, digests['client0@example.com'].body)
+            self.assertIn(title, digests['client0@example.com'].alternatives[0][0])
+
+        call_command('send_notification_digests', window=0, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(Notification.objects.filter(email_digest_sent_at__isnull=True).exists())
+
+    def test_failed_digests_are_sent_by_the_next_run(self):
+        self.post_notification(self.clients[0], 'Relevé disponible')
+        self.post_notification(self.clients[1], 'Bienvenue')
+
+        broken_build = mock.patch('loan_system.email_async.render_email', side_effect=RuntimeError('gabarit'))
+        with broken_build, self.assertLogs('loan_system.email_async', 'ERROR'):
+            call_command('send_notification_digests', window=0, stdout=StringIO(), stderr=StringIO())
+        failing = mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=smtplib.SMTPServerDisconnected('coupure'))
+        with failing, self.assertLogs('loan_system.email_dispatch', 'ERROR'):
+            call_command('send_notification_digests', window=0, stdout=StringIO())
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Notification.objects.filter(email_digest_sent_at__isnull=True, email_digest_claimed_at__isnull=True).count(), 2)
+
+        call_command('send_notification_digests', window=0, stdout=StringIO())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['client0@example.com', 'client1@example.com'])
+        self.assertFalse(Notification.objects.filter(email_digest_sent_at__isnull=True).exists())
+
+    def test_claimed_digests_are_left_to_their_sender_until_stale(self):
+        self.post_notification(self.clients[0], 'Relevé disponible')
+        self.assertEqual(len(notification_digest.claim_digests(window=0)), 1)
+        self.assertEqual(notification_digest.claim_digests(window=0), [])
+        Notification.objects.update(email_digest_claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(len(notification_digest.claim_digests(window=0)), 1)
+
+
+class FakeSMTP:
+    """Connexion SMTP factice : enregistre les emails et peut simuler des coupures"""
+    instances = []
+
+    def __init__(self, host, port, **kwargs):
+        self.sent = []
+        self.noop_code = 250
+        self.fail_next = None
+        self.closed = False
+        FakeSMTP.instances.append(self)
+
+    def starttls(self, context=None):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def noop(self):
+        return self.noop_code, b'OK'
+
+    def sendmail(self, from_email, recipients, message):
+        if self.fail_next:
+            error, self.fail_next = self.fail_next, None
+            raise error
+        self.sent.append(recipients)
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakePooledBackend(smtp_pool.PooledEmailBackend):
+    connection_class = FakeSMTP
+
+
+@override_settings(
+    EMAIL_HOST='smtp.test', EMAIL_CONNECTION_POOL_SIZE=2,
+    EMAIL_CONNECTION_POOL_KWARGS={'max_messages': 3, 'retry_delay': 0, 'health_check_after': 60},
+)
+class SMTPConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        FakeSMTP.instances = []
+        smtp_pool.close_pools()
+        self.addCleanup(smtp_pool.close_pools)
+
+    def send(self, count=1):
+        backend = FakePooledBackend()
+        messages = [mail.EmailMessage('Sujet', 'Corps', 'support@test.fr', [f'client{i}@test.fr']) for i in range(count)]
+        return backend.send_messages(messages)
+
+    def test_connection_is_reused_across_sends(self):
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(FakeSMTP.instances), 1)
+        self.assertFalse(FakeSMTP.instances[0].closed)
+
+    def test_connection_is_recycled_after_max_messages(self):
+        self.assertEqual(self.send(5), 5)
+        self.assertEqual(len(FakeSMTP.instances), 2)
+        self.assertTrue(FakeSMTP.instances[0].closed)
+        self.assertEqual([len(connection.sent) for connection in FakeSMTP.instances], [3, 2])
+
+    @override_settings(EMAIL_CONNECTION_POOL_KWARGS={'health_check_after': 0})
+    def test_dead_idle_connection_is_replaced_after_noop(self):
+        self.send()
+        FakeSMTP.instances[0].noop_code = 421
+        self.send()
+        self.assertEqual(len(FakeSMTP.instances), 2)
+        self.assertEqual(FakePooledBackend().pool.stats()['health_check_failed'], 1)
+
+    def test_disconnect_is_retried_on_a_new_connection(self):
+        self.send()
+        FakeSMTP.instances[0].fail_next = smtplib.SMTPServerDisconnected('coupure')
+        with self.assertLogs('loan_system.smtp_pool', 'WARNING'):
+            self.assertEqual(self.send(), 1)
+        self.assertEqual(len(FakeSMTP.instances), 2)
+        self.assertEqual(len(FakeSMTP.instances[1].sent), 1)
+
+    def test_permanent_refusal_is_not_retried_and_frees_the_connection(self):
+        self.send()
+        FakeSMTP.instances[0].fail_next = smtplib.SMTPRecipientsRefused({'client0@test.fr': (550, b'inconnu')})
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            self.send()
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(FakeSMTP.instances), 1)
+
+
+class AsyncEmailEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.server = SMTPStandIn(latency=0.005, refuse=[r'^inconnu@']).start()
+        self.addCleanup(self.server.stop)
+        self.settings_override = override_settings(
+            EMAIL_BACKEND='loan_system.smtp_pool.PooledEmailBackend', EMAIL_DELIVERY_ENGINE='asyncio',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.server.port, EMAIL_USE_TLS=False, EMAIL_TIMEOUT=5,
+            EMAIL_ASYNC_SESSIONS=3, EMAIL_ASYNC_PER_DOMAIN=2, EMAIL_CONNECTION_POOL_KWARGS={'retry_delay': 0},
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.addCleanup(smtp_async.reset_async_engine)
+
+    def test_emails_share_sessions_and_respect_domain_limit(self):
+        futures = [
+            FastInvestorEmailService.send_email_async('Sujet', '<p>Corps</p>', '.Corps', f'client{i}@banque{i % 3}.fr')
+            for i in range(30)
+        ]
+        self.assertEqual([future.result(10) for future in futures], [1] * 30)
+        self.assertEqual(len(self.server.messages), 30)
+        self.assertIn(b'\r\n.Corps', self.server.messages[0][2])
+        self.assertLessEqual(self.server.sessions, 3)
+        metrics = email_dispatch.email_metrics()
+        self.assertEqual((metrics['sent'], metrics['failed']), (30, 0))
+        self.assertLessEqual(metrics['peak_per_domain'], 2)
+
+    def test_refused_recipient_fails_without_retry(self):
+        future = FastInvestorEmailService.send_email_async('Sujet', '<p>Corps</p>', 'Corps', 'inconnu@banque.fr')
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            future.result(10)
+        batch = email_dispatch.dispatch_batch([
+            FastInvestorEmailService.build_email('Sujet', '<p>Corps</p>', 'Corps', address)
+            for address in ('inconnu@banque.fr', 'client@banque.fr')
+        ])
+        with self.assertLogs('loan_system.smtp_async', 'ERROR'):
+            self.assertEqual(batch.result(10), 1)
+        self.assertEqual(smtp_async.get_async_engine().metrics()['retried'], 0)
+        self.assertEqual(self.server.recipients(), ['client@banque.fr'])
+
+    def test_drained_emails_are_reported_not_failed(self):
+        self.server.latency = 0.2
+        engine = smtp_async.get_async_engine()
+        future = engine.submit(FastInvestorEmailService.build_email('Sujet', '<p>Corps</p>', 'Corps', 'client@banque.fr'))
+        with self.assertLogs('loan_system.smtp_async', 'WARNING'):
+            leftovers, _ = engine.drain(timeout=0.3)
+        self.assertTrue(future.cancelled())
+        self.assertEqual([message.to for message in leftovers], [['client@banque.fr']])
+        metrics = engine.metrics()
+        self.assertEqual((metrics['sent'], metrics['failed']), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_non_smtp_backend_uses_thread_pool(self):
+        self.assertEqual(email_dispatch.delivery_engine(), email_dispatch.THREADS)
+        self.assertEqual(FastInvestorEmailService.send_email_async('Sujet', '<p>Corps</p>', 'Corps', 'a@b.fr').result(5), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class CertificateStoreTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.loan = create_paid_loan()
+
+    def test_certificate_is_generated_once_and_served_from_storage(self):
+        with mock.patch('loan_system.certificates.generate_loan_certificate', return_value=b'%PDF-1') as generate:
+            self.assertEqual(certificates.get_or_generate_certificate(self.loan), b'%PDF-1')
+            self.assertEqual(certificates.get_or_generate_certificate(self.loan), b'%PDF-1')
+        self.assertEqual(generate.call_count, 1)
+
+    def test_changed_input_regenerates_and_purges_stale_version(self):
+        with mock.patch('loan_system.certificates.generate_loan_certificate', side_effect=[b'%PDF-1', b'%PDF-2']):
+            certificates.get_or_generate_certificate(self.loan)
+            old_name = certificates.certificate_name(self.loan)
+
+            self.loan.user.userprofile.adresse = '2 avenue de Lyon'
+            self.assertEqual(certificates.get_or_generate_certificate(self.loan), b'%PDF-2')
+
+        storage = certificates.get_certificate_storage()
+        self.assertNotEqual(certificates.certificate_name(self.loan), old_name)
+        self.assertFalse(storage.exists(old_name))
+        self.assertTrue(storage.exists(certificates.certificate_name(self.loan)))
+
+    def test_pregeneration_runs_after_commit_and_backfill_skips_fresh_certificates(self):
+        with mock.patch.object(certificates._pregeneration_executor, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                certificates.schedule_certificate_pregeneration(self.loan)
+        submit.assert_called_once_with(certificates.pregenerate_certificate, self.loan.pk)
+
+        with mock.patch('loan_system.certificates.generate_loan_certificate', return_value=b'%PDF-1') as generate:
+            with mock.patch('loan_system.certificates.connection'):
+                self.assertTrue(certificates.pregenerate_certificate(self.loan.pk))
+            out = StringIO()
+            call_command('backfill_certificates', stdout=out)
+        self.assertEqual(generate.call_count, 1)
+        self.assertIn('0 attestation(s) générée(s), 1 déjà à jour', out.getvalue())
+
+    def test_generate_certificates_writes_zip_archive(self):
+        other = create_paid_loan(username='autre')
+        create_paid_loan(username='en_attente', status='en_attente')
+        zip_path = os.path.join(self.media_root, 'audit.zip')
+        out = StringIO()
+        with mock.patch('loan_system.utils.generate_loan_certificate', return_value=b'%PDF-1'):
+            call_command('generate_certificates', '--workers', '1', '--zip', zip_path, stdout=out)
+
+        with zipfile.ZipFile(zip_path) as archive:
+            self.assertEqual(sorted(archive.namelist()), [
+                f'attestation_pret_INV_{self.loan.id:06d}.pdf',
+                f'attestation_pret_INV_{other.id:06d}.pdf',
+            ])
+        self.assertIn('2 attestation(s) générée(s), 0 en erreur', out.getvalue())
+        self.assertIn('p50', out.getvalue())
+        # Les autres statuts n'ont pas d'attestation
+        with self.assertRaises(CommandError):
+            call_command('generate_certificates', '--status', 'en_attente', stdout=StringIO())
+
+
+class ScheduleAppendixTests(TestCase):
+    def test_schedule_table_splits_lazily_per_page(self):
+        schedule = amortization.build_schedule(Decimal('125000.00'), 300, date(2024, 1, 15))
+        remaining = utils.ScheduleTable(schedule)
+        self.assertEqual(remaining.wrap(480, 700)[1], 302 * utils.SCHEDULE_ROW_HEIGHT)
+        pages = []
+        while True:
+            parts = remaining.split(480, 700)
+            pages.append(parts[0])
+            if len(parts) == 1:
+                break
+            remaining = parts[1]
+        rows_per_page = int(700 // utils.SCHEDULE_ROW_HEIGHT) - 1
+        self.assertEqual([page.stop - page.start for page in pages[:-1]], [rows_per_page] * (len(pages) - 1))
+        self.assertEqual(pages[-1].stop, len(schedule) + 1)
+        self.assertEqual(remaining.split(480, utils.SCHEDULE_ROW_HEIGHT), [])
+
+    def test_appendix_stays_within_memory_budget(self):
+        loan = create_paid_loan(duree_remboursement_mois=300)
+        without = utils.generate_loan_certificate(loan)
+        fingerprint = certificates.certificate_fingerprint(loan)
+        with override_settings(CERTIFICATE_INCLUDE_SCHEDULE=True):
+            tracemalloc.start()
+            try:
+                pdf = utils.generate_loan_certificate(loan)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            self.assertNotEqual(certificates.certificate_fingerprint(loan), fingerprint)
+        self.assertLess(peak, 2 * 1024 * 1024)
+        # 300 lignes + totaux, environ 51 par page
+        self.assertEqual(pdf.count(b'/Type /Page\n'), without.count(b'/Type /Page\n') + 6)
+
+
+class DownloadCertificateTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.loan = create_paid_loan()
+        profile = self.loan.user.userprofile
+        profile.piece_identite_recto = profile.piece_identite_verso = 'documents/identite/id.png'
+        profile.justificatif_adresse = 'documents/justificatifs/facture.pdf'
+        profile.save()
+        self.client.force_login(self.loan.user)
+        self.url = reverse('download_certificate', args=[self.loan.id])
+
+        patcher = mock.patch('loan_system.certificates.generate_loan_certificate', return_value=b'%PDF-0123456789')
+        self.generate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_download_streams_with_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-0123456789')
+        self.assertEqual(response['ETag'], f'"{certificates.certificate_fingerprint(self.loan)}"')
+        self.assertIn('Last-Modified', response)
+        self.assertIn('attestation_pret_INV_', response['Content-Disposition'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.generate.call_count, 1)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-8')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 5-8/15')
+        self.assertEqual(b''.join(response.streaming_content), b'0123')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=50-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */15')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=8-5')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Range', response)
@@ -20,6 +20,7 @@ urlpatterns = [
     path('loan-request/', views.loan_request, name='loan_request'),
     path('loan/<int:loan_id>/', views.loan_detail, name='loan_detail'),
     path('download-certificate/<int:loan_id>/', views.download_certificate, name='download_certificate'),
+    path('api/simulation/', views.loan_simulation, name='loan_simulation'),
     
     # Messagerie
     path('messages/', views.messages_list, name='messages_list'),
@@ -1,5 +1,5 @@
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable, Image, PageBreak, KeepTogether
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable, Image, PageBreak, KeepTogether, Flowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm, mm
 from reportlab.lib import colors
@@ -8,222 +8,169 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from io import BytesIO
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+import copy
 import os
 from django.conf import settings
 
+from . import branding
+
 # Import PIL pour le filigrane
 try:
     from PIL import Image as PILImage
 except ImportError:
     PILImage = None
 
+# Paramètres du filigrane
+WATERMARK_SIZE = 10 * cm
+WATERMARK_OPACITY = 0.06  # 6% d'opacité pour filigrane discret
+
+def build_watermark(logo_path):
+    """Construit le filigrane translucide (ImageReader) à partir du logo"""
+    img = PILImage.open(logo_path)
+    # Convertir en mode RGBA pour la transparence
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+
+    # Créer une version transparente du logo
+    img.thumbnail((int(WATERMARK_SIZE * 2.83), int(WATERMARK_SIZE * 2.83)), PILImage.Resampling.LANCZOS)
+
+    # Créer une image transparente pour le filigrane
+    watermark = PILImage.new('RGBA', img.size, (255, 255, 255, 0))
+    # Ajouter le logo avec opacité réduite (table de correspondance plutôt qu'un lambda par pixel)
+    alpha = img.getchannel('A')
+    alpha = alpha.point([int(p * WATERMARK_OPACITY) for p in range(256)])
+    img.putalpha(alpha)
+
+    watermark.paste(img, (0, 0), img)
+    return ImageReader(watermark)
+
+
+def get_watermark():
+    """Retourne le filigrane du logo, construit une fois par version du fichier"""
+    if not PILImage:
+        return None
+    logo = branding.get_asset(branding.LOGO)
+    if logo is None:
+        return None
+    return logo.derive('watermark', build_watermark)
+
+
 class NumberedCanvas(canvas.Canvas):
+    """Canvas qui ajoute le filigrane et la numérotation "Page n/N" à chaque page
+
+    Chaque page est terminée dès sa fin : le numéro de page est un formulaire PDF
+    référencé immédiatement et défini à l'enregistrement, quand le total est connu.
+    """
+
     def __init__(self, *args, **kwargs):
         canvas.Canvas.__init__(self, *args, **kwargs)
-        self._saved_page_states = []
-        self._logo_path = None
-        # Chercher le logo pour le filigrane
-        logo_paths = [
-            os.path.join(settings.BASE_DIR, 'static', 'images', 'logos', 'investor_logo.png'),
-        ]
-        if hasattr(settings, 'STATICFILES_DIRS') and settings.STATICFILES_DIRS:
-            for static_dir in settings.STATICFILES_DIRS:
-                logo_paths.append(os.path.join(static_dir, 'images', 'logos', 'investor_logo.png'))
-        
-        for logo_path in logo_paths:
-            if logo_path and os.path.exists(logo_path):
-                self._logo_path = logo_path
-                break
+        self._page_count = 0
 
     def showPage(self):
-        self._saved_page_states.append(dict(self.__dict__))
-        self._startPage()
+        self._page_count += 1
+        self.draw_watermark()
+        self.draw_page_number(self._page_count)
+        canvas.Canvas.showPage(self)
 
     def save(self):
-        num_pages = len(self._saved_page_states)
-        for (page_num, page_state) in enumerate(self._saved_page_states):
-            self.__dict__.update(page_state)
-            self.draw_watermark()
-            self.draw_page_number(page_num + 1, num_pages)
-            canvas.Canvas.showPage(self)
+        # Le total n'est connu qu'ici : définir les numéros référencés par chaque page
+        for page_num in range(1, self._page_count + 1):
+            self.beginForm(self._page_number_form(page_num))
+            self.draw_page_label(page_num, self._page_count)
+            self.endForm()
         canvas.Canvas.save(self)
     
     def draw_watermark(self):
         """Dessine le logo en filigrane sur chaque page"""
-        if not self._logo_path or not PILImage:
-            return
-        
         try:
+            # Même ImageReader pour toutes les pages : ReportLab n'intègre l'image qu'une fois par document
+            watermark = get_watermark()
+            if watermark is None:
+                return
+
             width, height = A4
-            # Dessiner le logo en filigrane au centre de la page
-            img = PILImage.open(self._logo_path)
-            # Convertir en mode RGBA pour la transparence
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # Créer une version transparente du logo
-            watermark_size = 10 * cm  # Taille du filigrane
-            img.thumbnail((int(watermark_size * 2.83), int(watermark_size * 2.83)), PILImage.Resampling.LANCZOS)
-            
-            # Créer une image transparente pour le filigrane
-            watermark = PILImage.new('RGBA', img.size, (255, 255, 255, 0))
-            # Ajouter le logo avec opacité réduite
-            alpha = img.split()[3] if len(img.split()) > 3 else None
-            if alpha:
-                alpha = alpha.point(lambda p: int(p * 0.06))  # 6% d'opacité pour filigrane discret
-                img.putalpha(alpha)
-            
-            watermark.paste(img, (0, 0), img)
-            
             # Dessiner le filigrane au centre avec rotation
             self.saveState()
             self.translate(width / 2, height / 2)
             self.rotate(45)  # Rotation de 45 degrés pour effet filigrane classique
-            self.drawImage(ImageReader(watermark), -watermark_size/2, -watermark_size/2, 
-                          width=watermark_size, height=watermark_size, mask='auto')
+            self.drawImage(watermark, -WATERMARK_SIZE/2, -WATERMARK_SIZE/2, 
+                          width=WATERMARK_SIZE, height=WATERMARK_SIZE, mask='auto')
             self.restoreState()
         except Exception:
             # Si erreur, on continue sans filigrane
             pass
 
-    def draw_page_number(self, page_num, total_pages):
+    @staticmethod
+    def _page_number_form(page_num):
+        return f"_pagenum_{page_num}"
+
+    def draw_page_number(self, page_num):
         width, height = A4
-        self.setFont("Helvetica", 8)
-        self.setFillColor(colors.HexColor('#6c757d'))
-        self.drawRightString(width - 2*cm, 1.5*cm, f"Page {page_num}/{total_pages}")
+        # Le libellé, aligné à droite sur le total, est dessiné dans le formulaire en coordonnées de page
+        self.saveState()
+        self.doForm(self._page_number_form(page_num))
+        self.restoreState()
         self.setStrokeColor(colors.HexColor('#2C3E50'))
         self.setLineWidth(0.5)
         self.line(2*cm, 2*cm, width - 2*cm, 2*cm)
 
+    def draw_page_label(self, page_num, total_pages):
+        width, height = A4
+        self.setFont("Helvetica", 8)
+        self.setFillColor(colors.HexColor('#6c757d'))
+        self.drawRightString(width - 2*cm, 1.5*cm, f"Page {page_num}/{total_pages}")
+
 def create_logo_placeholder():
     """Crée le logo Investor Banque pour le PDF"""
-    logo_paths = [
-        # Chemin direct depuis BASE_DIR
-        os.path.join(settings.BASE_DIR, 'static', 'images', 'logos', 'investor_logo.png'),
-        # Chemin depuis STATIC_ROOT si défini
-        os.path.join(settings.STATIC_ROOT, 'images', 'logos', 'investor_logo.png') if hasattr(settings, 'STATIC_ROOT') and settings.STATIC_ROOT else None,
-        # Chemin depuis STATICFILES_DIRS si défini
-    ]
-    
-    # Ajouter les chemins depuis STATICFILES_DIRS
-    if hasattr(settings, 'STATICFILES_DIRS') and settings.STATICFILES_DIRS:
-        for static_dir in settings.STATICFILES_DIRS:
-            logo_paths.append(os.path.join(static_dir, 'images', 'logos', 'investor_logo.png'))
-    
-    # Chercher le logo dans tous les chemins possibles
-    for logo_path in logo_paths:
-        if logo_path and os.path.exists(logo_path):
-            try:
-                # Tenter de charger l'image avec gestion des proportions
-                img = Image(logo_path)
-                # Calculer les dimensions en conservant les proportions
-                img_width, img_height = img.imageWidth, img.imageHeight
-                aspect_ratio = img_width / img_height if img_height > 0 else 1
-                
-                # Définir des dimensions fixes adaptées pour l'en-tête
-                max_width = 4 * cm
-                max_height = 2.5 * cm
-                
-                # Calculer les dimensions en conservant les proportions
-                if aspect_ratio > 1:
-                    # Image large
-                    display_width = min(max_width, max_height * aspect_ratio)
-                    display_height = display_width / aspect_ratio
-                else:
-                    # Image haute
-                    display_height = min(max_height, max_width / aspect_ratio)
-                    display_width = display_height * aspect_ratio
-                
-                return Image(logo_path, width=display_width, height=display_height)
-            except Exception as e:
-                # Si erreur de chargement, continuer à chercher ou utiliser le fallback
-                continue
+    logo = branding.get_asset(branding.LOGO)
+    if logo is not None:
+        # Dimensions adaptées pour l'en-tête, proportions conservées
+        return logo.fitted_flowable(4 * cm, 2.5 * cm)
     
     # Fallback : texte si le logo n'est pas trouvé
-    return Paragraph(
-        "<b>INVESTOR BANQUE</b><br/>Banque européenne",
-        ParagraphStyle('LogoPlaceholder', 
-            fontSize=12, 
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#2C3E50'),
-            fontName='Helvetica-Bold',
-            leading=14
-        )
-    )
+    return static_paragraph("<b>INVESTOR BANQUE</b><br/>Banque européenne", 'logo_placeholder')
 
 def create_seal_placeholder():
     """Crée le cachet de la banque"""
-    try:
-        seal_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'seals', 'bank_seal.png')
-        if os.path.exists(seal_path):
-            return Image(seal_path, width=3*cm, height=3*cm)
-    except:
-        pass
-    return Paragraph("", ParagraphStyle('SealPlaceholder'))
+    seal = branding.get_asset(branding.SEAL)
+    if seal is not None:
+        return seal.flowable(3*cm, 3*cm)
+    return static_paragraph("", 'seal_placeholder')
 
 def create_manager_signature_placeholder():
     """Crée la signature du gestionnaire"""
-    try:
-        signature_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'signatures', 'manager_signature.png')
-        if os.path.exists(signature_path):
-            return Image(signature_path, width=4.5*cm, height=2.5*cm)
-    except:
-        pass
-    
-    return Paragraph(
-        "M. Damien Boudraux<br/>Gestionnaire des Prêts<br/>Investor Banque",
-        ParagraphStyle('SignaturePlaceholder', 
-            fontSize=10, 
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#2C3E50'),
-            fontName='Helvetica-Bold',
-            leading=12
-        )
-    )
+    signature = branding.get_asset(branding.SIGNATURE)
+    if signature is not None:
+        return signature.flowable(4.5*cm, 2.5*cm)
+    
+    return static_paragraph("M. Damien Boudraux<br/>Gestionnaire des Prêts<br/>Investor Banque", 'signature_placeholder')
 
-def format_currency(amount):
-    """Formate un montant en EUR avec format français (espaces pour milliers, virgule pour décimales)"""
+def format_amount(amount):
+    """Formate un montant au format français (espaces pour milliers, virgule pour décimales), sans devise"""
     # Convertir en entier pour les milliers
     amount_str = f"{amount:,.2f}"
     # Remplacer la virgule par un espace temporaire, puis le point par une virgule, puis l'espace par un espace
     parts = amount_str.split('.')
     integer_part = parts[0].replace(',', ' ')
     decimal_part = parts[1] if len(parts) > 1 else '00'
-    return f"{integer_part},{decimal_part} EUR"
+    return f"{integer_part},{decimal_part}"
 
-def generate_loan_certificate(loan_request):
-    """Génère une attestation de prêt professionnelle et élégante"""
-    
-    if loan_request.status != 'paye':
-        raise ValueError("Le prêt doit être payé pour générer l'attestation")
-    
-    if not hasattr(loan_request.user, 'userprofile'):
-        raise ValueError("Profil utilisateur manquant")
-    
-    profile = loan_request.user.userprofile
-    if not profile.nom or not profile.prenom:
-        raise ValueError("Nom et prénom requis dans le profil")
-    
-    buffer = BytesIO()
-    
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2.5*cm,
-        bottomMargin=2.5*cm,
-        title=f"Attestation de Prêt INV-{loan_request.id:06d}",
-        author="Investor Banque",
-        subject="Attestation de Prêt Bancaire"
-    )
-    
-    styles = getSampleStyleSheet()
+def format_currency(amount):
+    """Formate un montant en EUR avec format français (espaces pour milliers, virgule pour décimales)"""
+    return f"{format_amount(amount)} EUR"
+
+@lru_cache(maxsize=None)
+def get_certificate_styles():
+    """Registre des styles de paragraphe de l'attestation, construit une seule fois par processus"""
+    sample_styles = getSampleStyleSheet()
+    styles = {}
     
     # Styles professionnels avec typographie améliorée
-    title_style = ParagraphStyle(
+    styles['title'] = ParagraphStyle(
         'MainTitle',
-        parent=styles['Title'],
+        parent=sample_styles['Title'],
         fontSize=24,
         spaceAfter=12,
         spaceBefore=0,
@@ -234,9 +181,9 @@ def generate_loan_certificate(loan_request):
         letterSpacing=1.2
     )
     
-    subtitle_style = ParagraphStyle(
+    styles['subtitle'] = ParagraphStyle(
         'Subtitle',
-        parent=styles['Heading1'],
+        parent=sample_styles['Heading1'],
         fontSize=13,
         spaceAfter=22,
         spaceBefore=8,
@@ -247,9 +194,9 @@ def generate_loan_certificate(loan_request):
         letterSpacing=0.5
     )
     
-    section_style = ParagraphStyle(
+    styles['section'] = ParagraphStyle(
         'SectionTitle',
-        parent=styles['Heading2'],
+        parent=sample_styles['Heading2'],
         fontSize=11,
         spaceAfter=14,
         spaceBefore=22,
@@ -260,9 +207,9 @@ def generate_loan_certificate(loan_request):
         leading=14
     )
     
-    normal_style = ParagraphStyle(
+    styles['normal'] = ParagraphStyle(
         'NormalText',
-        parent=styles['Normal'],
+        parent=sample_styles['Normal'],
         fontSize=10,
         spaceAfter=10,
         alignment=TA_JUSTIFY,
@@ -275,9 +222,15 @@ def generate_loan_certificate(loan_request):
         wordWrap='LTR'
     )
     
-    ref_style = ParagraphStyle(
+    # Blocs de la section III : alinéa sur le premier seulement, espacement après le dernier,
+    # coupure de page autorisée après une seule ligne comme dans un paragraphe unique
+    styles['conditions_first'] = ParagraphStyle('ConditionsFirst', parent=styles['normal'], spaceAfter=0)
+    styles['conditions'] = ParagraphStyle('Conditions', parent=styles['conditions_first'], firstLineIndent=0, allowOrphans=1)
+    styles['conditions_last'] = ParagraphStyle('ConditionsLast', parent=styles['conditions'], spaceAfter=styles['normal'].spaceAfter)
+    
+    styles['reference'] = ParagraphStyle(
         'ReferenceStyle',
-        parent=normal_style,
+        parent=styles['normal'],
         fontSize=11,
         alignment=TA_CENTER,
         fontName='Helvetica-Bold',
@@ -289,9 +242,9 @@ def generate_loan_certificate(loan_request):
         spaceAfter=12
     )
     
-    declaration_style = ParagraphStyle(
+    styles['declaration'] = ParagraphStyle(
         'Declaration',
-        parent=normal_style,
+        parent=styles['normal'],
         fontSize=10,
         spaceAfter=12,
         alignment=TA_JUSTIFY,
@@ -306,27 +259,413 @@ def generate_loan_certificate(loan_request):
         rightIndent=0.3*cm
     )
     
+    styles['preambule'] = ParagraphStyle(
+        'PreambuleStyle',
+        parent=styles['normal'],
+        fontSize=10.5,
+        spaceAfter=15,
+        alignment=TA_JUSTIFY,
+        leading=15,
+        firstLineIndent=0.5*cm
+    )
+    
+    styles['bank_info'] = ParagraphStyle('BankInfo', fontSize=9, alignment=TA_LEFT, leading=11, textColor=colors.HexColor('#2C3E50'))
+    
+    # Cellules des tableaux (bénéficiaire puis caractéristiques du prêt)
+    styles['cell_label'] = ParagraphStyle('CellLabel', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white)
+    styles['cell_value'] = ParagraphStyle('CellValue', fontSize=10, fontName='Helvetica')
+    styles['cell_label2'] = ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))
+    styles['cell_value2'] = ParagraphStyle('CellValue2', fontSize=10, fontName='Helvetica')
+    styles['cell_amount'] = ParagraphStyle('CellValue2', fontSize=11, fontName='Helvetica-Bold', textColor=colors.HexColor('#856404'), backColor=colors.HexColor('#FFF3CD'))
+    styles['cell_words'] = ParagraphStyle('CellValue2', fontSize=10, fontName='Helvetica-Oblique')
+    styles['cell_key'] = ParagraphStyle('CellValue2', fontSize=10, fontName='Courier')
+    
+    # Bloc des signatures
+    styles['date'] = ParagraphStyle('DateStyle', fontSize=11, fontName='Helvetica-Bold', alignment=TA_CENTER)
+    styles['sig_title'] = ParagraphStyle('SigTitle', fontSize=10, fontName='Helvetica-Bold', alignment=TA_CENTER, textColor=colors.HexColor('#2C3E50'))
+    styles['sig_name'] = ParagraphStyle('SigName', fontSize=10, fontName='Helvetica-Bold', alignment=TA_CENTER)
+    styles['sig_function'] = ParagraphStyle('SigFunction', fontSize=9, fontName='Helvetica', alignment=TA_CENTER)
+    styles['sig_note'] = ParagraphStyle('SigNote', fontSize=8, fontName='Helvetica-Oblique', alignment=TA_CENTER, textColor=colors.HexColor('#6c757d'))
+    styles['sig_seal'] = ParagraphStyle('SigSeal', fontSize=8, fontName='Helvetica-Oblique', alignment=TA_CENTER, textColor=colors.HexColor('#6c757d'))
+    
+    # Pied de page et images de remplacement
+    styles['footer_info'] = ParagraphStyle('FooterInfo', 
+        fontSize=7, 
+        textColor=colors.HexColor('#6c757d'),
+        alignment=TA_CENTER,
+        fontName='Helvetica',
+        leading=9
+    )
+    styles['empty'] = ParagraphStyle('Empty')
+    styles['logo_placeholder'] = ParagraphStyle('LogoPlaceholder', 
+        fontSize=12, 
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#2C3E50'),
+        fontName='Helvetica-Bold',
+        leading=14
+    )
+    styles['seal_placeholder'] = ParagraphStyle('SealPlaceholder')
+    styles['signature_placeholder'] = ParagraphStyle('SignaturePlaceholder', 
+        fontSize=10, 
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#2C3E50'),
+        fontName='Helvetica-Bold',
+        leading=12
+    )
+    return styles
+
+@lru_cache(maxsize=None)
+def get_certificate_table_styles():
+    """Styles fixes des tableaux de l'attestation, construits une seule fois par processus"""
+    return {
+        'header': TableStyle([
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ]),
+        'beneficiary': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#2C3E50')),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#2C3E50')),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]),
+        'loan': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ECF0F1')),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#78909C')),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('BACKGROUND', (1, 3), (1, 3), colors.HexColor('#FFF3CD')),
+        ]),
+        'signature': TableStyle([
+            ('SPAN', (0, 0), (2, 0)),
+            ('ALIGN', (0, 0), (2, 0), 'CENTER'),
+            ('VALIGN', (0, 0), (2, 0), 'MIDDLE'),
+            ('BOTTOMPADDING', (0, 0), (2, 0), 8),
+            ('SPAN', (0, 11), (1, 11)),
+            ('ALIGN', (0, 11), (0, 11), 'CENTER'),
+            ('ALIGN', (2, 11), (2, 11), 'CENTER'),
+            ('VALIGN', (0, 2), (0, 2), 'MIDDLE'),
+            ('VALIGN', (2, 2), (2, 2), 'MIDDLE'),
+            ('VALIGN', (0, 5), (0, 5), 'MIDDLE'),
+            ('VALIGN', (2, 5), (2, 5), 'MIDDLE'),
+            ('VALIGN', (2, 8), (2, 8), 'MIDDLE'),
+            ('VALIGN', (2, 9), (2, 9), 'MIDDLE'),
+            ('TOPPADDING', (0, 5), (0, 5), 18),
+            ('BOTTOMPADDING', (0, 5), (0, 5), 3),
+            ('TOPPADDING', (2, 8), (2, 8), 8),
+            ('BOTTOMPADDING', (2, 8), (2, 8), 3),
+            ('LINEBELOW', (0, 6), (0, 6), 1, colors.HexColor('#2C3E50')),
+            ('LINEBELOW', (2, 7), (2, 7), 1, colors.HexColor('#2C3E50')),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ]),
+        'footer': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ]),
+        'schedule': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 7.5),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2C3E50')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F4F6F7')]),
+            ('ALIGN', (0, 0), (1, -1), 'CENTER'),
+            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#78909C')),
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+            ('LEFTPADDING', (0, 0), (-1, -1), 4),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+        ]),
+        'schedule_total': TableStyle([
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ECF0F1')),
+        ]),
+    }
+
+class TemplateParagraph(Paragraph):
+    """Paragraphe à texte fixe dont le découpage en lignes est mémorisé par largeur disponible"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Partagé par les copies superficielles : la mise en page n'est calculée qu'une fois par processus
+        self._line_cache = {}
+
+    def breakLines(self, width):
+        key = tuple(width) if isinstance(width, (list, tuple)) else width
+        lines = self._line_cache.get(key)
+        if lines is None:
+            lines = self._line_cache[key] = super().breakLines(width)
+        return lines
+
+    def split(self, availWidth, availHeight):
+        # La coupure retouche les lignes découpées : elle travaille sur une mise en page non partagée
+        if hasattr(self, 'blPara'):
+            self.blPara = super().breakLines(self._wrapWidths)
+        return super().split(availWidth, availHeight)
+
+@lru_cache(maxsize=None)
+def _static_paragraph_prototype(text, style_name):
+    return TemplateParagraph(text, get_certificate_styles()[style_name])
+
+def static_paragraph(text, style_name):
+    """Paragraphe à texte fixe : le balisage n'est analysé qu'une fois, chaque document en reçoit une copie"""
+    # Copie superficielle : les fragments analysés sont partagés, l'état de mise en page reste propre au document
+    return copy.copy(_static_paragraph_prototype(text, style_name))
+
+BANK_INFO_TEXT = "<b>INVESTOR BANQUE</b><br/>Banque européenne<br/>Siège Social : Europe<br/>Tél/WhatsApp : +49 157 50098219<br/>Email : damien.boudraux17@outlook.fr<br/>Gestionnaire : Damien Boudraux"
+
+# Conditions générales (section III) : seule la clé de référence varie d'un prêt à l'autre
+CONDITIONS_TEXT = """A. MODALITÉS DE REMBOURSEMENT :
+
+• <b>Type de remboursement :</b> Annuités constantes (mensualités fixes)
+  Les mensualités restent identiques tout au long du prêt, composées d'une part de capital croissante et d'une part d'intérêts décroissante, offrant une meilleure visibilité sur les paiements futurs.
+
+• <b>Durée du prêt :</b> De 12 mois à 25 ans (300 mois maximum)
+  La durée est adaptée selon le montant emprunté, votre capacité de remboursement et votre projet. Durée maximale autorisée : vingt-cinq (25) ans.
+
+• <b>Fréquence des échéances :</b> Mensuelle
+  Les remboursements s'effectuent mensuellement, généralement le même jour de chaque mois, convenu lors de la signature du contrat.
+
+• <b>Calcul des mensualités :</b> Selon le taux d'intérêt applicable
+  Les mensualités sont calculées selon un système d'amortissement progressif, garantissant une répartition équilibrée du capital et des intérêts sur toute la durée du prêt.
+
+B. MODULATION DES ÉCHÉANCES :
+
+• <b>Augmentation des mensualités :</b> Possibilité d'augmenter vos mensualités à tout moment
+  Vous pouvez accélérer le remboursement en augmentant le montant de vos échéances, réduisant ainsi la durée totale du prêt et les intérêts payés.
+
+• <b>Diminution des mensualités :</b> Réduction possible sous conditions
+  En cas de difficultés temporaires, une demande de modulation à la baisse peut être étudiée, sous réserve de l'accord du gestionnaire et de la capacité de remboursement.
+
+C. REMBOURSEMENT ANTICIPÉ :
+
+• <b>Remboursement partiel anticipé :</b> Autorisé sans pénalité
+  Vous pouvez rembourser partiellement votre prêt avant l'échéance prévue, sans frais supplémentaires, réduisant ainsi le capital restant dû et les intérêts futurs.
+
+• <b>Remboursement total anticipé :</b> Autorisé sous conditions
+  Le remboursement total anticipé est possible. Des indemnités de remboursement anticipé peuvent s'appliquer, plafonnées à un semestre d'intérêts sur le capital remboursé, sans dépasser 3% du capital restant dû.
+
+• <b>Période de différé :</b> Possibilité de différer le remboursement du capital
+  En début de prêt, une période de différé peut être accordée, avec paiement des seuls intérêts pendant une période déterminée, notamment pour les projets d'investissement.
+
+D. MÉTHODE DE PAIEMENT :
+
+• <b>Mode de paiement :</b> Paiements effectués auprès du gestionnaire de compte désigné
+  Les remboursements s'effectuent exclusivement auprès de nos services agréés et habilités, par virement bancaire, prélèvement automatique ou remise de fonds.
+
+• <b>Identification obligatoire :</b> Présentation systématique de la clé de référence unique
+  Chaque transaction doit être identifiée avec votre clé de référence unique : <b>{payment_key}</b>
+
+• <b>Échéancier détaillé :</b> Disponible sur demande
+  Un tableau d'amortissement complet, détaillant chaque échéance (capital, intérêts, capital restant dû), peut être fourni sur simple demande auprès de votre gestionnaire.
+
+E. PÉNALITÉS ET RETARDS :
+
+• <b>Retard de paiement :</b> Soumis aux pénalités prévues
+  Tout retard de paiement sera soumis aux pénalités de retard prévues par nos conditions générales de crédit, conformément à la réglementation en vigueur.
+
+• <b>Défaut de paiement :</b> Procédures de recouvrement
+  En cas de défaut de paiement répété, des procédures de recouvrement peuvent être engagées, conformément aux dispositions légales et contractuelles.
+
+F. ASSURANCE ET GARANTIES :
+
+• <b>Assurance emprunteur :</b> Fortement recommandée
+  Bien que facultative, l'assurance emprunteur est fortement recommandée pour couvrir les risques de décès, d'invalidité ou d'incapacité de travail, protégeant ainsi vos proches et votre projet.
+
+• <b>Garanties :</b> Selon le montant et la nature du prêt
+  Selon le montant emprunté et la nature du prêt, des garanties peuvent être exigées (hypothèques, cautions, nantissements), conformément aux pratiques bancaires.
+
+G. CONTACT ET ASSISTANCE :
+
+• <b>Gestionnaire responsable :</b> Damien Boudraux
+• <b>Téléphone/WhatsApp :</b> +49 157 50098219
+• <b>Email :</b> damien.boudraux17@outlook.fr
+• <b>Horaires de service :</b> Lundi au Vendredi de 08h00 à 17h00
+
+Pour toute question concernant votre remboursement, n'hésitez pas à contacter votre gestionnaire qui vous apportera toute l'assistance nécessaire."""
+
+class ConditionsGap(Spacer):
+    """Ligne vide entre deux blocs de conditions, coupée en fin de page comme dans un paragraphe unique"""
+
+    def __init__(self, leading):
+        super().__init__(1, leading)
+        self.leading = leading
+
+    def wrap(self, availWidth, availHeight):
+        # Un paragraphe coupé sur un retour à la ligne reprend par une ligne vide sur la page suivante
+        if getattr(self, '_postponed', 0):
+            return self.width, 2 * self.leading
+        if availHeight < 2 * self.leading:
+            return self.width, availHeight + self.leading
+        return self.width, self.leading
+
+    def split(self, availWidth, availHeight):
+        if availHeight < self.leading:
+            return []
+        # La ligne vide tient sur cette page, mais pas la suivante : une ligne vide ouvre la page suivante
+        return [Spacer(1, self.leading), Spacer(1, self.leading)]
+
+def conditions_paragraphs(payment_key):
+    """Section III découpée en blocs : seuls ceux contenant la clé de référence sont mis en page à chaque prêt"""
+    styles = get_certificate_styles()
+    blocks = CONDITIONS_TEXT.split('\n\n')
+    # Le titre A reste lié au premier point : un paragraphe unique ne laisse pas une ligne seule en bas de page
+    blocks[:2] = ['\n\n'.join(blocks[:2])]
+    flowables = []
+    for index, block in enumerate(blocks):
+        if index:
+            flowables.append(ConditionsGap(styles['normal'].leading))
+        text = block.replace('\n', '<br/>')
+        if index == 0:
+            style_name = 'conditions_first'
+        elif index == len(blocks) - 1:
+            style_name = 'conditions_last'
+        else:
+            style_name = 'conditions'
+        if '{payment_key}' in text:
+            flowables.append(Paragraph(text.format(payment_key=payment_key), styles[style_name]))
+        else:
+            flowables.append(static_paragraph(text, style_name))
+    return flowables
+
+SCHEDULE_HEADER = ('N°', 'Échéance', 'Mensualité (EUR)', 'Intérêts (EUR)', 'Capital (EUR)', 'Capital restant dû (EUR)')
+SCHEDULE_COL_WIDTHS = (1.4*cm, 2.6*cm, 3.2*cm, 3*cm, 3.2*cm, 3.6*cm)
+SCHEDULE_ROW_HEIGHT = 13
+
+class ScheduleTable(Flowable):
+    """
+    Échéancier en tableau sur plusieurs pages, l'en-tête répété en haut de chacune
+    Les lignes ont une hauteur fixe : la coupure se calcule sans rien construire, et le
+    tableau d'une page n'est produit qu'au moment de la dessiner, puis abandonné
+    """
+
+    def __init__(self, schedule, start=0, stop=None):
+        super().__init__()
+        self.schedule = schedule
+        self.start = start
+        # La dernière ligne (index len(schedule)) est celle des totaux
+        self.stop = len(schedule) + 1 if stop is None else stop
+        self.width = sum(SCHEDULE_COL_WIDTHS)
+
+    def _height(self, rows):
+        return (rows + 1) * SCHEDULE_ROW_HEIGHT
+
+    def wrap(self, availWidth, availHeight):
+        self.height = self._height(self.stop - self.start)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        rows = int(availHeight // SCHEDULE_ROW_HEIGHT) - 1
+        if rows < 1:
+            return []
+        if self.start + rows >= self.stop:
+            return [self]
+        middle = self.start + rows
+        return [ScheduleTable(self.schedule, self.start, middle), ScheduleTable(self.schedule, middle, self.stop)]
+
+    def _row(self, index):
+        if index == len(self.schedule):
+            return ('', 'Total', format_amount(self.schedule.cout_total), format_amount(self.schedule.total_interets),
+                    format_amount(self.schedule.principal), '')
+        echeance = self.schedule[index]
+        return (
+            str(echeance.numero),
+            echeance.date_echeance.strftime('%d/%m/%Y') if echeance.date_echeance else f"Mois {echeance.numero}",
+            format_amount(echeance.mensualite),
+            format_amount(echeance.interets),
+            format_amount(echeance.capital),
+            format_amount(echeance.capital_restant),
+        )
+
+    def draw(self):
+        table_styles = get_certificate_table_styles()
+        rows = [SCHEDULE_HEADER]
+        rows.extend(self._row(index) for index in range(self.start, self.stop))
+        table = Table(rows, colWidths=SCHEDULE_COL_WIDTHS, rowHeights=[SCHEDULE_ROW_HEIGHT] * len(rows))
+        table.setStyle(table_styles['schedule'])
+        if self.stop > len(self.schedule):
+            table.setStyle(table_styles['schedule_total'])
+        table.wrapOn(self.canv, self.width, self.height)
+        table.drawOn(self.canv, 0, 0)
+
+def schedule_appendix(loan_request, schedule):
+    """Annexe de l'attestation : échéancier complet du prêt"""
+    taux_text = f"{schedule.annual_rate:.2f}".replace('.', ',')
+    summary = (
+        f"Prêt de <b>{format_currency(schedule.principal)}</b> remboursable en <b>{len(schedule)} mensualités</b> "
+        f"de <b>{format_currency(schedule.mensualite)}</b> au taux nominal annuel de <b>{taux_text} %</b>. "
+        f"Coût total des intérêts : <b>{format_currency(schedule.total_interets)}</b>."
+    )
+    return [
+        PageBreak(),
+        Paragraph(f"<u>ANNEXE : ÉCHÉANCIER D'AMORTISSEMENT (INV-{loan_request.id:06d})</u>", get_certificate_styles()['section']),
+        Paragraph(summary, get_certificate_styles()['normal']),
+        Spacer(1, 6),
+        ScheduleTable(schedule),
+    ]
+
+def generate_loan_certificate(loan_request, include_schedule=None):
+    """
+    Génère une attestation de prêt professionnelle et élégante
+    L'échéancier complet est joint en annexe si include_schedule (par défaut CERTIFICATE_INCLUDE_SCHEDULE)
+    """
+    
+    if loan_request.status != 'paye':
+        raise ValueError("Le prêt doit être payé pour générer l'attestation")
+    
+    if not hasattr(loan_request.user, 'userprofile'):
+        raise ValueError("Profil utilisateur manquant")
+    
+    profile = loan_request.user.userprofile
+    if not profile.nom or not profile.prenom:
+        raise ValueError("Nom et prénom requis dans le profil")
+    
+    buffer = BytesIO()
+    
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2.5*cm,
+        bottomMargin=2.5*cm,
+        title=f"Attestation de Prêt INV-{loan_request.id:06d}",
+        author="Investor Banque",
+        subject="Attestation de Prêt Bancaire"
+    )
+    
+    styles = get_certificate_styles()
+    table_styles = get_certificate_table_styles()
+    
     story = []
     
     # === EN-TÊTE ===
     header_data = [
         [
-            Paragraph(
-                "<b>INVESTOR BANQUE</b><br/>Banque européenne<br/>Siège Social : Europe<br/>Tél/WhatsApp : +49 157 50098219<br/>Email : damien.boudraux17@outlook.fr<br/>Gestionnaire : Damien Boudraux",
-                ParagraphStyle('BankInfo', fontSize=9, alignment=TA_LEFT, leading=11, textColor=colors.HexColor('#2C3E50'))
-            ),
+            static_paragraph(BANK_INFO_TEXT, 'bank_info'),
             create_logo_placeholder()
         ]
     ]
     
     header_table = Table(header_data, colWidths=[12*cm, 5*cm])
-    header_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    header_table.setStyle(table_styles['header'])
     
     story.append(header_table)
     story.append(Spacer(1, 8))
@@ -334,77 +673,58 @@ def generate_loan_certificate(loan_request):
     story.append(Spacer(1, 12))
     
     # === TITRE ===
-    story.append(Paragraph("ATTESTATION DE PRÊT BANCAIRE", title_style))
-    story.append(Paragraph("CERTIFICAT D'OCTROI DE CRÉDIT", subtitle_style))
+    story.append(static_paragraph("ATTESTATION DE PRÊT BANCAIRE", 'title'))
+    story.append(static_paragraph("CERTIFICAT D'OCTROI DE CRÉDIT", 'subtitle'))
     
     # === RÉFÉRENCE ===
     ref_text = f"RÉFÉRENCE : INV-{loan_request.id:06d}"
-    story.append(Paragraph(ref_text, ref_style))
+    story.append(Paragraph(ref_text, styles['reference']))
     story.append(Spacer(1, 12))
     
     # === PRÉAMBULE ===
     preambule = "La présente attestation est délivrée à la demande de l'intéressé(e) pour servir et valoir ce que de droit devant toute autorité compétente. Nous, <b>INVESTOR BANQUE</b>, banque européenne, certifions par les présentes avoir accordé un prêt dans les conditions ci-après détaillées."
-    preambule_style = ParagraphStyle(
-        'PreambuleStyle',
-        parent=normal_style,
-        fontSize=10.5,
-        spaceAfter=15,
-        alignment=TA_JUSTIFY,
-        leading=15,
-        firstLineIndent=0.5*cm
-    )
-    story.append(Paragraph(preambule, preambule_style))
+    story.append(static_paragraph(preambule, 'preambule'))
     story.append(Spacer(1, 12))
     
     # === IDENTIFICATION DU BÉNÉFICIAIRE ===
-    story.append(Paragraph("<u>I. IDENTIFICATION DU BÉNÉFICIAIRE</u>", section_style))
+    story.append(static_paragraph("<u>I. IDENTIFICATION DU BÉNÉFICIAIRE</u>", 'section'))
     
     # Créer les cellules avec Paragraph pour éviter les balises HTML
     beneficiary_data = [
         [
-            Paragraph('<b>Nom et Prénom</b>', ParagraphStyle('CellLabel', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white)),
-            Paragraph(f"{profile.nom.upper()} {profile.prenom}", ParagraphStyle('CellValue', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Nom et Prénom</b>', 'cell_label'),
+            Paragraph(f"{profile.nom.upper()} {profile.prenom}", styles['cell_value'])
         ],
         [
-            Paragraph('<b>Date de naissance</b>', ParagraphStyle('CellLabel', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white)),
-            Paragraph(profile.date_naissance.strftime('%d/%m/%Y') if profile.date_naissance else 'Non renseignée', ParagraphStyle('CellValue', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Date de naissance</b>', 'cell_label'),
+            Paragraph(profile.date_naissance.strftime('%d/%m/%Y') if profile.date_naissance else 'Non renseignée', styles['cell_value'])
         ],
         [
-            Paragraph('<b>Lieu de naissance</b>', ParagraphStyle('CellLabel', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white)),
-            Paragraph(getattr(profile, 'lieu_naissance', 'Non renseigné') or 'Non renseigné', ParagraphStyle('CellValue', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Lieu de naissance</b>', 'cell_label'),
+            Paragraph(getattr(profile, 'lieu_naissance', 'Non renseigné') or 'Non renseigné', styles['cell_value'])
         ],
         [
-            Paragraph('<b>Profession</b>', ParagraphStyle('CellLabel', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white)),
-            Paragraph(profile.profession or 'Non renseignée', ParagraphStyle('CellValue', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Profession</b>', 'cell_label'),
+            Paragraph(profile.profession or 'Non renseignée', styles['cell_value'])
         ],
         [
-            Paragraph('<b>Situation matrimoniale</b>', ParagraphStyle('CellLabel', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white)),
-            Paragraph(profile.get_situation_matrimoniale_display() if profile.situation_matrimoniale else 'Non renseignée', ParagraphStyle('CellValue', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Situation matrimoniale</b>', 'cell_label'),
+            Paragraph(profile.get_situation_matrimoniale_display() if profile.situation_matrimoniale else 'Non renseignée', styles['cell_value'])
         ],
         [
-            Paragraph('<b>Adresse complète</b>', ParagraphStyle('CellLabel', fontSize=10, fontName='Helvetica-Bold', textColor=colors.white)),
-            Paragraph(profile.adresse or 'Non renseignée', ParagraphStyle('CellValue', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Adresse complète</b>', 'cell_label'),
+            Paragraph(profile.adresse or 'Non renseignée', styles['cell_value'])
         ],
     ]
     
     beneficiary_table = Table(beneficiary_data, colWidths=[5*cm, 12*cm])
-    beneficiary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#2C3E50')),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#2C3E50')),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
+    beneficiary_table.setStyle(table_styles['beneficiary'])
     
     story.append(KeepTogether(beneficiary_table))
     story.append(Spacer(1, 12))
     
     # === CARACTÉRISTIQUES DU PRÊT ===
-    story.append(Paragraph("<u>II. CARACTÉRISTIQUES DU PRÊT ACCORDÉ</u>", section_style))
+    story.append(static_paragraph("<u>II. CARACTÉRISTIQUES DU PRÊT ACCORDÉ</u>", 'section'))
     
     date_demande = loan_request.date_demande.strftime('%d/%m/%Y') if loan_request.date_demande else 'Non renseignée'
     date_validation = loan_request.date_validation.strftime('%d/%m/%Y') if loan_request.date_validation else (date_demande if loan_request.date_demande else 'Non renseignée')
@@ -415,7 +735,12 @@ def generate_loan_certificate(loan_request):
     duree_mois_restants = loan_request.duree_remboursement_mois % 12
     duree_text = f"{duree_annees} an(s)" + (f" et {duree_mois_restants} mois" if duree_mois_restants > 0 else "")
     
-    montant_lettres = number_to_words(int(loan_request.montant))
+    montant_lettres = amount_to_words(loan_request.montant)
+    
+    try:
+        schedule = loan_request.amortization_schedule()
+    except ValueError:
+        schedule = None
     
     montant_formatted = format_currency(float(loan_request.montant))
     avance_formatted = format_currency(float(loan_request.montant_avance))
@@ -423,147 +748,75 @@ def generate_loan_certificate(loan_request):
     # Créer les cellules avec Paragraph pour éviter les balises HTML
     loan_data = [
         [
-            Paragraph('<b>Date de la demande</b>', ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))),
-            Paragraph(date_demande, ParagraphStyle('CellValue2', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Date de la demande</b>', 'cell_label2'),
+            Paragraph(date_demande, styles['cell_value2'])
         ],
         [
-            Paragraph('<b>Date de validation</b>', ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))),
-            Paragraph(date_validation, ParagraphStyle('CellValue2', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Date de validation</b>', 'cell_label2'),
+            Paragraph(date_validation, styles['cell_value2'])
         ],
         [
-            Paragraph('<b>Date d\'octroi du prêt</b>', ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))),
-            Paragraph(date_octroi, ParagraphStyle('CellValue2', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Date d\'octroi du prêt</b>', 'cell_label2'),
+            Paragraph(date_octroi, styles['cell_value2'])
         ],
         [
-            Paragraph('<b>Montant du prêt accordé</b>', ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))),
-            Paragraph(f'<b>{montant_formatted}</b>', ParagraphStyle('CellValue2', fontSize=11, fontName='Helvetica-Bold', textColor=colors.HexColor('#856404'), backColor=colors.HexColor('#FFF3CD')))
+            static_paragraph('<b>Montant du prêt accordé</b>', 'cell_label2'),
+            Paragraph(f'<b>{montant_formatted}</b>', styles['cell_amount'])
         ],
         [
-            Paragraph('<b>Montant en lettres</b>', ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))),
-            Paragraph(f'<i>{montant_lettres} euros</i>', ParagraphStyle('CellValue2', fontSize=10, fontName='Helvetica-Oblique'))
+            static_paragraph('<b>Montant en lettres</b>', 'cell_label2'),
+            Paragraph(f'<i>{montant_lettres}</i>', styles['cell_words'])
         ],
         [
-            Paragraph('<b>Montant de l\'apport (10%)</b>', ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))),
-            Paragraph(avance_formatted, ParagraphStyle('CellValue2', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Montant de l\'apport (10%)</b>', 'cell_label2'),
+            Paragraph(avance_formatted, styles['cell_value2'])
         ],
         [
-            Paragraph('<b>Durée de remboursement</b>', ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))),
-            Paragraph(f"{loan_request.duree_remboursement_mois} mois ({duree_text})", ParagraphStyle('CellValue2', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Durée de remboursement</b>', 'cell_label2'),
+            Paragraph(f"{loan_request.duree_remboursement_mois} mois ({duree_text})", styles['cell_value2'])
         ],
+    ]
+    if schedule is not None:
+        taux_text = f"{schedule.annual_rate:.2f}".replace('.', ',')
+        loan_data.append([
+            static_paragraph('<b>Mensualité constante</b>', 'cell_label2'),
+            Paragraph(f"{format_currency(float(schedule.mensualite))} (taux nominal annuel {taux_text} %)", styles['cell_value2'])
+        ])
+    loan_data += [
         [
-            Paragraph('<b>Date limite de remboursement</b>', ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))),
-            Paragraph(date_echeance, ParagraphStyle('CellValue2', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Date limite de remboursement</b>', 'cell_label2'),
+            Paragraph(date_echeance, styles['cell_value2'])
         ],
         [
-            Paragraph('<b>Objet du financement</b>', ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))),
-            Paragraph(loan_request.motif[:150] + "..." if len(loan_request.motif) > 150 else loan_request.motif, ParagraphStyle('CellValue2', fontSize=10, fontName='Helvetica'))
+            static_paragraph('<b>Objet du financement</b>', 'cell_label2'),
+            Paragraph(loan_request.motif[:150] + "..." if len(loan_request.motif) > 150 else loan_request.motif, styles['cell_value2'])
         ],
         [
-            Paragraph('<b>Clé de référence unique</b>', ParagraphStyle('CellLabel2', fontSize=10, fontName='Helvetica-Bold', textColor=colors.HexColor('#2C3E50'))),
-            Paragraph(f'<font face="Courier">{loan_request.payment_key or "Non générée"}</font>', ParagraphStyle('CellValue2', fontSize=10, fontName='Courier'))
+            static_paragraph('<b>Clé de référence unique</b>', 'cell_label2'),
+            Paragraph(f'<font face="Courier">{loan_request.payment_key or "Non générée"}</font>', styles['cell_key'])
         ],
     ]
     
     loan_table = Table(loan_data, colWidths=[5.5*cm, 11.5*cm])
-    loan_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ECF0F1')),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#78909C')),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('BACKGROUND', (1, 3), (1, 3), colors.HexColor('#FFF3CD')),
-    ]))
+    loan_table.setStyle(table_styles['loan'])
     
     story.append(KeepTogether(loan_table))
     story.append(Spacer(1, 12))
     
     # === CONDITIONS ===
-    story.append(Paragraph("<u>III. CONDITIONS ET MODALITÉS DE REMBOURSEMENT</u>", section_style))
-    
-    conditions_text = f"""A. MODALITÉS DE REMBOURSEMENT :
-
-• <b>Type de remboursement :</b> Annuités constantes (mensualités fixes)
-  Les mensualités restent identiques tout au long du prêt, composées d'une part de capital croissante et d'une part d'intérêts décroissante, offrant une meilleure visibilité sur les paiements futurs.
-
-• <b>Durée du prêt :</b> De 12 mois à 25 ans (300 mois maximum)
-  La durée est adaptée selon le montant emprunté, votre capacité de remboursement et votre projet. Durée maximale autorisée : vingt-cinq (25) ans.
-
-• <b>Fréquence des échéances :</b> Mensuelle
-  Les remboursements s'effectuent mensuellement, généralement le même jour de chaque mois, convenu lors de la signature du contrat.
-
-• <b>Calcul des mensualités :</b> Selon le taux d'intérêt applicable
-  Les mensualités sont calculées selon un système d'amortissement progressif, garantissant une répartition équilibrée du capital et des intérêts sur toute la durée du prêt.
-
-B. MODULATION DES ÉCHÉANCES :
-
-• <b>Augmentation des mensualités :</b> Possibilité d'augmenter vos mensualités à tout moment
-  Vous pouvez accélérer le remboursement en augmentant le montant de vos échéances, réduisant ainsi la durée totale du prêt et les intérêts payés.
-
-• <b>Diminution des mensualités :</b> Réduction possible sous conditions
-  En cas de difficultés temporaires, une demande de modulation à la baisse peut être étudiée, sous réserve de l'accord du gestionnaire et de la capacité de remboursement.
-
-C. REMBOURSEMENT ANTICIPÉ :
-
-• <b>Remboursement partiel anticipé :</b> Autorisé sans pénalité
-  Vous pouvez rembourser partiellement votre prêt avant l'échéance prévue, sans frais supplémentaires, réduisant ainsi le capital restant dû et les intérêts futurs.
-
-• <b>Remboursement total anticipé :</b> Autorisé sous conditions
-  Le remboursement total anticipé est possible. Des indemnités de remboursement anticipé peuvent s'appliquer, plafonnées à un semestre d'intérêts sur le capital remboursé, sans dépasser 3% du capital restant dû.
-
-• <b>Période de différé :</b> Possibilité de différer le remboursement du capital
-  En début de prêt, une période de différé peut être accordée, avec paiement des seuls intérêts pendant une période déterminée, notamment pour les projets d'investissement.
-
-D. MÉTHODE DE PAIEMENT :
-
-• <b>Mode de paiement :</b> Paiements effectués auprès du gestionnaire de compte désigné
-  Les remboursements s'effectuent exclusivement auprès de nos services agréés et habilités, par virement bancaire, prélèvement automatique ou remise de fonds.
-
-• <b>Identification obligatoire :</b> Présentation systématique de la clé de référence unique
-  Chaque transaction doit être identifiée avec votre clé de référence unique : <b>{loan_request.payment_key}</b>
-
-• <b>Échéancier détaillé :</b> Disponible sur demande
-  Un tableau d'amortissement complet, détaillant chaque échéance (capital, intérêts, capital restant dû), peut être fourni sur simple demande auprès de votre gestionnaire.
-
-E. PÉNALITÉS ET RETARDS :
-
-• <b>Retard de paiement :</b> Soumis aux pénalités prévues
-  Tout retard de paiement sera soumis aux pénalités de retard prévues par nos conditions générales de crédit, conformément à la réglementation en vigueur.
-
-• <b>Défaut de paiement :</b> Procédures de recouvrement
-  En cas de défaut de paiement répété, des procédures de recouvrement peuvent être engagées, conformément aux dispositions légales et contractuelles.
-
-F. ASSURANCE ET GARANTIES :
-
-• <b>Assurance emprunteur :</b> Fortement recommandée
-  Bien que facultative, l'assurance emprunteur est fortement recommandée pour couvrir les risques de décès, d'invalidité ou d'incapacité de travail, protégeant ainsi vos proches et votre projet.
-
-• <b>Garanties :</b> Selon le montant et la nature du prêt
-  Selon le montant emprunté et la nature du prêt, des garanties peuvent être exigées (hypothèques, cautions, nantissements), conformément aux pratiques bancaires.
-
-G. CONTACT ET ASSISTANCE :
-
-• <b>Gestionnaire responsable :</b> Damien Boudraux
-• <b>Téléphone/WhatsApp :</b> +49 157 50098219
-• <b>Email :</b> damien.boudraux17@outlook.fr
-• <b>Horaires de service :</b> Lundi au Vendredi de 08h00 à 17h00
-
-Pour toute question concernant votre remboursement, n'hésitez pas à contacter votre gestionnaire qui vous apportera toute l'assistance nécessaire."""
+    story.append(static_paragraph("<u>III. CONDITIONS ET MODALITÉS DE REMBOURSEMENT</u>", 'section'))
     
-    story.append(Paragraph(conditions_text.replace('\n', '<br/>'), normal_style))
+    story.extend(conditions_paragraphs(loan_request.payment_key))
     story.append(Spacer(1, 12))
     
     # === DÉCLARATION ===
-    story.append(Paragraph("<u>IV. DÉCLARATION OFFICIELLE ET CERTIFICATION</u>", section_style))
+    story.append(static_paragraph("<u>IV. DÉCLARATION OFFICIELLE ET CERTIFICATION</u>", 'section'))
     
     declaration_text = f"""Nous, <b>INVESTOR BANQUE</b>, banque européenne,
     
 <b>CERTIFIONS ET ATTESTONS PAR LES PRÉSENTES QUE :</b>
 
-Le prêt d'un montant de <b>{montant_formatted}</b> (en toutes lettres : <b>{montant_lettres} euros</b>) a été officiellement accordé, approuvé et débloqué au profit de <b>Monsieur/Madame {profile.nom.upper()} {profile.prenom}</b>, en date du <b>{date_octroi}</b>, conformément à nos procédures internes de crédit et aux réglementations en vigueur.
+Le prêt d'un montant de <b>{montant_formatted}</b> (en toutes lettres : <b>{montant_lettres}</b>) a été officiellement accordé, approuvé et débloqué au profit de <b>Monsieur/Madame {profile.nom.upper()} {profile.prenom}</b>, en date du <b>{date_octroi}</b>, conformément à nos procédures internes de crédit et aux réglementations en vigueur.
 
 Cette attestation est délivrée pour servir et valoir ce que de droit devant toute autorité administrative, judiciaire, notariale ou tout organisme public ou privé qui en ferait la demande. Elle peut être utilisée comme justificatif officiel et authentique dans le cadre des démarches légitimes du bénéficiaire.
 
@@ -571,61 +824,39 @@ La présente attestation est établie en un exemplaire original et ne peut faire
 
 <b>EN FOI DE QUOI</b>, nous avons établi la présente attestation."""
     
-    story.append(Paragraph(declaration_text.replace('\n', '<br/>'), declaration_style))
+    story.append(Paragraph(declaration_text.replace('\n', '<br/>'), styles['declaration']))
     story.append(Spacer(1, 18))
     
     # === SIGNATURES ===
     lieu_date_text = f"Fait à Europe, le {datetime.now().strftime('%d %B %Y')}"
-    lieu_date = Paragraph(f"<b>{lieu_date_text}</b>", ParagraphStyle('DateStyle', fontSize=11, fontName='Helvetica-Bold', alignment=TA_CENTER))
+    lieu_date = Paragraph(f"<b>{lieu_date_text}</b>", styles['date'])
     
     signature_data = [
         [lieu_date, '', ''],
         ['', '', ''],
         [
-            Paragraph('<b>LE BÉNÉFICIAIRE</b>', ParagraphStyle('SigTitle', fontSize=10, fontName='Helvetica-Bold', alignment=TA_CENTER, textColor=colors.HexColor('#2C3E50'))),
+            static_paragraph('<b>LE BÉNÉFICIAIRE</b>', 'sig_title'),
             '',
-            Paragraph('<b>LA BANQUE</b>', ParagraphStyle('SigTitle', fontSize=10, fontName='Helvetica-Bold', alignment=TA_CENTER, textColor=colors.HexColor('#2C3E50')))
+            static_paragraph('<b>LA BANQUE</b>', 'sig_title')
         ],
         ['', '', ''],
         ['', '', ''],
         [
-            Paragraph(f'{profile.nom.upper()} {profile.prenom}', ParagraphStyle('SigName', fontSize=10, fontName='Helvetica-Bold', alignment=TA_CENTER)),
+            Paragraph(f'{profile.nom.upper()} {profile.prenom}', styles['sig_name']),
             '',
-            Paragraph('INVESTOR BANQUE', ParagraphStyle('SigName', fontSize=10, fontName='Helvetica-Bold', alignment=TA_CENTER))
+            static_paragraph('INVESTOR BANQUE', 'sig_name')
         ],
         ['', '', ''],
         ['', '', ''],
         ['', '', create_manager_signature_placeholder()],
-        ['', '', Paragraph('Le Gestionnaire des Prêts', ParagraphStyle('SigFunction', fontSize=9, fontName='Helvetica', alignment=TA_CENTER))],
+        ['', '', static_paragraph('Le Gestionnaire des Prêts', 'sig_function')],
         ['', '', ''],
-        [Paragraph('(Signature précédée de la mention<br/>"Lu et approuvé")', ParagraphStyle('SigNote', fontSize=8, fontName='Helvetica-Oblique', alignment=TA_CENTER, textColor=colors.HexColor('#6c757d'))), '', ''],
-        ['', '', Paragraph('+ Cachet officiel', ParagraphStyle('SigSeal', fontSize=8, fontName='Helvetica-Oblique', alignment=TA_CENTER, textColor=colors.HexColor('#6c757d')))],
+        [static_paragraph('(Signature précédée de la mention<br/>"Lu et approuvé")', 'sig_note'), '', ''],
+        ['', '', static_paragraph('+ Cachet officiel', 'sig_seal')],
     ]
     
     signature_table = Table(signature_data, colWidths=[6*cm, 5*cm, 6*cm])
-    signature_table.setStyle(TableStyle([
-        ('SPAN', (0, 0), (2, 0)),
-        ('ALIGN', (0, 0), (2, 0), 'CENTER'),
-        ('VALIGN', (0, 0), (2, 0), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (2, 0), 8),
-        ('SPAN', (0, 11), (1, 11)),
-        ('ALIGN', (0, 11), (0, 11), 'CENTER'),
-        ('ALIGN', (2, 11), (2, 11), 'CENTER'),
-        ('VALIGN', (0, 2), (0, 2), 'MIDDLE'),
-        ('VALIGN', (2, 2), (2, 2), 'MIDDLE'),
-        ('VALIGN', (0, 5), (0, 5), 'MIDDLE'),
-        ('VALIGN', (2, 5), (2, 5), 'MIDDLE'),
-        ('VALIGN', (2, 8), (2, 8), 'MIDDLE'),
-        ('VALIGN', (2, 9), (2, 9), 'MIDDLE'),
-        ('TOPPADDING', (0, 5), (0, 5), 18),
-        ('BOTTOMPADDING', (0, 5), (0, 5), 3),
-        ('TOPPADDING', (2, 8), (2, 8), 8),
-        ('BOTTOMPADDING', (2, 8), (2, 8), 3),
-        ('LINEBELOW', (0, 6), (0, 6), 1, colors.HexColor('#2C3E50')),
-        ('LINEBELOW', (2, 7), (2, 7), 1, colors.HexColor('#2C3E50')),
-        ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-    ]))
+    signature_table.setStyle(table_styles['signature'])
     
     story.append(KeepTogether(signature_table))
     story.append(Spacer(1, 12))
@@ -634,77 +865,35 @@ La présente attestation est établie en un exemplaire original et ne peut faire
     story.append(Spacer(1, 15))
     story.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#78909C'), spaceBefore=8, spaceAfter=8))
     
-    # Créer un pied de page avec logo et informations
-    footer_logo = create_logo_placeholder()
-    footer_logo_small = None
-    
-    # Réduire la taille du logo pour le pied de page
-    try:
-        logo_paths = [
-            os.path.join(settings.BASE_DIR, 'static', 'images', 'logos', 'investor_logo.png'),
-        ]
-        if hasattr(settings, 'STATICFILES_DIRS') and settings.STATICFILES_DIRS:
-            for static_dir in settings.STATICFILES_DIRS:
-                logo_paths.append(os.path.join(static_dir, 'images', 'logos', 'investor_logo.png'))
-        
-        for logo_path in logo_paths:
-            if logo_path and os.path.exists(logo_path):
-                try:
-                    img = Image(logo_path)
-                    img_width, img_height = img.imageWidth, img.imageHeight
-                    aspect_ratio = img_width / img_height if img_height > 0 else 1
-                    
-                    # Dimensions pour le pied de page (plus petit)
-                    max_width = 2 * cm
-                    max_height = 1 * cm
-                    
-                    # Calculer les dimensions en conservant les proportions
-                    if aspect_ratio > 1:
-                        # Image large
-                        display_width = min(max_width, max_height * aspect_ratio)
-                        display_height = display_width / aspect_ratio
-                    else:
-                        # Image haute
-                        display_height = min(max_height, max_width / aspect_ratio)
-                        display_width = display_height * aspect_ratio
-                    
-                    footer_logo_small = Image(logo_path, width=display_width, height=display_height)
-                    break
-                except:
-                    continue
-    except:
-        pass
+    # Logo réduit pour le pied de page
+    logo = branding.get_asset(branding.LOGO)
+    footer_logo_small = logo.fitted_flowable(2 * cm, 1 * cm) if logo is not None else None
     
     footer_data = [
         [
-            footer_logo_small if footer_logo_small else Paragraph("", ParagraphStyle('Empty')),
+            footer_logo_small if footer_logo_small else static_paragraph("", 'empty'),
             Paragraph(
                 f"<b>INVESTOR BANQUE</b><br/>"
                 f"<i>Banque européenne</i><br/>"
                 f"<font size='7'>Document authentique généré le {datetime.now().strftime('%d/%m/%Y à %H:%M:%S')}</font><br/>"
                 f"<font size='7'>Référence : INV-{loan_request.id:06d} | Empreinte : {abs(hash(f'{loan_request.id}{loan_request.payment_key}'))}</font><br/>"
                 f"<font size='7'>Vérification : damien.boudraux17@outlook.fr - +49 157 50098219</font>",
-                ParagraphStyle('FooterInfo', 
-                    fontSize=7, 
-                    textColor=colors.HexColor('#6c757d'),
-                    alignment=TA_CENTER,
-                    fontName='Helvetica',
-                    leading=9
-                )
+                styles['footer_info']
             )
         ]
     ]
     
     footer_table = Table(footer_data, colWidths=[3*cm, 14*cm])
-    footer_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 5),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-    ]))
+    footer_table.setStyle(table_styles['footer'])
     
     story.append(footer_table)
     
+    # === ANNEXE : ÉCHÉANCIER ===
+    if include_schedule is None:
+        include_schedule = getattr(settings, 'CERTIFICATE_INCLUDE_SCHEDULE', False)
+    if include_schedule and schedule is not None:
+        story.extend(schedule_appendix(loan_request, schedule))
+    
     doc.build(story, canvasmaker=NumberedCanvas)
     
     pdf_content = buffer.getvalue()
@@ -712,78 +901,104 @@ La présente attestation est établie en un exemplaire original et ne peut faire
     
     return pdf_content
 
+# Nombres en lettres (orthographe traditionnelle), construits une fois à l'import
+_UNITS = (
+    "zéro", "un", "deux", "trois", "quatre", "cinq", "six", "sept", "huit", "neuf",
+    "dix", "onze", "douze", "treize", "quatorze", "quinze", "seize", "dix-sept", "dix-huit", "dix-neuf",
+)
+_TENS = ("", "", "vingt", "trente", "quarante", "cinquante", "soixante")
+
+# Échelles décroissantes : (valeur, singulier, pluriel)
+_SCALES = (
+    (10**9, "milliard", "milliards"),
+    (10**6, "million", "millions"),
+    (10**3, "mille", "mille"),
+)
+NUMBER_WORDS_LIMIT = 10**12
+
+def _build_below_hundred():
+    words = list(_UNITS)
+    for n in range(20, 100):
+        tens, unit = divmod(n, 10)
+        if tens in (7, 9):
+            # 70-79 et 90-99 : soixante / quatre-vingt suivis de 10 à 19
+            base = "soixante" if tens == 7 else "quatre-vingt"
+            unit += 10
+        else:
+            base = _TENS[tens] if tens < 7 else "quatre-vingt"
+        if unit == 0:
+            words.append("quatre-vingts" if n == 80 else base)
+        elif unit in (1, 11) and tens not in (8, 9):
+            words.append(f"{base} et {_UNITS[unit]}")
+        else:
+            words.append(f"{base}-{_UNITS[unit]}")
+    return words
+
+def _build_below_thousand(below_hundred):
+    words = list(below_hundred)
+    for n in range(100, 1000):
+        hundreds, rest = divmod(n, 100)
+        prefix = "cent" if hundreds == 1 else f"{_UNITS[hundreds]} cent"
+        if rest:
+            words.append(f"{prefix} {below_hundred[rest]}")
+        else:
+            words.append(prefix if hundreds == 1 else prefix + "s")
+    return tuple(words)
+
+# Tranches de 0 à 999 en position finale ("deux cents", "quatre-vingts")
+_CHUNK_WORDS = _build_below_thousand(_build_below_hundred())
+# Devant "mille", cent et vingt restent invariables ("deux cent mille", "quatre-vingt mille")
+_CHUNK_WORDS_BEFORE_MILLE = tuple(
+    words[:-1] if (n % 100 == 0 and n > 100) or n % 100 == 80 else words
+    for n, words in enumerate(_CHUNK_WORDS)
+)
+
+@lru_cache(maxsize=4096)
 def number_to_words(number):
-    """Convertit un nombre en lettres françaises"""
-    if number == 0:
-        return "zéro"
-    
-    ones = ["", "un", "deux", "trois", "quatre", "cinq", "six", "sept", "huit", "neuf"]
-    teens = ["dix", "onze", "douze", "treize", "quatorze", "quinze", "seize", "dix-sept", "dix-huit", "dix-neuf"]
-    tens = ["", "", "vingt", "trente", "quarante", "cinquante", "soixante", "soixante-dix", "quatre-vingt", "quatre-vingt-dix"]
-    
-    def convert_hundreds(n):
-        result = ""
-        if n >= 100:
-            if n // 100 == 1:
-                result += "cent"
-            else:
-                result += ones[n // 100] + " cent"
-            if n % 100 != 0:
-                result += " "
-            n %= 100
-        if n >= 20:
-            if n >= 80:
-                if n == 80:
-                    result += "quatre-vingts"
-                else:
-                    result += "quatre-vingt"
-                    if n % 10 != 0:
-                        result += "-" + ones[n % 10]
-            elif n >= 70:
-                result += "soixante"
-                if n % 10 == 1:
-                    result += " et onze"
-                else:
-                    result += "-" + teens[(n % 10)]
-            else:
-                result += tens[n // 10]
-                if n % 10 != 0:
-                    if n // 10 == 2 and n % 10 == 1:
-                        result += " et un"
-                    else:
-                        result += "-" + ones[n % 10]
-        elif n >= 10:
-            result += teens[n - 10]
-        elif n > 0:
-            result += ones[n]
-        return result
-    
+    """Convertit un entier (de 0 à 999 999 999 999) en lettres françaises"""
+    number = int(number)
+    if number < 0 or number >= NUMBER_WORDS_LIMIT:
+        raise ValueError(f"Nombre hors limites pour la conversion en lettres : {number}")
     if number < 1000:
-        return convert_hundreds(number)
-    elif number < 1000000:
-        thousands = number // 1000
-        remainder = number % 1000
-        result = ""
-        if thousands == 1:
-            result = "mille"
+        return _CHUNK_WORDS[number]
+
+    parts = []
+    for value, singular, plural in _SCALES:
+        count, number = divmod(number, value)
+        if not count:
+            continue
+        if value == 1000:
+            # "mille" et non "un mille"
+            parts.append("mille" if count == 1 else f"{_CHUNK_WORDS_BEFORE_MILLE[count]} mille")
         else:
-            result = convert_hundreds(thousands) + " mille"
-        if remainder > 0:
-            result += " " + convert_hundreds(remainder)
-        return result
-    elif number < 1000000000:
-        millions = number // 1000000
-        remainder = number % 1000000
-        result = convert_hundreds(millions) + " million"
-        if millions > 1:
-            result += "s"
-        if remainder > 0:
-            if remainder < 1000:
-                result += " " + convert_hundreds(remainder)
-            else:
-                result += " " + convert_hundreds(remainder // 1000) + " mille"
-                if remainder % 1000 > 0:
-                    result += " " + convert_hundreds(remainder % 1000)
-        return result
+            # Millions et milliards sont des noms : "deux cents millions"
+            parts.append(f"{_CHUNK_WORDS[count]} {singular if count == 1 else plural}")
+    if number:
+        parts.append(_CHUNK_WORDS[number])
+    return " ".join(parts)
+
+@lru_cache(maxsize=4096)
+def amount_to_words(amount):
+    """Montant en euros en toutes lettres, centimes compris ("... euros et X centimes")"""
+    cents_total = int((Decimal(amount) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    euros, cents = divmod(cents_total, 100)
+
+    if euros >= 10**6 and euros % 10**6 == 0:
+        # "un million d'euros", "deux milliards d'euros"
+        words = f"{number_to_words(euros)} d'euros"
     else:
-        return "nombre trop grand"
+        words = f"{number_to_words(euros)} {'euro' if euros <= 1 else 'euros'}"
+    if cents:
+        words += f" et {number_to_words(cents)} {'centime' if cents == 1 else 'centimes'}"
+    return words
+
+def amounts_to_words(amounts):
+    """Convertit une série de montants en une passe (exports) ; chaque montant distinct n'est converti qu'une fois"""
+    converted = {}
+    result = []
+    for amount in amounts:
+        words = converted.get(amount)
+        if words is None:
+            words = converted[amount] = amount_to_words(amount)
+        result.append(words)
+    return result
@@ -3,15 +3,19 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.db import transaction
 from django.core.paginator import Paginator
 from django.db.models import Q
+from django.views.decorators.http import require_GET
 from decimal import Decimal
 from .models import UserProfile, LoanRequest, Payment, Message, Notification
 from .forms import CustomUserCreationForm, UserProfileForm, LoanRequestForm, MessageForm, NotificationForm
-from .utils import generate_loan_certificate
+from .certificates import certificate_fingerprint, certificate_modified_time, open_certificate
+from .amortization import MAX_DURATION_MONTHS, quote
 from .email_service import InvestorEmailService
 from .email_async import FastInvestorEmailService
 
@@ -59,9 +63,9 @@ def register(request):
                     
                     profile.save()
                     
-                    # Envoyer l'email de bienvenue (rapide)
+                    # Email de bienvenue envoyé après la validation de la transaction
                     try:
-                        FastInvestorEmailService.send_welcome_email_fast(user)
+                        FastInvestorEmailService.send_on_commit(FastInvestorEmailService.send_welcome_email_fast, user)
                     except Exception as e:
                         print(f"Erreur envoi email bienvenue: {e}")
                     
@@ -87,7 +91,7 @@ def dashboard(request):
     if 'login_notification_sent' not in request.session:
         try:
             ip_address = request.META.get('REMOTE_ADDR', 'Non disponible')
-            FastInvestorEmailService.send_login_alert_fast(request.user, ip_address)
+            FastInvestorEmailService.send_on_commit(FastInvestorEmailService.send_login_alert_fast, request.user, ip_address)
             request.session['login_notification_sent'] = True
         except Exception as e:
             print(f"Erreur envoi notification connexion: {e}")
@@ -177,9 +181,9 @@ def loan_request(request):
                     loan_req.user = request.user
                     loan_req.save()
                     
-                    # Envoyer confirmation de demande de prêt (rapide)
+                    # Confirmation de demande de prêt envoyée après la validation de la transaction
                     try:
-                        FastInvestorEmailService.send_loan_request_confirmation_fast(loan_req)
+                        FastInvestorEmailService.send_on_commit(FastInvestorEmailService.send_loan_request_confirmation_fast, loan_req)
                     except Exception as e:
                         print(f"Erreur envoi confirmation demande prêt: {e}")
                     
@@ -198,12 +202,115 @@ def loan_request(request):
 def loan_detail(request, loan_id):
     """Détails d'une demande de prêt"""
     loan = get_object_or_404(LoanRequest, id=loan_id, user=request.user)
-    return render(request, 'loan_system/loan_detail.html', {'loan': loan})
+    
+    schedule = None
+    if loan.status != 'rejete':
+        try:
+            schedule = loan.amortization_schedule()
+        except ValueError:
+            pass
+    
+    return render(request, 'loan_system/loan_detail.html', {'loan': loan, 'schedule': schedule})
+
+@require_GET
+def loan_simulation(request):
+    """Simulation de mensualité (JSON) pour le simulateur du formulaire, sans accès à la base"""
+    try:
+        montant = Decimal(request.GET.get('montant', ''))
+        duree = int(request.GET.get('duree', 84))
+        taux = request.GET.get('taux') or None
+        if not Decimal('5000') <= montant <= Decimal('5000000'):
+            return JsonResponse({'error': 'Le montant doit être compris entre 5 000 et 5 000 000 EUR'}, status=400)
+        if not 12 <= duree <= MAX_DURATION_MONTHS:
+            return JsonResponse({'error': f'La durée doit être comprise entre 12 et {MAX_DURATION_MONTHS} mois'}, status=400)
+        simulation = quote(montant, duree, taux)
+    except (ArithmeticError, ValueError):
+        return JsonResponse({'error': 'Paramètres de simulation invalides'}, status=400)
+    
+    data = {field: str(value) if isinstance(value, Decimal) else value for field, value in simulation._asdict().items()}
+    response = JsonResponse(data)
+    patch_cache_control(response, public=True, max_age=300)
+    return response
+
+class _FileRange:
+    """Lecture bornée à une plage d'octets d'un fichier"""
+    
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self._file = file
+        self._remaining = length
+    
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+    
+    def close(self):
+        self._file.close()
+
+def _parse_byte_range(range_header, size):
+    """Analyse un en-tête Range à plage unique : (début, fin) inclus, None si ignoré, False si non satisfiable"""
+    unit, _, ranges = range_header.partition('=')
+    if unit.strip() != 'bytes' or ',' in ranges:
+        return None
+    first, _, last = ranges.strip().partition('-')
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffixe : les N derniers octets
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if first and last and end < start:
+        # Plage invalide (RFC 9110 §14.2) : ignorée, la réponse complète est servie
+        return None
+    if start >= size:
+        return False
+    return start, min(end, size - 1)
+
+def _certificate_response(request, pdf_file, filename, etag, last_modified):
+    """Réponse en flux de l'attestation, avec prise en charge des requêtes Range"""
+    pdf_file.seek(0, 2)
+    size = pdf_file.tell()
+    pdf_file.seek(0)
+    
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = _parse_byte_range(range_header, size)
+    
+    if byte_range is False:
+        pdf_file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range:
+        start, end = byte_range
+        response = FileResponse(_FileRange(pdf_file, start, end - start + 1), status=206,
+                                as_attachment=True, filename=filename, content_type='application/pdf')
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = FileResponse(pdf_file, as_attachment=True, filename=filename, content_type='application/pdf')
+    
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    # Attestation personnelle : pas de cache partagé, revalidation via ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required
 def download_certificate(request, loan_id):
     """Télécharger l'attestation de prêt"""
-    loan = get_object_or_404(LoanRequest, id=loan_id, user=request.user)
+    loan = get_object_or_404(LoanRequest.objects.select_related('user__userprofile'), id=loan_id, user=request.user)
     
     if loan.status != 'paye':
         messages.error(request, 'L\'attestation n\'est disponible que pour les prêts payés.')
@@ -215,13 +322,24 @@ def download_certificate(request, loan_id):
             messages.error(request, 'Impossible de générer l\'attestation : profil utilisateur incomplet.')
             return redirect('dashboard')
         
-        # Générer le PDF
-        pdf_content = generate_loan_certificate(loan)
+        # L'empreinte des données de l'attestation sert d'ETag : inutile de renvoyer un PDF inchangé
+        fingerprint = certificate_fingerprint(loan)
+        etag = f'"{fingerprint}"'
+        modified_time = certificate_modified_time(loan, fingerprint)
+        last_modified = int(modified_time.timestamp()) if modified_time else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
         
-        response = HttpResponse(pdf_content, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="attestation_pret_INV_{loan.id:06d}.pdf"'
+        # Servir le PDF en cache ou le générer si ses données ont changé
+        pdf_file = open_certificate(loan, fingerprint)
+        if last_modified is None:
+            modified_time = certificate_modified_time(loan, fingerprint)
+            last_modified = int(modified_time.timestamp()) if modified_time else None
         
-        return response
+        filename = f"attestation_pret_INV_{loan.id:06d}.pdf"
+        return _certificate_response(request, pdf_file, filename, etag, last_modified)
     except Exception as e:
         messages.error(request, f'Erreur lors de la génération de l\'attestation: {str(e)}')
         return redirect('dashboard')
@@ -415,7 +533,7 @@ def change_password(request):
             
             # Envoyer notification de changement de mot de passe (rapide)
             try:
-                FastInvestorEmailService.send_password_change_alert_fast(request.user)
+                FastInvestorEmailService.send_on_commit(FastInvestorEmailService.send_password_change_alert_fast, request.user)
             except Exception as e:
                 print(f"Erreur envoi notification changement mot de passe: {e}")
             